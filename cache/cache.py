@@ -1,59 +1,257 @@
 import os
+import atexit
 import shutil
 import collections
 import threading
 import time
+import weakref
 import psutil
 
+from cache.governor import MemoryGovernor
+from cache.warm_start import WarmStarter, HOT_KEYS_FILE
+from cache.write_back import WriteBackPipeline, write_file_atomic
+
+
+# Acessos por shard entre dois envelhecimentos das frequências
+ACCESS_AGING_WINDOW = 100000
+
+
+def _default_shard_count():
+    """Numero de shards padrao: duas particoes por CPU, limitado a 64"""
+    return min(64, max(4, (os.cpu_count() or 1) * 2))
+
+
+class _CacheShard:
+    """
+    Particao do cache RAM: lock, orcamento, estado LRU e contadores proprios.
+
+    Entradas sujas (pinned) ainda nao persistidas no SSD nunca sao descartadas:
+    ao sair da fila LRU elas ficam em 'spilled' ate o write-back confirmar.
+    """
+
+    def __init__(self, limit):
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()  # {hash: data}
+        self.size = 0
+        self.limit = limit
+
+        self.pinned = set()
+        self.spilled = {}  # {hash: data} sujas fora da fila LRU
+        self.spilled_size = 0
+
+        # Contadores atualizados sob o lock do proprio shard
+        self.ram_hits = 0
+        self.ssd_hits = 0
+        self.misses = 0
+        self.access_counts = {}  # {hash: frequência} para o snapshot de chaves quentes
+        self.accesses_since_aging = 0
+
+    def get(self, key):
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+            else:
+                data = self.spilled.get(key)
+            if data is not None:
+                self.ram_hits += 1
+                self._count_access(key)
+            return data
+
+    def peek(self, key):
+        """Ler uma entrada sem alterar a ordem LRU nem as estatisticas"""
+        with self.lock:
+            data = self.entries.get(key)
+            if data is None:
+                data = self.spilled.get(key)
+            return data
+
+    def put(self, key, data, pin=False):
+        with self.lock:
+            old = self.entries.get(key)
+            if old is not None:
+                self.size -= len(old)
+            old = self.spilled.pop(key, None)
+            if old is not None:
+                self.spilled_size -= len(old)
+            if pin:
+                self.pinned.add(key)
+            self.entries[key] = data
+            self.size += len(data)
+            self.entries.move_to_end(key)
+            self._evict_if_needed()
+
+    def unpin(self, key):
+        with self.lock:
+            self.pinned.discard(key)
+            data = self.spilled.pop(key, None)
+            if data is not None:
+                self.spilled_size -= len(data)
+
+    def set_limit(self, limit):
+        with self.lock:
+            self.limit = limit
+            self._evict_if_needed()
+
+    def _evict_if_needed(self):
+        # A entrada mais recente fica mesmo acima da fatia: sem isso, blocos maiores
+        # que ram_limit // num_shards seriam descartados logo apos inseridos
+        while self.size > self.limit and len(self.entries) > 1:
+            old_key, old_data = self.entries.popitem(last=False)
+            self.size -= len(old_data)
+            if old_key in self.pinned:
+                self.spilled[old_key] = old_data
+                self.spilled_size += len(old_data)
+
+    def record_ssd_hit(self, key):
+        with self.lock:
+            self.ssd_hits += 1
+            self._count_access(key)
+
+    def _count_access(self, key):
+        # Envelhece pelo volume de acessos, nao pelo tempo: periodos ociosos nao apagam nada
+        self.access_counts[key] = self.access_counts.get(key, 0) + 1
+        self.accesses_since_aging += 1
+        if self.accesses_since_aging >= ACCESS_AGING_WINDOW:
+            self.access_counts = {k: c // 2 for k, c in self.access_counts.items() if c > 1}
+            self.accesses_since_aging = 0
+
+    def collect_access_counts(self):
+        """Copiar as frequências sem alterar as contagens vivas"""
+        with self.lock:
+            return dict(self.access_counts)
+
+    def record_miss(self):
+        with self.lock:
+            self.misses += 1
+
+    def reset_stats(self):
+        with self.lock:
+            self.ram_hits = 0
+            self.ssd_hits = 0
+            self.misses = 0
+
+
 class HybridCache:
     """
     Cache inteligente: RAM (LRU Adaptativo) + SSD (persistente) + Write-Back.
+
+    A camada RAM e particionada em shards pelo hash da chave; cada shard tem
+    lock, fatia do orcamento e fila LRU proprios, de modo que leituras em
+    threads diferentes raramente disputam o mesmo lock.
+
+    Com adaptive_ram=True um MemoryGovernor ajusta o orcamento RAM entre
+    ram_min_ratio e ram_max_ratio da memoria total conforme a pressao do host.
+
+    Gravacões em add() passam por um WriteBackPipeline duravel; chame flush()
+    para garantir persistencia e close() ao encerrar.
+
+    Com warm_start=True as chaves quentes sao salvas periodicamente e, ao
+    reiniciar, recarregadas em segundo plano ate warm_start_budget bytes.
     """
-    # Adicionar estes metodos à classe HybridCache:
 
-    def __init__(self, ram_limit_ratio=0.1, ssd_folder='./cache_ssd', write_back_delay=2.0):
+    def __init__(self, ram_limit_ratio=0.1, ssd_folder='./cache_ssd', write_back_delay=2.0,
+                 num_shards=None, adaptive_ram=True, ram_min_ratio=None, ram_max_ratio=None,
+                 governor_interval=5.0, write_back_max_bytes=64 * 1024 * 1024,
+                 warm_start=True, warm_start_budget=None, snapshot_interval=60.0):
         # Limite dinâmico da RAM
         total_ram = psutil.virtual_memory().total
         self.ram_limit = int(total_ram * ram_limit_ratio)
+        self.ram_limit_min = int(total_ram * (ram_min_ratio if ram_min_ratio is not None else ram_limit_ratio / 4))
+        self.ram_limit_max = int(total_ram * (ram_max_ratio if ram_max_ratio is not None else min(0.5, ram_limit_ratio * 2)))
+        self.resize_events = collections.deque(maxlen=20)
+        self.resize_count = 0
 
-        self.ram_cache = collections.OrderedDict()  # {hash: data}
-        self.ram_size = 0
-        self.lock = threading.Lock()
+        self.num_shards = num_shards or _default_shard_count()
+        shard_limit = self.ram_limit // self.num_shards
+        self.shards = [_CacheShard(shard_limit) for _ in range(self.num_shards)]
 
         self.ssd_folder = ssd_folder
         os.makedirs(self.ssd_folder, exist_ok=True)
+        self.ssd_index = {}  # {hash: tamanho} dos arquivos no SSD
+        self._ssd_index_lock = threading.Lock()
+        self._ssd_index_ready = False
 
         self.write_back_delay = write_back_delay
-        self.write_back_queue = set()
-        self._start_write_back_thread()
-        
-        # Estatisticas de cache
-        self.cache_hits = 0
-        self.cache_misses = 0
-        self.ram_hits = 0
-        self.ssd_hits = 0
+        self.write_back = WriteBackPipeline(
+            self._ssd_path,
+            on_flushed=self._on_write_back_flushed,
+            delay=write_back_delay,
+            max_pending_bytes=write_back_max_bytes
+        )
+        self._closed = False
+        # Nao perder gravacões pendentes ao encerrar o processo
+        atexit.register(_close_cache_at_exit, weakref.ref(self))
+
+        self.governor = None
+        if adaptive_ram:
+            self.governor = MemoryGovernor(
+                self, self.ram_limit_min, self.ram_limit_max, interval=governor_interval)
+            self.governor.start()
+
+        self.warm_starter = None
+        if warm_start:
+            if warm_start_budget is None:
+                warm_start_budget = min(self.ram_limit // 2, 256 * 1024 * 1024)
+            self.warm_starter = WarmStarter(
+                self,
+                os.path.join(self.ssd_folder, HOT_KEYS_FILE),
+                io_budget=warm_start_budget,
+                snapshot_interval=snapshot_interval
+            )
+            self.warm_starter.start()
+        else:
+            self.rebuild_ssd_index()
+
+    def _shard_for(self, key):
+        return self.shards[hash(key) % self.num_shards]
+
+    @property
+    def ram_size(self):
+        return sum(shard.size for shard in self.shards)
+
+    @property
+    def cache_hits(self):
+        return self.ram_hits + self.ssd_hits
+
+    @property
+    def cache_misses(self):
+        return sum(shard.misses for shard in self.shards)
+
+    @property
+    def ram_hits(self):
+        return sum(shard.ram_hits for shard in self.shards)
+
+    @property
+    def ssd_hits(self):
+        return sum(shard.ssd_hits for shard in self.shards)
 
     def get_from_ram(self, key):
-        with self.lock:
-            if key in self.ram_cache:
-                self.ram_cache.move_to_end(key)
-                return self.ram_cache[key]
-            return None
+        return self._shard_for(key).get(key)
 
     def add_to_ram(self, key, data: bytes):
-        with self.lock:
-            if key in self.ram_cache:
-                self.ram_size -= len(self.ram_cache[key])
-            self.ram_cache[key] = data
-            self.ram_size += len(data)
-            self.ram_cache.move_to_end(key)
+        self._shard_for(key).put(key, data)
+
+    def in_ram(self, key):
+        """Verificar se a chave esta na RAM sem afetar a ordem LRU nem as estatisticas"""
+        return self._shard_for(key).peek(key) is not None
 
-            self._evict_ram_if_needed()
+    def resize(self, new_limit, reason='manual'):
+        """Redistribuir um novo orcamento RAM entre os shards, evictando se necessario"""
+        new_limit = max(0, int(new_limit))
+        old_limit = self.ram_limit
+        self.ram_limit = new_limit
+        shard_limit = new_limit // self.num_shards
+        for shard in self.shards:
+            shard.set_limit(shard_limit)
 
-    def _evict_ram_if_needed(self):
-        while self.ram_size > self.ram_limit:
-            old_key, old_data = self.ram_cache.popitem(last=False)
-            self.ram_size -= len(old_data)
+        self.resize_count += 1
+        self.resize_events.append({
+            'time': time.time(),
+            'old_limit': old_limit,
+            'new_limit': new_limit,
+            'reason': reason
+        })
 
 
     # SSD Cache
@@ -61,18 +259,28 @@ class HybridCache:
         return os.path.join(self.ssd_folder, f'{key}.cache')
 
     def get_from_ssd(self, key):
-        path = self._ssd_path(key)
-        if os.path.exists(path):
-            with open(path, 'rb') as f:
+        # Com o indice pronto, faltas no SSD nao custam nenhuma chamada ao sistema
+        if self._ssd_index_ready and key not in self.ssd_index:
+            return None
+        try:
+            with open(self._ssd_path(key), 'rb') as f:
                 return f.read()
-        return None
+        except FileNotFoundError:
+            with self._ssd_index_lock:
+                self.ssd_index.pop(key, None)
+            return None
 
     def add_to_ssd(self, key, data: bytes):
-        path = self._ssd_path(key)
-        with open(path, 'wb') as f:
-            f.write(data)
+        write_file_atomic(self._ssd_path(key), data)
+        with self._ssd_index_lock:
+            self.ssd_index[key] = len(data)
 
     def remove_from_ssd(self, key):
+        self.write_back.discard(key)
+        # Sem gravacao pendente, a entrada deixa de ser suja
+        self._shard_for(key).unpin(key)
+        with self._ssd_index_lock:
+            self.ssd_index.pop(key, None)
         path = self._ssd_path(key)
         if os.path.exists(path):
             os.remove(path)
@@ -80,43 +288,110 @@ class HybridCache:
     def clear_ssd(self):
         shutil.rmtree(self.ssd_folder)
         os.makedirs(self.ssd_folder, exist_ok=True)
+        with self._ssd_index_lock:
+            self.ssd_index.clear()
 
+    def rebuild_ssd_index(self):
+        """Reconstruir o indice do SSD a partir do diretorio, removendo temporarios orfaos"""
+        scanned = {}
+        try:
+            with os.scandir(self.ssd_folder) as it:
+                for entry in it:
+                    if '.tmp.' in entry.name:
+                        # Temporarios deste processo pertencem a gravacões em andamento
+                        owner = entry.name.split('.tmp.', 1)[1].split('.', 1)[0]
+                        if owner != str(os.getpid()):
+                            try:
+                                os.remove(entry.path)
+                            except OSError:
+                                pass
+                    elif entry.name.endswith('.cache'):
+                        scanned[entry.name[:-len('.cache')]] = entry.stat().st_size
+        except OSError:
+            return
+        # Mesclar no indice vivo: entradas gravadas durante a varredura prevalecem
+        with self._ssd_index_lock:
+            for key, size in scanned.items():
+                self.ssd_index.setdefault(key, size)
+            self._ssd_index_ready = True
 
-    # Write-Back Async
-    def _start_write_back_thread(self):
-        thread = threading.Thread(target=self._write_back_worker, daemon=True)
-        thread.start()
+    def prefetch_from_ssd(self, key, max_bytes=None):
+        """Carregar uma entrada do SSD na RAM sem contar como acesso; retorna os bytes lidos"""
+        shard = self._shard_for(key)
+        size = self.ssd_index.get(key)
+        if size is None or (max_bytes is not None and size > max_bytes):
+            return 0
+        if shard.peek(key) is not None:
+            return 0
+        data = self.get_from_ssd(key)
+        if data is None:
+            return 0
+        shard.put(key, data)
+        return len(data)
 
-    def _write_back_worker(self):
-        while True:
-            time.sleep(self.write_back_delay)
-            self._flush_write_back()
+    def collect_access_counts(self):
+        """Frequências de acesso agregadas entre os shards"""
+        counts = {}
+        for shard in self.shards:
+            counts.update(shard.collect_access_counts())
+        return counts
 
-    def _flush_write_back(self):
-        with self.lock:
-            pending = list(self.write_back_queue)
-            self.write_back_queue.clear()
 
-        for key in pending:
-            data = self.ram_cache.get(key)
-            if data:
-                self.add_to_ssd(key, data)
+    # Write-Back Async
+    def _on_write_back_flushed(self, flushed):
+        with self._ssd_index_lock:
+            self.ssd_index.update(flushed)
+        for key in flushed:
+            self._shard_for(key).unpin(key)
+
+    def flush(self, timeout=None):
+        """Bloquear ate que todas as entradas sujas estejam persistidas no SSD"""
+        return self.write_back.flush(timeout)
+
+    def close(self, timeout=None):
+        """Persistir entradas sujas e encerrar as threads de fundo"""
+        if self._closed:
+            return True
+        self._closed = True
+        if self.governor:
+            self.governor.stop()
+        flushed = self.write_back.close(timeout)
+        if self.warm_starter:
+            self.warm_starter.stop()
+        return flushed
 
     def get_usage_percentage(self):
         """Obter porcentagem de uso do cache RAM"""
-        with self.lock:
-            if self.ram_limit > 0:
-                return (self.ram_size / self.ram_limit) * 100
-            return 0
+        if self.ram_limit > 0:
+            return (self.ram_size / self.ram_limit) * 100
+        return 0
 
     def get_cache_stats(self):
-        """Obter estatisticas detalhadas do cache"""
-        with self.lock:
-            total_requests = self.cache_hits + self.cache_misses
-            hit_rate = (self.cache_hits / max(1, total_requests)) * 100
-            
-            # Calcular tamanho do cache SSD
-            ssd_size = 0
+        """Obter estatisticas detalhadas do cache (agregadas entre shards, sem lock global)"""
+        ram_size = 0
+        ram_hits = 0
+        ssd_hits = 0
+        cache_misses = 0
+        pinned_size = 0
+        dirty_entries = 0
+        for shard in self.shards:
+            with shard.lock:
+                ram_size += shard.size
+                pinned_size += shard.spilled_size
+                dirty_entries += len(shard.pinned)
+                ram_hits += shard.ram_hits
+                ssd_hits += shard.ssd_hits
+                cache_misses += shard.misses
+
+        cache_hits = ram_hits + ssd_hits
+        total_requests = cache_hits + cache_misses
+        hit_rate = (cache_hits / max(1, total_requests)) * 100
+
+        # Calcular tamanho do cache SSD
+        ssd_size = 0
+        if self._ssd_index_ready:
+            ssd_size = sum(list(self.ssd_index.values()))
+        else:
             try:
                 for filename in os.listdir(self.ssd_folder):
                     if filename.endswith('.cache'):
@@ -124,48 +399,61 @@ class HybridCache:
                         ssd_size += os.path.getsize(filepath)
             except:
                 pass
-            
-            return {
-                'ram_size': self.ram_size,
-                'ram_limit': self.ram_limit,
-                'ram_usage_percent': self.get_usage_percentage(),
-                'ssd_size': ssd_size,
-                'cache_hits': self.cache_hits,
-                'cache_misses': self.cache_misses,
-                'ram_hits': self.ram_hits,
-                'ssd_hits': self.ssd_hits,
-                'hit_rate': hit_rate,
-                'total_requests': total_requests
-            }
+
+        return {
+            'ram_size': ram_size,
+            'ram_limit': self.ram_limit,
+            'ram_usage_percent': (ram_size / self.ram_limit) * 100 if self.ram_limit > 0 else 0,
+            'ssd_size': ssd_size,
+            'cache_hits': cache_hits,
+            'cache_misses': cache_misses,
+            'ram_hits': ram_hits,
+            'ssd_hits': ssd_hits,
+            'hit_rate': hit_rate,
+            'total_requests': total_requests,
+            'num_shards': self.num_shards,
+            'ram_limit_min': self.ram_limit_min,
+            'ram_limit_max': self.ram_limit_max,
+            'resize_count': self.resize_count,
+            'resize_events': list(self.resize_events),
+            'dirty_entries': dirty_entries,
+            'pinned_spilled_size': pinned_size,
+            'write_back': self.write_back.get_stats(),
+            'ssd_entries': len(self.ssd_index),
+            'warm_start': self.warm_starter.get_stats() if self.warm_starter else None
+        }
 
     def get(self, key):
         """Metodo get modificado para rastrear estatisticas"""
-        data = self.get_from_ram(key)
-        if data:
-            with self.lock:
-                self.cache_hits += 1
-                self.ram_hits += 1
+        shard = self._shard_for(key)
+        data = shard.get(key)
+        if data is not None:
             return data, 'RAM'
-    
-        data = self.get_from_ssd(key)
-        if data:
-            self.add_to_ram(key, data)
-            with self.lock:
-                self.cache_hits += 1
-                self.ssd_hits += 1
+
+        # Entrada suja ainda a caminho do SSD
+        data = self.write_back.peek(key)
+        if data is None:
+            data = self.get_from_ssd(key)
+        if data is not None:
+            shard.put(key, data)
+            shard.record_ssd_hit(key)
             return data, 'SSD'
-    
-        with self.lock:
-            self.cache_misses += 1
+
+        shard.record_miss()
         return None, None
 
     def reset_stats(self):
         """Resetar estatisticas do cache"""
-        with self.lock:
-            self.cache_hits = 0
-            self.cache_misses = 0
-            self.ram_hits = 0
-            self.ssd_hits = 0
+        for shard in self.shards:
+            shard.reset_stats()
+
     def add(self, key, data: bytes):
-        self.add_to_ram(key, data)
-        self.write_back_queue.add(key)  # adia gravacao no SSD
+        # Fixa a entrada na RAM ate o write-back confirmar a gravacao no SSD
+        self._shard_for(key).put(key, data, pin=True)
+        self.write_back.submit(key, data)  # adia gravacao no SSD (bloqueia se a fila estiver cheia)
+
+
+def _close_cache_at_exit(cache_ref):
+    cache = cache_ref()
+    if cache is not None:
+        cache.close(timeout=30)
@@ -0,0 +1,102 @@
+import os
+import threading
+import psutil
+
+
+PSI_MEMORY_PATH = '/proc/pressure/memory'
+
+
+def read_memory_pressure(path=PSI_MEMORY_PATH):
+    """
+    Ler a pressao de memoria (PSI) do kernel Linux.
+
+    :return: Percentual 'some avg10' ou None se PSI nao estiver disponivel
+    """
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                if line.startswith('some'):
+                    for field in line.split()[1:]:
+                        name, _, value = field.partition('=')
+                        if name == 'avg10':
+                            return float(value)
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+class MemoryGovernor:
+    """
+    Governador do orcamento RAM do HybridCache.
+
+    Observa a memoria disponivel do host (psutil e PSI no Linux) e ajusta o
+    limite do cache entre um piso e um teto. Reducões sao feitas em passos
+    limitados a cada ciclo, de modo que a eviccao acontece gradualmente.
+    """
+
+    def __init__(self, cache, min_limit, max_limit, interval=5.0,
+                 low_available_ratio=0.10, high_available_ratio=0.30,
+                 psi_threshold=10.0, shrink_step_ratio=0.25, grow_step_ratio=0.10,
+                 psi_path=PSI_MEMORY_PATH):
+        self.cache = cache
+        self.min_limit = int(min_limit)
+        self.max_limit = int(max(max_limit, min_limit))
+        self.interval = interval
+        self.low_available_ratio = low_available_ratio
+        self.high_available_ratio = high_available_ratio
+        self.psi_threshold = psi_threshold
+        self.shrink_step_ratio = shrink_step_ratio
+        self.grow_step_ratio = grow_step_ratio
+        self.psi_path = psi_path if os.path.exists(psi_path) else None
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Erro no governador de memoria do cache: {e}")
+
+    def compute_target(self, current_limit, ram_size, total, available, pressure=None):
+        """Calcular o novo limite a partir de uma amostra de memoria"""
+        available_ratio = available / max(1, total)
+        under_pressure = available_ratio < self.low_available_ratio or (
+            pressure is not None and pressure >= self.psi_threshold)
+
+        target = current_limit
+        if under_pressure:
+            target = current_limit - int(current_limit * self.shrink_step_ratio)
+        elif available_ratio > self.high_available_ratio and ram_size >= current_limit * 0.9:
+            # So cresce se o cache estiver de fato cheio e houver folga acima da marca alta
+            headroom = available - int(total * self.high_available_ratio)
+            step = min(int(total * self.grow_step_ratio), headroom)
+            target = current_limit + max(0, step)
+
+        return min(self.max_limit, max(self.min_limit, target)), under_pressure
+
+    def tick(self):
+        """Executar um ciclo de amostragem e redimensionamento"""
+        vm = psutil.virtual_memory()
+        pressure = read_memory_pressure(self.psi_path) if self.psi_path else None
+        current_limit = self.cache.ram_limit
+        target, under_pressure = self.compute_target(
+            current_limit, self.cache.ram_size, vm.total, vm.available, pressure)
+
+        if target != current_limit:
+            reason = 'pressure' if under_pressure else 'idle'
+            self.cache.resize(target, reason=reason)
+        return target
@@ -0,0 +1,45 @@
+import threading
+
+from cache.cache import HybridCache
+
+
+# Um unico HybridCache por processo: um orcamento de RAM, uma thread de
+# write-back e uma pasta SSD compartilhados por StorageManager e pelo VFS.
+_lock = threading.Lock()
+_shared_cache = None
+_shared_config = {
+    'ram_limit_ratio': 0.1,
+    'ssd_folder': './cache_ssd'
+}
+
+
+def configure_shared_cache(**config):
+    """
+    Definir os parametros do cache compartilhado (os mesmos de HybridCache).
+
+    Deve ser chamado antes do primeiro get_shared_cache(); depois disso o
+    cache ja existe e a configuracao nao pode mais mudar.
+    """
+    with _lock:
+        if _shared_cache is not None:
+            raise RuntimeError('O cache compartilhado ja foi criado; configure-o antes do primeiro uso')
+        _shared_config.update(config)
+
+
+def get_shared_cache():
+    """Obter (criando na primeira chamada) o HybridCache do processo"""
+    global _shared_cache
+    with _lock:
+        if _shared_cache is None:
+            _shared_cache = HybridCache(**_shared_config)
+        return _shared_cache
+
+
+def close_shared_cache(timeout=None):
+    """Persistir e encerrar o cache compartilhado; a proxima chamada cria um novo"""
+    global _shared_cache
+    with _lock:
+        cache, _shared_cache = _shared_cache, None
+    if cache is not None:
+        return cache.close(timeout)
+    return True
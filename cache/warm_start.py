@@ -0,0 +1,122 @@
+import os
+import json
+import threading
+import time
+
+from cache.write_back import write_file_atomic
+
+
+HOT_KEYS_FILE = 'hot_keys.json'
+
+
+def save_hot_keys(path, counts, max_keys=10000):
+    """
+    Gravar (atomicamente) a lista de chaves quentes com suas frequências.
+
+    :param counts: Dicionario {chave: frequência}
+    """
+    hottest = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:max_keys]
+    payload = {
+        'version': 1,
+        'time': time.time(),
+        'keys': hottest
+    }
+    write_file_atomic(path, json.dumps(payload).encode('utf-8'))
+
+
+def load_hot_keys(path):
+    """Ler o snapshot de chaves quentes; retorna [(chave, frequência)] da mais quente para a mais fria"""
+    try:
+        with open(path, 'rb') as f:
+            payload = json.loads(f.read().decode('utf-8'))
+        return [(key, count) for key, count in payload.get('keys', [])]
+    except (OSError, ValueError, TypeError):
+        return []
+
+
+class WarmStarter:
+    """
+    Aquecimento do HybridCache entre reinicializacões.
+
+    Em segundo plano (sem bloquear quem construiu o cache):
+    1. reconstroi o indice do SSD;
+    2. pre-carrega na RAM as chaves mais quentes do ultimo snapshot, ate io_budget bytes;
+    3. grava periodicamente um novo snapshot das chaves quentes.
+
+    O snapshot soma as frequências desta execucao as do snapshot anterior
+    (envelhecidas pela metade a cada reinicio), de modo que um processo que
+    ainda nao leu nada nao apaga as chaves quentes salvas.
+    """
+
+    def __init__(self, cache, snapshot_path, io_budget, snapshot_interval=60.0, max_keys=10000):
+        self.cache = cache
+        self.snapshot_path = snapshot_path
+        self.io_budget = io_budget
+        self.snapshot_interval = snapshot_interval
+        self.max_keys = max_keys
+
+        self.prefetched_keys = 0
+        self.prefetched_bytes = 0
+        self.previous_counts = {}  # {chave: frequência} herdadas do snapshot anterior
+        self.warm_start_done = threading.Event()
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def stop(self):
+        """Encerrar a thread e gravar um snapshot final"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.snapshot()
+
+    def _run(self):
+        try:
+            self.cache.rebuild_ssd_index()
+            self.prefetch()
+        except Exception as e:
+            print(f"Erro no aquecimento do cache: {e}")
+        finally:
+            self.warm_start_done.set()
+
+        while not self._stop_event.wait(self.snapshot_interval):
+            self.snapshot()
+
+    def prefetch(self):
+        """Pre-carregar as chaves mais quentes respeitando o orcamento de I/O"""
+        budget = self.io_budget
+        hot_keys = load_hot_keys(self.snapshot_path)
+        self.previous_counts = {key: count // 2 for key, count in hot_keys if count > 1}
+        for key, _ in hot_keys:
+            if self._stop_event.is_set() or budget <= 0:
+                break
+            loaded = self.cache.prefetch_from_ssd(key, max_bytes=budget)
+            if loaded:
+                budget -= loaded
+                self.prefetched_keys += 1
+                self.prefetched_bytes += loaded
+
+    def snapshot(self):
+        if not self.warm_start_done.is_set():
+            return  # o snapshot anterior ainda nao foi lido; nao sobrescreve-lo
+        counts = dict(self.previous_counts)
+        try:
+            for key, count in self.cache.collect_access_counts().items():
+                counts[key] = counts.get(key, 0) + count
+            save_hot_keys(self.snapshot_path, counts, self.max_keys)
+        except Exception as e:
+            print(f"Erro ao gravar snapshot de chaves quentes: {e}")
+
+    def get_stats(self):
+        return {
+            'warm_start_done': self.warm_start_done.is_set(),
+            'prefetched_keys': self.prefetched_keys,
+            'prefetched_bytes': self.prefetched_bytes
+        }
@@ -0,0 +1,258 @@
+import os
+import collections
+import threading
+import time
+
+
+def write_file_atomic(path, data: bytes, fsync=True):
+    """
+    Gravar um arquivo de forma atomica: arquivo temporario + fsync + rename.
+
+    Leitores nunca veem um arquivo parcialmente escrito.
+    """
+    tmp_path = f'{path}.tmp.{os.getpid()}.{threading.get_ident()}'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def fsync_directory(folder):
+    """Persistir as entradas de diretorio (renomeacões); ignorado onde nao suportado"""
+    try:
+        fd = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class WriteBackPipeline:
+    """
+    Estagio de write-back do HybridCache.
+
+    - Fila limitada (entradas e bytes) com backpressure em submit()
+    - Coalescencia: gravacões repetidas da mesma chave viram uma so escrita
+    - Escrita atomica (temp + rename) com fsync em lote e um fsync de diretorio por lote
+    - on_flushed({key: size}) e chamado apenas para chaves persistidas sem versao mais nova pendente
+    """
+
+    def __init__(self, path_for_key, on_flushed=None, delay=2.0,
+                 max_pending_bytes=64 * 1024 * 1024, max_pending_entries=4096, batch_size=256):
+        self.path_for_key = path_for_key
+        self.on_flushed = on_flushed
+        self.delay = delay
+        self.max_pending_bytes = max_pending_bytes
+        self.max_pending_entries = max_pending_entries
+        self.batch_size = batch_size
+
+        self._pending = collections.OrderedDict()  # {key: data}
+        self._pending_bytes = 0
+        self._in_flight = {}  # {key: data} do lote sendo gravado
+        self._cond = threading.Condition()
+
+        # Numeros de sequência para que flush() espere apenas o que ja foi submetido
+        self._submitted_seq = 0
+        self._persisted_seq = 0
+        self._flush_requested = False
+        self._closed = False
+
+        self.flushed_count = 0
+        self.coalesced_count = 0
+        self.error_count = 0
+        self.backpressure_waits = 0
+
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+
+    def _is_full(self, incoming):
+        return bool(self._pending) and (
+            self._pending_bytes + incoming > self.max_pending_bytes
+            or len(self._pending) >= self.max_pending_entries)
+
+    def submit(self, key, data: bytes):
+        """Enfileirar uma gravacao; bloqueia enquanto a fila estiver cheia"""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Write-back pipeline encerrado')
+
+            old = self._pending.get(key)
+            if old is not None:
+                # Coalescer: substitui a versao pendente mantendo a posicao na fila
+                self._pending_bytes -= len(old)
+                self._pending[key] = data
+                self._pending_bytes += len(data)
+                self.coalesced_count += 1
+                self._submitted_seq += 1
+                return
+
+            if self._is_full(len(data)):
+                self.backpressure_waits += 1
+                self._cond.notify_all()
+                while self._is_full(len(data)) and not self._closed:
+                    self._cond.wait()
+
+            self._pending[key] = data
+            self._pending_bytes += len(data)
+            self._submitted_seq += 1
+            if self._pending_bytes >= self.max_pending_bytes // 2:
+                self._cond.notify_all()
+
+    def peek(self, key):
+        """Dados ainda nao persistidos para a chave, se houver"""
+        with self._cond:
+            data = self._pending.get(key)
+            if data is None:
+                data = self._in_flight.get(key)
+            return data
+
+    def discard(self, key):
+        """Descartar uma gravacao pendente (ex.: entrada removida do cache)"""
+        with self._cond:
+            data = self._pending.pop(key, None)
+            if data is not None:
+                self._pending_bytes -= len(data)
+                self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Aguardar ate que tudo que foi submetido ate agora esteja em disco"""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            target = self._submitted_seq
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._persisted_seq < target:
+                if not self._thread.is_alive():
+                    return False
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def close(self, timeout=None):
+        """Persistir o que estiver pendente e encerrar a thread de gravacao"""
+        flushed = self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        return flushed
+
+    def get_stats(self):
+        with self._cond:
+            return {
+                'pending_entries': len(self._pending) + len(self._in_flight),
+                'pending_bytes': self._pending_bytes,
+                'flushed': self.flushed_count,
+                'coalesced': self.coalesced_count,
+                'errors': self.error_count,
+                'backpressure_waits': self.backpressure_waits
+            }
+
+    def _take_batch(self):
+        batch = []
+        while self._pending and len(batch) < self.batch_size:
+            key, data = self._pending.popitem(last=False)
+            self._pending_bytes -= len(data)
+            batch.append((key, data))
+        self._in_flight = dict(batch)
+        return batch, self._submitted_seq if not self._pending else None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                if not self._pending and not self._closed:
+                    self._persisted_seq = self._submitted_seq
+                    self._flush_requested = False
+                    self._cond.notify_all()
+                    self._cond.wait(self.delay)
+                elif not self._flush_requested and not self._closed \
+                        and len(self._pending) < self.batch_size \
+                        and self._pending_bytes < self.max_pending_bytes // 2:
+                    # Janela de coalescencia: aguarda mais gravacões da mesma chave
+                    self._cond.wait(self.delay)
+
+                if not self._pending:
+                    if self._closed:
+                        self._persisted_seq = self._submitted_seq
+                        self._cond.notify_all()
+                        return
+                    continue
+
+                batch, seq_if_drained = self._take_batch()
+                # Liberar produtores bloqueados por backpressure
+                self._cond.notify_all()
+
+            written, failed = self._write_batch(batch)
+
+            with self._cond:
+                self._in_flight = {}
+                if self._closed and failed:
+                    # Encerrando: nao ha mais tentativas possiveis
+                    print(f"Write-back encerrado com {len(failed)} entradas nao persistidas")
+                    failed = []
+                for key, data in failed:
+                    if key not in self._pending:
+                        self._pending[key] = data
+                        self._pending_bytes += len(data)
+                flushed = {key: size for key, size in written if key not in self._pending}
+                self.flushed_count += len(written)
+                if seq_if_drained is not None and not failed:
+                    self._persisted_seq = max(self._persisted_seq, seq_if_drained)
+                self._cond.notify_all()
+
+            if flushed and self.on_flushed:
+                self.on_flushed(flushed)
+
+            if failed:
+                time.sleep(self.delay)
+
+    def _write_batch(self, batch):
+        """Gravar um lote: escreve temporarios, fsync em lote, renomeia e sincroniza diretorios"""
+        staged = []
+        failed = []
+        for key, data in batch:
+            path = self.path_for_key(key)
+            tmp_path = f'{path}.tmp.{os.getpid()}'
+            f = None
+            try:
+                f = open(tmp_path, 'wb')
+                f.write(data)
+                f.flush()
+                staged.append((key, data, path, tmp_path, f))
+            except OSError as e:
+                print(f"Erro no write-back de {key}: {e}")
+                self.error_count += 1
+                failed.append((key, data))
+                if f is not None:
+                    f.close()
+
+        written = []
+        folders = set()
+        for key, data, path, tmp_path, f in staged:
+            try:
+                os.fsync(f.fileno())
+                f.close()
+                os.replace(tmp_path, path)
+                folders.add(os.path.dirname(path))
+                written.append((key, len(data)))
+            except OSError as e:
+                print(f"Erro no write-back de {key}: {e}")
+                self.error_count += 1
+                failed.append((key, data))
+                try:
+                    f.close()
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+        for folder in folders:
+            fsync_directory(folder)
+        return written, failed
@@ -0,0 +1,409 @@
+import os
+import shutil
+import threading
+
+from cache.write_back import write_file_atomic, fsync_directory
+from .placement import VolumeRing, fanout_path
+
+
+class BlobStore:
+    """
+    Armazenamento dos blobs comprimidos enderecados por hash.
+
+    Blobs minusculos (menores que inline_limit) ficam na propria linha do
+    MetadataDB, sem nenhum arquivo. Blobs pequenos (menores que
+    small_blob_limit) sao anexados a segmentos grandes (pack files) e
+    localizados por (pack_id, offset, tamanho) no MetadataDB; a leitura usa
+    pread, sem abrir um arquivo por blob. Blobs grandes continuam em arquivos
+    proprios, com fan-out pelo prefixo do hash (ab/cd/<hash>.zst).
+
+    Opcionalmente os blobs sao distribuidos entre varios volumes (raizes de
+    backend em discos diferentes) por hashing consistente com pesos. O local
+    de cada blob fica registrado no MetadataDB, entao a leitura nunca depende
+    da configuracao atual dos volumes.
+    """
+
+    def __init__(self, data_folder, db, small_blob_limit=64 * 1024, segment_size=64 * 1024 * 1024,
+                 volumes=None, inline_limit=4 * 1024):
+        self.data_folder = data_folder
+        self.pack_folder = os.path.join(data_folder, 'packs')
+
+        # data_folder e sempre um volume; volumes={raiz: peso} adiciona outros
+        self.ring = VolumeRing({data_folder: 1, **(volumes or {})})
+        for root in self.ring.volumes():
+            os.makedirs(os.path.join(root, 'packs'), exist_ok=True)
+
+        self.db = db
+        self.small_blob_limit = small_blob_limit
+        self.inline_limit = inline_limit
+        self.segment_size = segment_size
+
+        # Um pack aberto e um lock de escrita por volume: escritas em discos diferentes em paralelo
+        self._volume_lock = threading.Lock()
+        self._write_locks = {}  # {raiz: Lock}
+        self._open_packs = {}  # {raiz: [pack_id, path, arquivo, tamanho]}
+
+        self._read_lock = threading.Lock()
+        self._pack_paths = self.db.get_pack_paths()  # {pack_id: path}
+        self._read_fds = {}  # {pack_id: fd}
+        self._retired_fds = []  # fds de packs compactados, fechados no proximo ciclo do GC
+        self._pending_removals = []  # packs compactados que o SO ainda nao deixou apagar
+
+        self._rebalance_thread = None
+        self.rebalance_stats = {'running': False, 'moved': 0, 'bytes_moved': 0, 'errors': 0}
+
+    def _blob_path(self, hash_value):
+        return fanout_path(self.ring.volume_for(hash_value), hash_value)
+
+    def _write_lock(self, root):
+        with self._volume_lock:
+            lock = self._write_locks.get(root)
+            if lock is None:
+                lock = self._write_locks[root] = threading.Lock()
+            return lock
+
+    def exists(self, hash_value):
+        return self.db.get_blob(hash_value) is not None
+
+    # Escrita
+    def put(self, hash_value, compressed: bytes, size_original, base_hash=None, delta_depth=0):
+        """
+        Gravar um blob comprimido e registra-lo no MetadataDB; retorna onde ficou.
+        base_hash/delta_depth descrevem blobs gravados como delta (ver core.delta).
+        """
+        delta = {'base_hash': base_hash, 'delta_depth': delta_depth}
+        if len(compressed) < self.inline_limit:
+            self.db.add_blob(hash_value, None, size_original, len(compressed),
+                             inline_data=compressed, **delta)
+            return self.db.db_path
+
+        root = self.ring.volume_for(hash_value)
+        if len(compressed) >= self.small_blob_limit:
+            blob_path = self._blob_path(hash_value)
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            # O lock do volume impede que o GC apague o arquivo entre a escrita e o registro
+            with self._write_lock(root):
+                write_file_atomic(blob_path, compressed, fsync=False)
+                self.db.add_blob(
+                    hash_value=hash_value,
+                    compressed_path=blob_path,
+                    size_original=size_original,
+                    size_compressed=len(compressed),
+                    **delta
+                )
+            return blob_path
+
+        with self._write_lock(root):
+            open_pack = self._writable_pack(root)
+            pack_id, pack_path, f, offset = open_pack
+            f.write(compressed)
+            f.flush()
+            new_size = offset + len(compressed)
+            open_pack[3] = new_size
+            self.db.add_packed_blob(hash_value, pack_path, size_original, len(compressed),
+                                    pack_id, offset, new_size, **delta)
+            if new_size >= self.segment_size:
+                self._seal_open_pack(root)
+        return pack_path
+
+    def _writable_pack(self, root):
+        if root not in self._open_packs:
+            pack_folder = os.path.join(root, 'packs')
+            row = next((row for row in self.db.get_open_packs()
+                        if os.path.normpath(os.path.dirname(row[1])) == os.path.normpath(pack_folder)), None)
+            if row is None:
+                self._pack_paths = self.db.get_pack_paths()
+                next_number = max(self._pack_paths, default=0) + 1
+                pack_path = os.path.join(pack_folder, f'pack-{next_number:06d}.pack')
+                pack_id = self.db.add_pack(pack_path)
+                size = 0
+                open(pack_path, 'ab').close()
+            else:
+                pack_id, pack_path, size = row
+            f = open(pack_path, 'r+b')
+            # Bytes alem do tamanho registrado sao de uma escrita interrompida
+            f.truncate(size)
+            f.seek(size)
+            self._pack_paths[pack_id] = pack_path
+            self._open_packs[root] = [pack_id, pack_path, f, size]
+        return self._open_packs[root]
+
+    def _seal_open_pack(self, root):
+        pack_id, _, f, _ = self._open_packs.pop(root)
+        os.fsync(f.fileno())
+        f.close()
+        self.db.seal_pack(pack_id)
+
+    # Leitura
+    def get(self, hash_value):
+        """Ler o blob comprimido; None se o hash nao existir"""
+        blob = self.db.get_blob(hash_value)
+        if not blob:
+            return None
+        return self.read_blob(blob)
+
+    def read_blob(self, blob):
+        """Ler o conteudo comprimido a partir de uma linha da tabela blobs"""
+        compressed_path, size_compressed = blob[1], blob[3]
+        pack_id, pack_offset = blob[5], blob[6]
+        inline_data = blob[10] if len(blob) > 10 else None
+        if inline_data is not None:
+            return bytes(inline_data)
+        if pack_id is None:
+            try:
+                with open(compressed_path, 'rb') as f:
+                    return f.read()
+            except FileNotFoundError:
+                # O rebalanceamento pode ter movido o blob depois da consulta
+                current = self.db.get_blob(blob[0])
+                if current is None or current[1] == compressed_path:
+                    raise
+                with open(current[1], 'rb') as f:
+                    return f.read()
+        try:
+            return self._pread(self._pack_fd(pack_id), size_compressed, pack_offset)
+        except (FileNotFoundError, KeyError):
+            # O pack pode ter sido compactado depois da consulta
+            current = self.db.get_blob(blob[0])
+            if current is None or current[5] == pack_id:
+                raise
+            return self.read_blob(current)
+
+    def _pack_fd(self, pack_id):
+        fd = self._read_fds.get(pack_id)
+        if fd is None:
+            with self._read_lock:
+                fd = self._read_fds.get(pack_id)
+                if fd is None:
+                    pack_path = self._pack_paths.get(pack_id)
+                    if pack_path is None:
+                        self._pack_paths = self.db.get_pack_paths()
+                        pack_path = self._pack_paths[pack_id]
+                    fd = os.open(pack_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+                    self._read_fds[pack_id] = fd
+        return fd
+
+    def _pread(self, fd, length, offset):
+        if hasattr(os, 'pread'):
+            return os.pread(fd, length, offset)
+        # Windows nao tem pread: seek + read serializados
+        with self._read_lock:
+            os.lseek(fd, offset, os.SEEK_SET)
+            return os.read(fd, length)
+
+    # Coleta de lixo
+    def delete_unreferenced(self, hash_value):
+        """
+        Apagar um blob sem referencias. Retorna (tamanho, pack_id) do blob
+        apagado, ou None se ele voltou a ser referenciado.
+        """
+        with self._write_lock(self.ring.volume_for(hash_value)):
+            row = self.db.delete_unreferenced_blob(hash_value)
+            if row is None:
+                return None
+            compressed_path, size_compressed, pack_id = row
+            if pack_id is None and compressed_path is not None:
+                try:
+                    os.remove(compressed_path)
+                except FileNotFoundError:
+                    pass
+            # Blobs em packs viram espaco morto, recuperado por compact_pack();
+            # blobs inline somem junto com a linha
+            return size_compressed, pack_id
+
+    def compact_pack(self, pack_id, pack_path, throttle=None):
+        """
+        Copiar os blobs vivos de um pack selado para os packs abertos e apagar o
+        pack antigo. throttle(bytes) e chamado apos cada copia (orcamento de I/O).
+        """
+        fd = os.open(pack_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            for hash_value, offset, size in self.db.get_pack_blobs(pack_id):
+                data = self._pread(fd, size, offset)
+                root = self.ring.volume_for(hash_value)
+                with self._write_lock(root):
+                    open_pack = self._writable_pack(root)
+                    new_pack_id, new_path, f, new_offset = open_pack
+                    f.write(data)
+                    f.flush()
+                    open_pack[3] = new_offset + size
+                    self.db.move_packed_blob(hash_value, pack_id, new_path, new_pack_id,
+                                             new_offset, new_offset + size)
+                    if open_pack[3] >= self.segment_size:
+                        self._seal_open_pack(root)
+                if throttle is not None:
+                    throttle(size)
+        finally:
+            os.close(fd)
+
+        # Persistir as copias antes de apagar a origem
+        for root in list(self._open_packs):
+            with self._write_lock(root):
+                open_pack = self._open_packs.get(root)
+                if open_pack is not None:
+                    os.fsync(open_pack[2].fileno())
+
+        self.db.delete_pack(pack_id)
+        with self._read_lock:
+            self._pack_paths.pop(pack_id, None)
+            # Leitores podem estar usando o fd agora: so e fechado no proximo ciclo
+            fd = self._read_fds.pop(pack_id, None)
+            if fd is not None:
+                self._retired_fds.append(fd)
+        # No Windows o arquivo nao pode ser apagado com o fd aposentado aberto:
+        # fica pendente ate release_retired_fds fecha-lo
+        self._remove_pack_file(pack_path)
+
+    def _remove_pack_file(self, pack_path):
+        try:
+            os.remove(pack_path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            with self._read_lock:
+                self._pending_removals.append(pack_path)
+
+    def release_retired_fds(self):
+        """Fechar os fds de packs apagados num ciclo anterior do GC e apagar os arquivos pendentes"""
+        with self._read_lock:
+            retired, self._retired_fds = self._retired_fds, []
+            pending, self._pending_removals = self._pending_removals, []
+        for fd in retired:
+            os.close(fd)
+        for pack_path in pending:
+            self._remove_pack_file(pack_path)
+
+    # Recompressao
+    def replace(self, blob, compressed, level):
+        """
+        Trocar o conteudo comprimido de um blob (mesmos dados descomprimidos)
+        por compressed. Blobs inline continuam inline, blobs com arquivo proprio
+        sao substituidos atomicamente no mesmo caminho e blobs em packs sao
+        anexados a um pack aberto (a copia antiga vira espaco morto, recuperado
+        pela compactacao). Retorna False se o blob mudou desde a leitura de blob.
+        """
+        hash_value = blob[0]
+        if blob[10] is not None:
+            return self.db.replace_blob_data(blob, len(compressed), level, inline_data=compressed)
+
+        root = self.ring.volume_for(hash_value)
+        with self._write_lock(root):
+            current = self.db.get_blob(hash_value)
+            if current is None or current[1:7] != blob[1:7]:
+                return False
+            if blob[5] is None:
+                # Leitores leem o arquivo inteiro: veem a versao antiga ou a nova
+                write_file_atomic(blob[1], compressed, fsync=True)
+                return self.db.replace_blob_data(blob, len(compressed), level, compressed_path=blob[1])
+
+            open_pack = self._writable_pack(root)
+            pack_id, pack_path, f, offset = open_pack
+            f.write(compressed)
+            f.flush()
+            open_pack[3] = offset + len(compressed)
+            replaced = self.db.replace_blob_data(blob, len(compressed), level, compressed_path=pack_path,
+                                                 pack_id=pack_id, pack_offset=offset,
+                                                 pack_size=open_pack[3])
+            if open_pack[3] >= self.segment_size:
+                self._seal_open_pack(root)
+            return replaced
+
+    # Volumes
+    def add_volume(self, root, weight=1, rebalance=True):
+        """
+        Adicionar um volume ao anel. Com rebalance=True os blobs que passam a
+        pertencer ao novo volume sao movidos em segundo plano; leituras
+        continuam funcionando durante a migracao.
+        """
+        os.makedirs(os.path.join(root, 'packs'), exist_ok=True)
+        self.ring.add_volume(root, weight)
+        if rebalance:
+            self.start_rebalance()
+
+    def start_rebalance(self):
+        if self._rebalance_thread is not None and self._rebalance_thread.is_alive():
+            return self._rebalance_thread
+        self._rebalance_thread = threading.Thread(target=self.rebalance, daemon=True,
+                                                  name='blob-rebalance')
+        self._rebalance_thread.start()
+        return self._rebalance_thread
+
+    def rebalance(self, batch_size=1000):
+        """
+        Mover blobs com arquivo proprio para o volume e caminho (fan-out)
+        indicados pelo anel atual. Tambem migra blobs do layout plano antigo.
+
+        Blobs em packs ficam onde estao: seu local e registrado por pack_id.
+        """
+        self.rebalance_stats['running'] = True
+        try:
+            after = ''
+            while True:
+                rows = self.db.get_standalone_blobs(after, batch_size)
+                if not rows:
+                    break
+                for hash_value, current_path in rows:
+                    target = self._blob_path(hash_value)
+                    if os.path.normpath(current_path) == os.path.normpath(target):
+                        continue
+                    try:
+                        with self._write_lock(self.ring.volume_for(hash_value)):
+                            # O blob pode ter sido coletado pelo GC desde a consulta
+                            if self.db.get_blob(hash_value) is not None:
+                                self._move_blob(hash_value, current_path, target)
+                    except OSError as e:
+                        self.rebalance_stats['errors'] += 1
+                        print(f"Erro ao mover blob {hash_value}: {e}")
+                after = rows[-1][0]
+        finally:
+            self.rebalance_stats['running'] = False
+
+    def _move_blob(self, hash_value, current_path, target):
+        target_folder = os.path.dirname(target)
+        os.makedirs(target_folder, exist_ok=True)
+        size = os.path.getsize(current_path)
+        try:
+            # Mesmo sistema de arquivos: hard link, sem copia
+            os.link(current_path, target)
+        except FileExistsError:
+            pass
+        except OSError:
+            tmp_path = f'{target}.tmp.{os.getpid()}.{threading.get_ident()}'
+            shutil.copyfile(current_path, tmp_path)
+            with open(tmp_path, 'rb+') as f:
+                os.fsync(f.fileno())
+            os.replace(tmp_path, target)
+        fsync_directory(target_folder)
+        # Leitores passam a usar o novo caminho antes de o antigo sumir
+        self.db.update_blob_path(hash_value, target)
+        os.remove(current_path)
+        self.rebalance_stats['moved'] += 1
+        self.rebalance_stats['bytes_moved'] += size
+
+    def get_placement_stats(self):
+        return {
+            'volumes': dict(self.ring.weights),
+            **self.rebalance_stats
+        }
+
+    def close(self):
+        if self._rebalance_thread is not None:
+            self._rebalance_thread.join()
+        for root in list(self._open_packs):
+            with self._write_lock(root):
+                open_pack = self._open_packs.pop(root, None)
+                if open_pack is not None:
+                    f = open_pack[2]
+                    os.fsync(f.fileno())
+                    f.close()
+        with self._read_lock:
+            for fd in list(self._read_fds.values()) + self._retired_fds:
+                os.close(fd)
+            self._read_fds.clear()
+            self._retired_fds = []
+            pending, self._pending_removals = self._pending_removals, []
+        for pack_path in pending:
+            try:
+                os.remove(pack_path)
+            except OSError:
+                pass
@@ -0,0 +1,39 @@
+import hashlib
+import math
+import struct
+
+
+class BloomFilter:
+    """
+    Filtro de Bloom sobre hashes de blobs: "nao contem" e definitivo, "contem"
+    pode ser falso positivo (taxa ~error_rate ate capacity itens). Itens nao
+    sao removidos; um blob coletado so custa uma consulta a mais ao banco.
+    """
+
+    def __init__(self, capacity=100000, error_rate=0.01):
+        capacity = max(int(capacity), 1)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # Hashing duplo (Kirsch-Mitzenmacher) sobre um blake2b de 128 bits
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = struct.unpack('<QQ', digest)
+        h2 |= 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def is_full(self):
+        return self.count > self.capacity
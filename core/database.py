@@ -1,11 +1,241 @@
 import sqlite3
 import os
+import json
+import collections
+import concurrent.futures
+import contextlib
+import queue
+import threading
+import time
+
+from .bloom import BloomFilter
+
+_MISSING = object()
+
+
+class _RowCache:
+    """
+    LRU de linhas do banco (inclusive "nao existe"), invalidado pela thread
+    escritora depois do commit. A geracao impede que uma leitura iniciada
+    antes de uma invalidacao guarde a linha antiga.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()  # {chave: linha | None}
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            row = self.entries.get(key, _MISSING)
+            if row is _MISSING:
+                self.misses += 1
+            else:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            return row
+
+    def put(self, key, row, generation):
+        with self.lock:
+            if generation != self.generation or not self.maxsize:
+                return
+            self.entries[key] = row
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, keys=None):
+        """Descartar as chaves (todas se keys for None)"""
+        with self.lock:
+            self.generation += 1
+            if keys is None:
+                self.entries.clear()
+            else:
+                for key in keys:
+                    self.entries.pop(key, None)
+
+    def get_stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries),
+                    'hit_rate': self.hits / total * 100 if total else 0}
+
 
 class MetadataDB:
-    def __init__(self, db_path='metadata.db'):
+    """
+    Metadados em SQLite (modo WAL).
+
+    Leituras usam uma conexao por thread, entao correm em paralelo sem lock.
+    Escritas vao para uma unica thread escritora por uma fila: cada lote de
+    escritas pendentes vira uma transacao so (group commit), com um savepoint
+    por escrita para que a falha de uma nao desfaca as outras. Os metodos de
+    escrita esperam o commit; submit(fn) devolve um Future para quem nao quer
+    esperar.
+    """
+
+    def __init__(self, db_path='metadata.db', blob_filter=True, max_batch=256, row_cache_size=4096):
         self.db_path = db_path
-        self.conn = sqlite3.connect(self.db_path)
+        self.max_batch = max_batch
+        # Conexao da thread escritora (autocommit: as transacoes sao abertas por lote)
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self.lock = threading.RLock()
+        # Bancos em memoria nao podem ter varias conexoes: leituras usam a escritora com lock
+        self._pooled = db_path != ':memory:' and not db_path.startswith('file:')
+        if self._pooled:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+        self._readers = {}  # {thread: conexao de leitura}
+        self._readers_lock = threading.Lock()
+        self._local = threading.local()
         self.create_tables()
+        # Filtro de Bloom dos hashes de blobs: responde "nao existe" sem consultar o SQLite.
+        # Cobre os blobs existentes na abertura e os inseridos por esta instancia; outro
+        # processo que insira blobs no mesmo banco deve abrir com blob_filter=False.
+        # Nao e persistido: um filtro salvo por outra instancia ficaria velho sem aviso.
+        self.blob_filter = self._build_blob_filter() if blob_filter else None
+
+        # LRU de linhas quentes: hash -> blob e caminho -> arquivo
+        self._blob_rows = _RowCache(row_cache_size)
+        self._file_rows = _RowCache(row_cache_size)
+        # Chaves alteradas pelo lote em andamento (so a thread escritora mexe)
+        self._dirty_blobs = set()
+        self._dirty_files = set()
+
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True, name='metadata-writer')
+        self._writer.start()
+
+    # Conexoes
+    @contextlib.contextmanager
+    def _read(self):
+        """Cursor de leitura da thread atual (ve apenas escritas ja commitadas)"""
+        if not self._pooled or threading.current_thread() is getattr(self, '_writer', None):
+            # A thread escritora le pela propria conexao, vendo o lote em andamento
+            with self.lock:
+                yield self.conn.cursor()
+            return
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._open_reader()
+        yield conn.cursor()
+
+    def _open_reader(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        with self._readers_lock:
+            # Conexoes de threads que ja terminaram sao fechadas
+            for thread in [t for t in self._readers if not t.is_alive()]:
+                self._readers.pop(thread).close()
+            self._readers[threading.current_thread()] = conn
+        return conn
+
+    def submit(self, fn):
+        """
+        Enfileirar fn(cur) para a thread escritora; o Future resolve com o
+        retorno de fn depois do commit (duravel) ou com a excecao de fn.
+        Como fn pode alterar qualquer linha, os caches de linhas sao esvaziados.
+        """
+        def write(cur):
+            self._dirty_blobs.add(None)
+            self._dirty_files.add(None)
+            return fn(cur)
+        return self._submit(write)
+
+    def _submit(self, fn):
+        future = concurrent.futures.Future()
+        if threading.current_thread() is self._writer:
+            # Escrita aninhada (de dentro de outra escrita): entra no mesmo lote
+            try:
+                future.set_result(fn(self.conn.cursor()))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        self._queue.put((fn, future))
+        return future
+
+    def _write(self, fn):
+        return self._submit(fn).result()
+
+    def _invalidate_rows(self):
+        blobs, self._dirty_blobs = self._dirty_blobs, set()
+        files, self._dirty_files = self._dirty_files, set()
+        if blobs:
+            self._blob_rows.invalidate(None if None in blobs else blobs)
+        if files:
+            self._file_rows.invalidate(None if None in files else files)
+
+    def _cached_row(self, cache, key, query):
+        """Linha de key pelo LRU; na falta, query(cur) e guardada se nada mudou no meio"""
+        in_writer = threading.current_thread() is self._writer
+        if not in_writer:
+            row = cache.get(key)
+            if row is not _MISSING:
+                return row
+        generation = cache.generation
+        with self._read() as cur:
+            row = query(cur)
+        if not in_writer:
+            # A thread escritora ve linhas ainda nao commitadas: nao vao para o cache
+            cache.put(key, row, generation)
+        return row
+
+    def get_cache_stats(self):
+        """Acertos e falhas dos caches de linhas (blobs por hash, arquivos por caminho)"""
+        return {'blob_rows': self._blob_rows.get_stats(), 'file_rows': self._file_rows.get_stats()}
+
+    def flush(self):
+        """Esperar as escritas enfileiradas ate agora"""
+        self._write(lambda cur: None)
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            # Juntar o que ja estiver na fila num unico commit
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        results = []
+        with self.lock:
+            cur = self.conn.cursor()
+            try:
+                cur.execute('BEGIN')
+                for fn, future in batch:
+                    cur.execute('SAVEPOINT write')
+                    try:
+                        results.append((future, fn(cur), None))
+                        cur.execute('RELEASE write')
+                    except Exception as e:
+                        cur.execute('ROLLBACK TO write')
+                        cur.execute('RELEASE write')
+                        results.append((future, None, e))
+                cur.execute('COMMIT')
+            except Exception as e:
+                if self.conn.in_transaction:
+                    self.conn.rollback()
+                for _, future in batch:
+                    future.set_exception(e)
+                return
+            finally:
+                # Depois do commit (ou rollback): leituras seguintes vao ao banco
+                self._invalidate_rows()
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
 
     def create_tables(self):
         cur = self.conn.cursor()
@@ -29,114 +259,655 @@ class MetadataDB:
             )
         ''')
 
-        self.conn.commit()
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS packs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT UNIQUE,
+                size INTEGER DEFAULT 0,
+                sealed INTEGER DEFAULT 0
+            )
+        ''')
 
-    def add_file(self, path, hash_value, size):
-        cur = self.conn.cursor()
+        self._add_missing_columns(cur, 'files', {
+            'chunks': 'TEXT'  # JSON [hash | null] de arquivos esparsos
+        })
+
+        self._add_missing_columns(cur, 'blobs', {
+            'pack_id': 'INTEGER',
+            'pack_offset': 'INTEGER',
+            'zero_since': 'REAL',  # momento em que ref_count chegou a zero (carencia do GC)
+            'verified_at': 'REAL',  # ultima verificacao de integridade (scrub)
+            'scrub_status': 'TEXT',  # 'ok', 'corrupt' ou 'missing'
+            'inline_data': 'BLOB',  # conteudo comprimido de blobs minusculos, sem arquivo
+            'base_hash': 'TEXT',  # blob base de um delta (a base fica fixada por uma referencia)
+            'delta_depth': 'INTEGER DEFAULT 0',
+            'accessed_at': 'REAL',  # ultima leitura conhecida (recompressao de blobs frios)
+            'compression_level': 'INTEGER'  # nivel zstd apos recompressao; NULL = nivel da ingestao
+        })
+
+        # Indice de similaridade: super-features de cada blob
         cur.execute('''
-            INSERT OR REPLACE INTO files (path, hash, size)
-            VALUES (?, ?, ?)
-        ''', (path, hash_value, size))
+            CREATE TABLE IF NOT EXISTS sketches (
+                feature INTEGER,
+                hash TEXT
+            )
+        ''')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_sketches_feature ON sketches (feature)')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_sketches_hash ON sketches (hash)')
+
+        # Arvore de diretorios do VFS (chunks: JSON [hash | null] dos arquivos)
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS inodes (
+                ino INTEGER PRIMARY KEY AUTOINCREMENT,
+                parent INTEGER,
+                name TEXT,
+                mode INTEGER,
+                mtime REAL,
+                size INTEGER DEFAULT 0,
+                chunks TEXT
+            )
+        ''')
+        cur.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_inodes_parent_name ON inodes (parent, name)')
+
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS scrub_state (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+
         self.conn.commit()
 
+    # Filtro de existencia de blobs
+    def _build_blob_filter(self):
+        """Filtro com todos os hashes da tabela (uma varredura do indice de hashes)"""
+        with self._read() as cur:
+            cur.execute('SELECT COUNT(*) FROM blobs')
+            bloom = BloomFilter(capacity=max(100000, cur.fetchone()[0] * 2))
+            cur.execute('SELECT hash FROM blobs')
+            for (hash_value,) in cur:
+                bloom.add(hash_value)
+            return bloom
+
+    def _might_have_blob(self, hash_value):
+        return self.blob_filter is None or hash_value in self.blob_filter
+
+    def _add_missing_columns(self, cur, table, columns):
+        """Migrar bancos antigos adicionando colunas novas"""
+        cur.execute(f'PRAGMA table_info({table})')
+        existing = {row[1] for row in cur.fetchall()}
+        for name, column_type in columns.items():
+            if name not in existing:
+                cur.execute(f'ALTER TABLE {table} ADD COLUMN {name} {column_type}')
+
+    def add_file(self, path, hash_value, size, chunks=None):
+        """
+        Registrar (ou sobrescrever) um arquivo; a referencia ao conteudo antigo e liberada.
+        chunks: lista de hashes por bloco (None = bloco zerado) de arquivos esparsos;
+        nesse caso as referencias sao dos chunks, nao de hash_value.
+        """
+        def write(cur):
+            cur.execute('SELECT hash, chunks FROM files WHERE path=?', (path,))
+            previous = cur.fetchone()
+            cur.execute('''
+                INSERT OR REPLACE INTO files (path, hash, size, chunks)
+                VALUES (?, ?, ?, ?)
+            ''', (path, hash_value, size, json.dumps(chunks) if chunks is not None else None))
+            if previous:
+                self._release_file(cur, previous)
+            self._dirty_files.add(path)
+        self._write(write)
+
+    def remove_file(self, path):
+        """Remover um arquivo e liberar as referencias ao seu conteudo"""
+        def write(cur):
+            cur.execute('SELECT hash, chunks FROM files WHERE path=?', (path,))
+            previous = cur.fetchone()
+            if not previous:
+                return False
+            cur.execute('DELETE FROM files WHERE path=?', (path,))
+            self._release_file(cur, previous)
+            self._dirty_files.add(path)
+            return True
+        return self._write(write)
+
+    def _release_file(self, cur, row):
+        for hash_value in self._content_hashes(row):
+            self._decrement_ref(cur, hash_value)
+
+    @staticmethod
+    def _content_hashes(row):
+        """Blobs referenciados por uma linha (hash, chunks) da tabela files"""
+        hash_value, chunks = row
+        if chunks is None:
+            return [hash_value]
+        return [h for h in json.loads(chunks) if h is not None]
+
+    def get_file_hashes(self):
+        """Todos os blobs referenciados pela tabela files (uma entrada por referencia)"""
+        with self._read() as cur:
+            cur.execute('SELECT hash, chunks FROM files')
+            return [h for row in cur.fetchall() for h in self._content_hashes(row)]
+
+    def get_file_chunks(self, path):
+        """Chunks de um arquivo esparso, ou None se o arquivo e um blob unico"""
+        with self._read() as cur:
+            cur.execute('SELECT chunks FROM files WHERE path=?', (path,))
+            row = cur.fetchone()
+            return json.loads(row[0]) if row and row[0] is not None else None
+
     def get_file_by_path(self, path):
-        cur = self.conn.cursor()
-        cur.execute('SELECT * FROM files WHERE path=?', (path,))
-        return cur.fetchone()
+        def query(cur):
+            cur.execute('SELECT * FROM files WHERE path=?', (path,))
+            return cur.fetchone()
+        return self._cached_row(self._file_rows, path, query)
 
-    def add_blob(self, hash_value, compressed_path, size_original, size_compressed):
-        cur = self.conn.cursor()
+    def clone_file(self, src_path, dst_path):
+        """Copiar a linha de um arquivo para dst_path (ver _clone_files); False se src nao existir"""
+        return self._clone_files('path = ?', (src_path,), src_path, dst_path) == 1
+
+    def clone_tree(self, src_prefix, dst_prefix):
+        """Copiar todos os arquivos sob src_prefix para dst_prefix; retorna quantos foram copiados"""
+        return self._clone_files('substr(path, 1, ?) = ?', (len(src_prefix), src_prefix),
+                                 src_prefix, dst_prefix)
+
+    def _clone_files(self, where, params, src_prefix, dst_prefix):
+        """
+        Copiar as linhas de files selecionadas por where para dst_prefix + resto
+        do caminho, somando as referencias dos blobs numa unica transacao
+        (nenhum dado e lido ou gravado). Destinos existentes sao sobrescritos.
+        """
+        def write(cur):
+            cur.execute(f'SELECT path, hash, size, chunks FROM files WHERE {where}', params)
+            rows = cur.fetchall()
+            added = []
+            for path, hash_value, size, chunks in rows:
+                dst = dst_prefix + path[len(src_prefix):]
+                cur.execute('SELECT hash, chunks FROM files WHERE path=?', (dst,))
+                previous = cur.fetchone()
+                cur.execute('''
+                    INSERT OR REPLACE INTO files (path, hash, size, chunks)
+                    VALUES (?, ?, ?, ?)
+                ''', (dst, hash_value, size, chunks))
+                added.extend(self._content_hashes((hash_value, chunks)))
+                self._dirty_files.add(dst)
+                if previous:
+                    self._release_file(cur, previous)
+            self._add_refs(cur, added)
+            return len(rows)
+        # Uma falha no meio desfaz o savepoint da escrita inteira
+        return self._write(write)
+
+    # Arvore do VFS
+    def get_inodes(self):
+        """Todos os nos [(ino, parent, name, mode, mtime, size, chunks)]"""
+        with self._read() as cur:
+            cur.execute('SELECT ino, parent, name, mode, mtime, size, chunks FROM inodes')
+            return cur.fetchall()
+
+    def add_inode(self, parent, name, mode, mtime, ino=None):
+        def write(cur):
+            cur.execute('''
+                INSERT INTO inodes (ino, parent, name, mode, mtime) VALUES (?, ?, ?, ?, ?)
+            ''', (ino, parent, name, mode, mtime))
+            return cur.lastrowid
+        return self._write(write)
+
+    def update_inode(self, ino, size, chunks, mtime, released=()):
+        """Gravar o manifesto de um no; released perde uma referencia na mesma transacao"""
+        self.update_inodes([(ino, size, chunks, mtime, released)])
+
+    def update_inodes(self, rows):
+        """Gravar varios manifestos [(ino, size, chunks, mtime, released)] numa unica transacao"""
+        def write(cur):
+            for ino, size, chunks, mtime, released in rows:
+                cur.execute('UPDATE inodes SET size=?, chunks=?, mtime=? WHERE ino=?',
+                            (size, json.dumps(chunks), mtime, ino))
+                self._release_refs(cur, released)
+        self._write(write)
+
+    def move_inode(self, ino, parent, name, replaced=None, released=()):
+        """Renomear um no (e todo o seu conteudo); replaced e o no sobrescrito no destino"""
+        def write(cur):
+            if replaced is not None:
+                cur.execute('DELETE FROM inodes WHERE ino=?', (replaced,))
+            cur.execute('UPDATE inodes SET parent=?, name=? WHERE ino=?', (parent, name, ino))
+            self._release_refs(cur, released)
+        self._write(write)
+
+    def delete_inode(self, ino, released=()):
+        def write(cur):
+            cur.execute('DELETE FROM inodes WHERE ino=?', (ino,))
+            self._release_refs(cur, released)
+        self._write(write)
+
+    def _release_refs(self, cur, hashes):
+        for hash_value in hashes:
+            self._decrement_ref(cur, hash_value)
+
+    def recount_blob_refs(self):
+        """
+        Recalcular o ref_count de todos os blobs a partir das referencias gravadas
+        (manifestos dos inodes, tabela files e bases de deltas). Corrige
+        contadores que uma queda deixou adiantados; retorna quantos mudaram.
+        """
+        def write(cur):
+            counts = collections.Counter()
+            cur.execute('SELECT chunks FROM inodes WHERE chunks IS NOT NULL')
+            for (chunks,) in cur.fetchall():
+                counts.update(h for h in json.loads(chunks) if h is not None)
+            cur.execute('SELECT hash, chunks FROM files')
+            for row in cur.fetchall():
+                counts.update(h for h in self._content_hashes(row) if h is not None)
+            cur.execute('SELECT base_hash FROM blobs WHERE base_hash IS NOT NULL')
+            counts.update(row[0] for row in cur.fetchall())
+
+            cur.execute('SELECT hash, ref_count FROM blobs')
+            changed = [(counts[h], counts[h], time.time(), h)
+                       for h, ref_count in cur.fetchall() if ref_count != counts[h]]
+            cur.executemany('''
+                UPDATE blobs SET ref_count=?,
+                                 zero_since = CASE WHEN ? <= 0 THEN COALESCE(zero_since, ?) ELSE NULL END
+                WHERE hash=?
+            ''', changed)
+            self._dirty_blobs.update(row[3] for row in changed)
+            return len(changed)
+        return self._write(write)
+
+    def add_blob(self, hash_value, compressed_path, size_original, size_compressed,
+                 pack_id=None, pack_offset=None, inline_data=None, base_hash=None, delta_depth=0):
+        """
+        Registrar um blob. Para deltas, a base ja deve ter sido fixada pelo
+        chamador (increment_blob_ref); se o blob ja existia, a fixacao e desfeita.
+        """
+        self._write(lambda cur: self._insert_blob(cur, hash_value, compressed_path, size_original,
+                                                  size_compressed, pack_id, pack_offset, inline_data,
+                                                  base_hash, delta_depth))
+
+    def add_packed_blob(self, hash_value, pack_path, size_original, size_compressed,
+                        pack_id, pack_offset, pack_size, base_hash=None, delta_depth=0):
+        """Registrar um blob anexado a um pack e o novo tamanho do pack na mesma transacao"""
+        def write(cur):
+            self._insert_blob(cur, hash_value, pack_path, size_original, size_compressed,
+                              pack_id, pack_offset, None, base_hash, delta_depth)
+            cur.execute('UPDATE packs SET size=? WHERE id=?', (pack_size, pack_id))
+        self._write(write)
+
+    def _insert_blob(self, cur, hash_value, compressed_path, size_original, size_compressed,
+                     pack_id, pack_offset, inline_data, base_hash, delta_depth):
         cur.execute('''
-            INSERT OR IGNORE INTO blobs (hash, compressed_path, size_original, size_compressed, ref_count)
-            VALUES (?, ?, ?, ?, 1)
-        ''', (hash_value, compressed_path, size_original, size_compressed))
-        self.conn.commit()
+            INSERT OR IGNORE INTO blobs (hash, compressed_path, size_original, size_compressed, ref_count,
+                                         pack_id, pack_offset, inline_data, base_hash, delta_depth,
+                                         accessed_at)
+            VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?, ?, ?)
+        ''', (hash_value, compressed_path, size_original, size_compressed, pack_id, pack_offset,
+              inline_data, base_hash, delta_depth, time.time()))
+        self._dirty_blobs.add(hash_value)
+        if cur.rowcount and self.blob_filter is not None:
+            self.blob_filter.add(hash_value)
+            if self.blob_filter.is_full():
+                # Acima da capacidade a taxa de falsos positivos cresce: dobrar
+                self.blob_filter = self._build_blob_filter()
+        if cur.rowcount == 0 and base_hash is not None:
+            self._decrement_ref(cur, base_hash)
 
     def increment_blob_ref(self, hash_value):
-        cur = self.conn.cursor()
-        cur.execute('''
-            UPDATE blobs SET ref_count = ref_count + 1 WHERE hash=?
-        ''', (hash_value,))
-        self.conn.commit()
+        """Adicionar uma referencia; False se o blob nao existir (ex.: ja coletado pelo GC)"""
+        if not self._might_have_blob(hash_value):
+            return False
+        def write(cur):
+            cur.execute('''
+                UPDATE blobs SET ref_count = ref_count + 1, zero_since = NULL WHERE hash=?
+            ''', (hash_value,))
+            self._dirty_blobs.add(hash_value)
+            return cur.rowcount > 0
+        return self._write(write)
+
+    def add_blob_refs(self, hashes):
+        """Adicionar uma referencia por ocorrencia em hashes, numa unica transacao"""
+        self._write(lambda cur: self._add_refs(cur, hashes))
+
+    def _add_refs(self, cur, hashes):
+        counts = collections.Counter(hashes)
+        self._dirty_blobs.update(counts)
+        cur.executemany('''
+            UPDATE blobs SET ref_count = ref_count + ?, zero_since = NULL WHERE hash=?
+        ''', [(n, h) for h, n in counts.items()])
 
     def decrement_blob_ref(self, hash_value):
-        cur = self.conn.cursor()
+        self._write(lambda cur: self._decrement_ref(cur, hash_value))
+
+    def _decrement_ref(self, cur, hash_value):
+        self._dirty_blobs.add(hash_value)
         cur.execute('''
-            UPDATE blobs SET ref_count = ref_count - 1 WHERE hash=?
-        ''', (hash_value,))
-        self.conn.commit()
+            UPDATE blobs SET ref_count = ref_count - 1,
+                             zero_since = CASE WHEN ref_count <= 1 THEN ? ELSE NULL END
+            WHERE hash=?
+        ''', (time.time(), hash_value))
+
+    def set_blob_ref(self, hash_value, ref_count):
+        """Corrigir o contador de referencias (usado pela fase de marcacao do GC)"""
+        def write(cur):
+            cur.execute('''
+                UPDATE blobs SET ref_count=?, zero_since = CASE WHEN ? <= 0 THEN zero_since ELSE NULL END
+                WHERE hash=?
+            ''', (ref_count, ref_count, hash_value))
+            self._dirty_blobs.add(hash_value)
+        self._write(write)
+
+    def get_unreferenced_blobs(self, cutoff, limit=500):
+        """Blobs sem referencias desde antes de cutoff (candidatos do GC)"""
+        with self._read() as cur:
+            cur.execute('''
+                SELECT hash FROM blobs WHERE ref_count <= 0 AND zero_since <= ? LIMIT ?
+            ''', (cutoff, limit))
+            return [row[0] for row in cur.fetchall()]
+
+    def delete_unreferenced_blob(self, hash_value):
+        """
+        Apagar o registro de um blob apenas se ainda nao tiver referencias.
+        Retorna (compressed_path, size_compressed, pack_id) do blob apagado, ou None.
+        """
+        def write(cur):
+            cur.execute('''
+                SELECT compressed_path, size_compressed, pack_id, base_hash FROM blobs
+                WHERE hash=? AND ref_count <= 0
+            ''', (hash_value,))
+            row = cur.fetchone()
+            if not row:
+                return None
+            cur.execute('DELETE FROM blobs WHERE hash=?', (hash_value,))
+            cur.execute('DELETE FROM sketches WHERE hash=?', (hash_value,))
+            self._dirty_blobs.add(hash_value)
+            if row[3] is not None:
+                # Liberar a base fixada pelo delta
+                self._decrement_ref(cur, row[3])
+            return row[:3]
+        return self._write(write)
 
     def get_blob(self, hash_value):
-        cur = self.conn.cursor()
-        cur.execute('SELECT * FROM blobs WHERE hash=?', (hash_value,))
-        return cur.fetchone()
+        if not self._might_have_blob(hash_value):
+            return None
+        def query(cur):
+            cur.execute('SELECT * FROM blobs WHERE hash=?', (hash_value,))
+            return cur.fetchone()
+        return self._cached_row(self._blob_rows, hash_value, query)
+
+    # Similaridade
+    def add_sketch(self, hash_value, features):
+        self._write(lambda cur: cur.executemany('INSERT INTO sketches (feature, hash) VALUES (?, ?)',
+                                                [(feature, hash_value) for feature in features]))
+
+    def find_similar(self, features, limit=4):
+        """Blobs vivos que compartilham super-features [(hash, compartilhadas)], mais parecidos primeiro"""
+        if not features:
+            return []
+        placeholders = ','.join('?' * len(features))
+        with self._read() as cur:
+            cur.execute(f'''
+                SELECT s.hash, COUNT(*) AS shared FROM sketches s
+                JOIN blobs b ON b.hash = s.hash
+                WHERE s.feature IN ({placeholders}) AND b.ref_count > 0
+                GROUP BY s.hash ORDER BY shared DESC LIMIT ?
+            ''', (*features, limit))
+            return cur.fetchall()
+
+    def get_paths_for_hash(self, hash_value):
+        with self._read() as cur:
+            cur.execute('SELECT path FROM files WHERE hash=? OR chunks LIKE ?',
+                        (hash_value, f'%"{hash_value}"%'))
+            return [row[0] for row in cur.fetchall()]
+
+    # Scrub
+    def get_blobs_after(self, after_hash='', limit=256):
+        """Linhas completas da tabela blobs, paginadas por hash"""
+        with self._read() as cur:
+            cur.execute('SELECT * FROM blobs WHERE hash > ? ORDER BY hash LIMIT ?', (after_hash, limit))
+            return cur.fetchall()
+
+    def record_scrub_results(self, results):
+        """Gravar [(hash, status, timestamp)] de uma rodada de verificacao"""
+        def write(cur):
+            cur.executemany('UPDATE blobs SET scrub_status=?, verified_at=? WHERE hash=?',
+                            [(status, ts, hash_value) for hash_value, status, ts in results])
+            self._dirty_blobs.update(hash_value for hash_value, _, _ in results)
+        self._write(write)
+
+    def get_damaged_blobs(self):
+        """Blobs marcados como corrompidos ou ausentes [(hash, scrub_status, verified_at)]"""
+        with self._read() as cur:
+            cur.execute('''
+                SELECT hash, scrub_status, verified_at FROM blobs
+                WHERE scrub_status IN ('corrupt', 'missing') ORDER BY hash
+            ''')
+            return cur.fetchall()
+
+    def get_scrub_state(self, key, default=None):
+        with self._read() as cur:
+            cur.execute('SELECT value FROM scrub_state WHERE key=?', (key,))
+            row = cur.fetchone()
+            return row[0] if row else default
+
+    def set_scrub_state(self, key, value):
+        self._write(lambda cur: cur.execute('INSERT OR REPLACE INTO scrub_state (key, value) VALUES (?, ?)',
+                                            (key, str(value))))
+
+    def get_standalone_blobs(self, after_hash='', limit=1000):
+        """Blobs com arquivo proprio [(hash, compressed_path)], paginados por hash"""
+        with self._read() as cur:
+            cur.execute('''
+                SELECT hash, compressed_path FROM blobs
+                WHERE pack_id IS NULL AND inline_data IS NULL AND hash > ? ORDER BY hash LIMIT ?
+            ''', (after_hash, limit))
+            return cur.fetchall()
+
+    def update_blob_path(self, hash_value, compressed_path):
+        def write(cur):
+            cur.execute('UPDATE blobs SET compressed_path=? WHERE hash=?', (compressed_path, hash_value))
+            self._dirty_blobs.add(hash_value)
+        self._write(write)
+
+    # Pack files
+    def touch_blobs(self, accessed):
+        """
+        Registrar leituras {hash: momento} numa unica transacao. Nao invalida o
+        cache de linhas: accessed_at so e consultado por get_cold_blobs.
+        """
+        self._write(lambda cur: cur.executemany('''
+            UPDATE blobs SET accessed_at = MAX(COALESCE(accessed_at, 0), ?) WHERE hash=?
+        ''', [(when, h) for h, when in accessed.items()]))
+
+    def get_cold_blobs(self, cutoff, level, limit=100):
+        """Blobs completos (nao delta) sem leitura desde cutoff e comprimidos abaixo de level"""
+        with self._read() as cur:
+            cur.execute('''
+                SELECT * FROM blobs
+                WHERE COALESCE(accessed_at, 0) < ? AND COALESCE(compression_level, 0) < ?
+                      AND base_hash IS NULL AND ref_count > 0
+                ORDER BY accessed_at LIMIT ?
+            ''', (cutoff, level, limit))
+            return cur.fetchall()
+
+    def set_blob_level(self, hash_value, level):
+        def write(cur):
+            cur.execute('UPDATE blobs SET compression_level=? WHERE hash=?', (level, hash_value))
+            self._dirty_blobs.add(hash_value)
+        self._write(write)
+
+    def replace_blob_data(self, blob, size_compressed, level, compressed_path=None, pack_id=None,
+                          pack_offset=None, pack_size=None, inline_data=None):
+        """
+        Apontar um blob para sua versao recomprimida. So troca se o local ainda
+        for o da linha blob (nao movido nem coletado desde a leitura).
+        """
+        def write(cur):
+            cur.execute('''
+                UPDATE blobs SET compressed_path=?, size_compressed=?, pack_id=?, pack_offset=?,
+                                 inline_data=?, compression_level=?
+                WHERE hash=? AND compressed_path IS ? AND size_compressed=? AND pack_id IS ?
+                      AND pack_offset IS ?
+            ''', (compressed_path, size_compressed, pack_id, pack_offset, inline_data, level,
+                  blob[0], blob[1], blob[3], blob[5], blob[6]))
+            replaced = cur.rowcount > 0
+            self._dirty_blobs.add(blob[0])
+            if pack_size is not None:
+                # Os bytes anexados ocupam o pack mesmo sem a troca
+                cur.execute('UPDATE packs SET size=? WHERE id=?', (pack_size, pack_id))
+            return replaced
+        return self._write(write)
+
+    def add_pack(self, path):
+        def write(cur):
+            cur.execute('INSERT OR IGNORE INTO packs (path, size, sealed) VALUES (?, 0, 0)', (path,))
+            cur.execute('SELECT id FROM packs WHERE path=?', (path,))
+            return cur.fetchone()[0]
+        return self._write(write)
+
+    def get_open_packs(self):
+        """Obter os packs ainda abertos para escrita [(id, path, size)], um por volume"""
+        with self._read() as cur:
+            cur.execute('SELECT id, path, size FROM packs WHERE sealed=0 ORDER BY id DESC')
+            return cur.fetchall()
+
+    def get_pack_paths(self):
+        with self._read() as cur:
+            cur.execute('SELECT id, path FROM packs')
+            return dict(cur.fetchall())
+
+    def update_pack_size(self, pack_id, size):
+        self._write(lambda cur: cur.execute('UPDATE packs SET size=? WHERE id=?', (size, pack_id)))
+
+    def seal_pack(self, pack_id):
+        self._write(lambda cur: cur.execute('UPDATE packs SET sealed=1 WHERE id=?', (pack_id,)))
+
+    def get_pack_usage(self):
+        """Packs selados com bytes vivos [(id, path, size, live_bytes)]"""
+        with self._read() as cur:
+            cur.execute('''
+                SELECT p.id, p.path, p.size, COALESCE(SUM(b.size_compressed), 0)
+                FROM packs p LEFT JOIN blobs b ON b.pack_id = p.id
+                WHERE p.sealed=1 GROUP BY p.id
+            ''')
+            return cur.fetchall()
+
+    def get_pack_blobs(self, pack_id):
+        """Blobs vivos de um pack [(hash, pack_offset, size_compressed)]"""
+        with self._read() as cur:
+            cur.execute('''
+                SELECT hash, pack_offset, size_compressed FROM blobs WHERE pack_id=? ORDER BY pack_offset
+            ''', (pack_id,))
+            return cur.fetchall()
+
+    def move_packed_blob(self, hash_value, old_pack_id, pack_path, pack_id, pack_offset, pack_size):
+        """Apontar um blob para sua copia em outro pack (compactacao)"""
+        def write(cur):
+            cur.execute('''
+                UPDATE blobs SET compressed_path=?, pack_id=?, pack_offset=?
+                WHERE hash=? AND pack_id=?
+            ''', (pack_path, pack_id, pack_offset, hash_value, old_pack_id))
+            cur.execute('UPDATE packs SET size=? WHERE id=?', (pack_size, pack_id))
+            self._dirty_blobs.add(hash_value)
+        self._write(write)
+
+    def delete_pack(self, pack_id):
+        self._write(lambda cur: cur.execute('DELETE FROM packs WHERE id=?', (pack_id,)))
+
+    # Estatisticas
+    def get_total_files(self):
+        """Obter numero total de arquivos"""
+        with self._read() as cur:
+            cur.execute('SELECT COUNT(*) FROM files')
+            return cur.fetchone()[0]
+
+    def get_total_blobs(self):
+        """Obter numero total de blobs unicos"""
+        with self._read() as cur:
+            cur.execute('SELECT COUNT(*) FROM blobs')
+            return cur.fetchone()[0]
+
+    def get_total_original_size(self):
+        """Obter tamanho total original de todos os blobs"""
+        with self._read() as cur:
+            cur.execute('SELECT SUM(size_original * ref_count) FROM blobs')
+            result = cur.fetchone()[0]
+            return result if result else 0
+
+    def get_total_compressed_size(self):
+        """Obter tamanho total comprimido de todos os blobs"""
+        with self._read() as cur:
+            cur.execute('SELECT SUM(size_compressed) FROM blobs')
+            result = cur.fetchone()[0]
+            return result if result else 0
+
+    def get_logical_size(self):
+        """Soma dos tamanhos logicos dos arquivos do VFS (buracos inclusos)"""
+        with self._read() as cur:
+            cur.execute('SELECT SUM(size) FROM inodes')
+            result = cur.fetchone()[0]
+            return result if result else 0
+
+    def get_blob_summaries(self, hashes):
+        """{hash: (size_compressed, ref_count, base_hash, inline)} sem ler os dados dos blobs"""
+        hashes = list(set(hashes))
+        summaries = {}
+        with self._read() as cur:
+            # Lotes abaixo do limite de variaveis do SQLite
+            for i in range(0, len(hashes), 500):
+                batch = hashes[i:i + 500]
+                cur.execute(f'''
+                    SELECT hash, size_compressed, ref_count, base_hash, inline_data IS NOT NULL
+                    FROM blobs WHERE hash IN ({','.join('?' * len(batch))})
+                ''', batch)
+                for row in cur.fetchall():
+                    summaries[row[0]] = (row[1], row[2], row[3], bool(row[4]))
+        return summaries
+
+    def get_duplicate_files_count(self):
+        """Obter numero de arquivos duplicados"""
+        with self._read() as cur:
+            cur.execute('''
+                SELECT COUNT(*) FROM files f
+                JOIN blobs b ON f.hash = b.hash
+                WHERE b.ref_count > 1
+            ''')
+            return cur.fetchone()[0]
+
+    def get_compression_stats(self):
+        """Obter estatisticas detalhadas de compressao"""
+        with self._read() as cur:
+            cur.execute('''
+                SELECT
+                    SUM(size_original * ref_count) as total_original,
+                    SUM(size_compressed) as total_compressed,
+                    AVG((size_original - size_compressed) * 100.0 / size_original) as avg_compression_ratio,
+                    COUNT(*) as total_blobs
+                FROM blobs
+                WHERE size_original > 0
+            ''')
+            return cur.fetchone()
+
+    def get_storage_efficiency(self):
+        """Calcular eficiencia de armazenamento"""
+        with self._read() as cur:
+            cur.execute('''
+                SELECT
+                    COUNT(DISTINCT f.hash) as unique_files,
+                    COUNT(f.id) as total_files,
+                    SUM(f.size) as total_file_size,
+                    SUM(b.size_compressed) as total_storage_used
+                FROM files f
+                JOIN blobs b ON f.hash = b.hash
+            ''')
+            return cur.fetchone()
 
     def close(self):
-        self.conn.close()
-
-
-# Adicionar estes metodos à classe MetadataDB:
-
-def get_total_files(self):
-    """Obter numero total de arquivos"""
-    cur = self.conn.cursor()
-    cur.execute('SELECT COUNT(*) FROM files')
-    return cur.fetchone()[0]
-
-def get_total_blobs(self):
-    """Obter numero total de blobs unicos"""
-    cur = self.conn.cursor()
-    cur.execute('SELECT COUNT(*) FROM blobs')
-    return cur.fetchone()[0]
-
-def get_total_original_size(self):
-    """Obter tamanho total original de todos os blobs"""
-    cur = self.conn.cursor()
-    cur.execute('SELECT SUM(size_original * ref_count) FROM blobs')
-    result = cur.fetchone()[0]
-    return result if result else 0
-
-def get_total_compressed_size(self):
-    """Obter tamanho total comprimido de todos os blobs"""
-    cur = self.conn.cursor()
-    cur.execute('SELECT SUM(size_compressed) FROM blobs')
-    result = cur.fetchone()[0]
-    return result if result else 0
-
-def get_duplicate_files_count(self):
-    """Obter numero de arquivos duplicados"""
-    cur = self.conn.cursor()
-    cur.execute('''
-        SELECT COUNT(*) FROM files f
-        JOIN blobs b ON f.hash = b.hash
-        WHERE b.ref_count > 1
-    ''')
-    return cur.fetchone()[0]
-
-def get_compression_stats(self):
-    """Obter estatisticas detalhadas de compressao"""
-    cur = self.conn.cursor()
-    cur.execute('''
-        SELECT 
-            SUM(size_original * ref_count) as total_original,
-            SUM(size_compressed) as total_compressed,
-            AVG((size_original - size_compressed) * 100.0 / size_original) as avg_compression_ratio,
-            COUNT(*) as total_blobs
-        FROM blobs
-        WHERE size_original > 0
-    ''')
-    return cur.fetchone()
-
-def get_storage_efficiency(self):
-    """Calcular eficiência de armazenamento"""
-    cur = self.conn.cursor()
-    cur.execute('''
-        SELECT 
-            COUNT(DISTINCT f.hash) as unique_files,
-            COUNT(f.id) as total_files,
-            SUM(f.size) as total_file_size,
-            SUM(b.size_compressed) as total_storage_used
-        FROM files f
-        JOIN blobs b ON f.hash = b.hash
-    ''')
-    return cur.fetchone()
+        # Drenar a fila: escritas ja aceitas sao commitadas antes de fechar
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        with self.lock:
+            with self._readers_lock:
+                for conn in self._readers.values():
+                    conn.close()
+                self._readers.clear()
+            self.conn.close()
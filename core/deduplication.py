@@ -24,3 +24,24 @@ def calculate_data_hash(data: bytes) -> str:
     :return: Hash SHA-256 em hexadecimal
     """
     return hashlib.sha256(data).hexdigest()
+
+
+# Granularidade da deteccao de regiões zeradas (igual ao chunk do VFS)
+ZERO_BLOCK_SIZE = 1024 * 1024
+_ZERO_BLOCK = bytes(ZERO_BLOCK_SIZE)
+
+
+def is_zero_block(data) -> bool:
+    """
+    Verifica se um bloco contem apenas bytes zero.
+
+    :param data: bytes, bytearray ou memoryview
+    :return: True se o bloco for todo zero (blocos vazios incluidos)
+    """
+    view = memoryview(data).cast('B')
+    # startswith aceita qualquer buffer e compara com memcmp, sem copiar o bloco
+    # (memoryview == bytes tambem nao copia, mas compara byte a byte)
+    for start in range(0, len(view), ZERO_BLOCK_SIZE):
+        if not _ZERO_BLOCK.startswith(view[start:start + ZERO_BLOCK_SIZE]):
+            return False
+    return True
@@ -0,0 +1,144 @@
+import math
+import threading
+
+import zstandard as zstd
+
+from .similarity import compute_sketch
+
+# Colunas da tabela blobs usadas pelos deltas
+BASE_HASH_COLUMN = 11
+DELTA_DEPTH_COLUMN = 12
+
+# Nivel minimo para o patch-from: abaixo dele o zstd quase nao usa a referencia
+DELTA_LEVEL = 9
+
+
+def _window_log(*sizes):
+    """Janela que cobre a base inteira e o novo conteudo"""
+    return min(31, max(10, math.ceil(math.log2(max(max(sizes), 1))) + 1))
+
+
+def encode_delta(data, base, level=DELTA_LEVEL):
+    """Comprimir data usando base como referencia (zstd patch-from)"""
+    reference = zstd.ZstdCompressionDict(base, dict_type=zstd.DICT_TYPE_RAWCONTENT)
+    params = zstd.ZstdCompressionParameters.from_level(
+        max(level, DELTA_LEVEL), window_log=_window_log(len(base), len(data)),
+        enable_ldm=True, source_size=len(data))
+    return zstd.ZstdCompressor(dict_data=reference, compression_params=params).compress(data)
+
+
+def decode_delta(delta, base, size):
+    reference = zstd.ZstdCompressionDict(base, dict_type=zstd.DICT_TYPE_RAWCONTENT)
+    decompressor = zstd.ZstdDecompressor(dict_data=reference,
+                                         max_window_size=1 << _window_log(len(base), size))
+    return decompressor.decompress(delta)
+
+
+class DeltaStore:
+    """
+    Compressao por similaridade sobre o BlobStore.
+
+    Na gravacao, calcula o sketch (MinHash) do conteudo, procura no indice de
+    similaridade um blob parecido e, se o delta zstd contra ele for menor que
+    max_delta_ratio da compressao normal, grava o delta. A base fica fixada
+    por uma referencia ate o delta ser coletado, e cadeias de deltas sao
+    limitadas a max_depth.
+    """
+
+    def __init__(self, db, blob_store, level=5, max_depth=4, min_size=8 * 1024,
+                 max_delta_ratio=0.5, candidates=3, cache=None):
+        self.db = db
+        self.blob_store = blob_store
+        self.level = level
+        self.max_depth = max_depth
+        self.min_size = min_size
+        self.max_delta_ratio = max_delta_ratio
+        self.candidates = candidates
+        self.cache = cache  # bases decodificadas sao buscadas primeiro no HybridCache
+
+        self.deltas_stored = 0
+        self.bytes_saved = 0
+        self._local = threading.local()  # um descompressor reutilizado por thread
+
+    # Escrita
+    def store(self, hash_value, data, compressed=None, exclude=()):
+        """
+        Gravar data (como delta se compensar); retorna o local do blob.
+        exclude: hashes que nao devem servir de base (ex.: a versao sendo substituida).
+        """
+        if compressed is None:
+            compressed = zstd.ZstdCompressor(level=self.level).compress(data)
+
+        features = compute_sketch(data) if len(data) >= self.min_size else []
+        best = self._best_delta(data, features, len(compressed), {hash_value, *exclude}) if features else None
+        path = None
+        if best is not None:
+            base_hash, depth, delta = best
+            # Fixar a base; se o GC acabou de coleta-la, gravar o blob completo
+            if self.db.increment_blob_ref(base_hash):
+                path = self.blob_store.put(hash_value, delta, len(data),
+                                           base_hash=base_hash, delta_depth=depth + 1)
+                self.deltas_stored += 1
+                self.bytes_saved += len(compressed) - len(delta)
+        if path is None:
+            path = self.blob_store.put(hash_value, compressed, len(data))
+
+        if features:
+            self.db.add_sketch(hash_value, features)
+        return path
+
+    def _best_delta(self, data, features, full_size, exclude):
+        best = None
+        limit = full_size * self.max_delta_ratio
+        for candidate, _ in self.db.find_similar(features, self.candidates):
+            if candidate in exclude:
+                continue
+            row = self.db.get_blob(candidate)
+            if row is None:
+                continue
+            depth = row[DELTA_DEPTH_COLUMN] or 0
+            if depth >= self.max_depth:
+                continue
+            delta = encode_delta(data, self.load(row), self.level)
+            if len(delta) < limit and (best is None or len(delta) < len(best[2])):
+                best = (candidate, depth, delta)
+        return best
+
+    # Leitura
+    def get(self, hash_value):
+        """Conteudo descomprimido de um blob; None se o hash nao existir"""
+        blob = self.db.get_blob(hash_value)
+        if not blob:
+            return None
+        return self.load(blob)
+
+    def load(self, blob):
+        """Descomprimir uma linha da tabela blobs, resolvendo a cadeia de deltas"""
+        compressed = self.blob_store.read_blob(blob)
+        base_hash = blob[BASE_HASH_COLUMN] if len(blob) > BASE_HASH_COLUMN else None
+        if base_hash is None:
+            return self._decompressor().decompress(compressed)
+        return decode_delta(compressed, self.load_base(base_hash), blob[2])
+
+    def _decompressor(self):
+        # ZstdDecompressor nao e thread-safe, mas reaproveitar o contexto evita alocar um por chunk
+        decompressor = getattr(self._local, 'decompressor', None)
+        if decompressor is None:
+            decompressor = self._local.decompressor = zstd.ZstdDecompressor()
+        return decompressor
+
+    def load_base(self, base_hash):
+        if self.cache is not None:
+            data, _ = self.cache.get(base_hash)
+            if data is not None:
+                return data
+        data = self.get(base_hash)
+        if data is None:
+            raise FileNotFoundError(f"Base {base_hash} do delta nao encontrada")
+        return data
+
+    def get_stats(self):
+        return {
+            'deltas_stored': self.deltas_stored,
+            'bytes_saved': self.bytes_saved
+        }
@@ -0,0 +1,122 @@
+import collections
+import threading
+import time
+
+
+class GarbageCollector:
+    """
+    Coletor de blobs sem referencias.
+
+    Os contadores de referencia sao mantidos pelo MetadataDB (sobrescrita e
+    remocao de arquivos liberam o blob antigo). A cada ciclo:
+    1. marcacao: blobs com ref_count zero ha mais de grace_period segundos sao
+       conferidos contra as raizes vivas (roots()); os ainda alcancaveis tem o
+       contador corrigido em vez de serem apagados;
+    2. varredura: os demais sao apagados (arquivo proprio ou espaco morto no pack);
+    3. compactacao: packs selados com menos de compact_threshold de bytes vivos
+       sao reescritos.
+
+    Todo o I/O respeita io_budget bytes/s para nao competir com o primeiro plano.
+    """
+
+    def __init__(self, db, blob_store, roots=None, grace_period=300.0, interval=60.0,
+                 io_budget=8 * 1024 * 1024, compact_threshold=0.5, batch_size=500):
+        self.db = db
+        self.blob_store = blob_store
+        self.roots = roots  # roots() -> iteravel de hashes referenciados
+        self.grace_period = grace_period
+        self.interval = interval
+        self.io_budget = io_budget
+        self.compact_threshold = compact_threshold
+        self.batch_size = batch_size
+
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()  # um ciclo por vez
+
+        self.cycles = 0
+        self.blobs_deleted = 0
+        self.bytes_freed = 0
+        self.refs_repaired = 0
+        self.packs_compacted = 0
+        self.bytes_compacted = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name='blob-gc')
+            self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Erro na coleta de lixo de blobs: {e}")
+
+    def _throttle(self, nbytes):
+        """Dormir o suficiente para manter a taxa de I/O dentro de io_budget"""
+        if self.io_budget:
+            self._stop_event.wait(nbytes / self.io_budget)
+
+    def run_once(self, now=None):
+        """Executar um ciclo completo de marcacao, varredura e compactacao"""
+        with self._lock:
+            now = time.time() if now is None else now
+            self.blob_store.release_retired_fds()
+            self._sweep(now - self.grace_period)
+            self._compact()
+            self.cycles += 1
+
+    def _sweep(self, cutoff):
+        live = None
+        while not self._stop_event.is_set():
+            candidates = self.db.get_unreferenced_blobs(cutoff, self.batch_size)
+            if not candidates:
+                return
+
+            if live is None and self.roots is not None:
+                live = collections.Counter(self.roots())
+
+            for hash_value in candidates:
+                if live and live.get(hash_value):
+                    # Ainda referenciado: contador estava errado
+                    self.db.set_blob_ref(hash_value, live[hash_value])
+                    self.refs_repaired += 1
+                    continue
+                deleted = self.blob_store.delete_unreferenced(hash_value)
+                if deleted is not None:
+                    self.blobs_deleted += 1
+                    self.bytes_freed += deleted[0]
+                    if deleted[1] is None:
+                        self._throttle(deleted[0])
+
+            if len(candidates) < self.batch_size:
+                return
+
+    def _compact(self):
+        for pack_id, pack_path, size, live_bytes in self.db.get_pack_usage():
+            if self._stop_event.is_set():
+                return
+            if size <= 0 or live_bytes >= size * self.compact_threshold:
+                continue
+            self.blob_store.compact_pack(pack_id, pack_path, throttle=self._throttle)
+            self.packs_compacted += 1
+            self.bytes_compacted += live_bytes
+            self.bytes_freed += size - live_bytes
+
+    def get_stats(self):
+        return {
+            'cycles': self.cycles,
+            'blobs_deleted': self.blobs_deleted,
+            'bytes_freed': self.bytes_freed,
+            'refs_repaired': self.refs_repaired,
+            'packs_compacted': self.packs_compacted,
+            'bytes_compacted': self.bytes_compacted
+        }
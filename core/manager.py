@@ -1,26 +1,48 @@
 import os
-from .deduplication import calculate_file_hash
+import json
+import hashlib
+import threading
+import time
+from .deduplication import calculate_file_hash, is_zero_block, ZERO_BLOCK_SIZE
 from .compression import Compressor
 from .database import MetadataDB
-from cache.cache import HybridCache
+from .blob_store import BlobStore
+from .garbage_collector import GarbageCollector
+from .scrub import Scrubber
+from .delta import DeltaStore
+from .tiering import Recompressor
+from cache.registry import get_shared_cache
 from .stats_manager import StatsManager
 
 class StorageManager:
-    def __init__(self, data_folder='./data/blobs', db_path='metadata.db'):
+    def __init__(self, data_folder='./data/blobs', db_path='metadata.db', cache=None, volumes=None,
+                 gc_interval=60.0, scrub_interval=None, recompress_interval=3600.0):
         self.db = MetadataDB(db_path)
         self.data_folder = data_folder
         os.makedirs(self.data_folder, exist_ok=True)
+        # volumes={raiz: peso} distribui os blobs entre outros discos
+        self.blob_store = BlobStore(self.data_folder, self.db, volumes=volumes)
+        # Coleta de blobs sem referencias em segundo plano
+        self.gc = GarbageCollector(self.db, self.blob_store, roots=self.db.get_file_hashes,
+                                   interval=gc_interval)
+        self.gc.start()
+        # Verificacao de integridade periodica (desligada por padrao; ver python -m core.scrub)
+        self.scrubber = Scrubber(self.db, self.blob_store, interval=scrub_interval)
+        if scrub_interval:
+            self.scrubber.start()
+        # Blobs sem leitura ha muito tempo sao recomprimidos num nivel alto
+        self.tiering = Recompressor(self.db, self.blob_store, interval=recompress_interval)
+        if recompress_interval:
+            self.tiering.start()
         self.compressor = Compressor(level=5)
-        self.cache = HybridCache(
-            ram_limit_ratio=0.1,
-            ssd_folder='./cache_ssd'
-        )
+        # Cache unico do processo, compartilhado com o VFS
+        self.cache = cache if cache is not None else get_shared_cache()
+        # Arquivos quase iguais a um blob existente sao gravados como delta contra ele
+        self.delta = DeltaStore(self.db, self.blob_store, cache=self.cache)
         # Adicionar instância local do stats manager
         self.stats = StatsManager()
+        self._stats_stop = threading.Event()
         
-    def _get_blob_path(self, hash_value):
-        return os.path.join(self.data_folder, f'{hash_value}.zst')
-
     def store_file(self, file_path, use_fast_hash=True):
         print(f"Storing file: {file_path}")
 
@@ -33,40 +55,72 @@ class StorageManager:
         
         size = os.path.getsize(file_path)
 
-        existing_blob = self.db.get_blob(hash_value)
-
-        if existing_blob:
+        chunks = None
+        # Incrementar e verificar a existencia numa so operacao: o GC nao apaga um blob referenciado
+        if self.db.increment_blob_ref(hash_value):
             print(f"File is duplicate. Incrementing ref count for {hash_value}")
-            self.db.increment_blob_ref(hash_value)
         else:
-            blob_path = self._get_blob_path(hash_value)
             with open(file_path, 'rb') as f:
                 data = f.read()
+
+            # Arquivos com regiões zeradas viram blocos, e os blocos zerados viram buracos
+            chunks = self._store_sparse(data)
+            if chunks is None:
                 # CORRIGIR: usar compress_data com stats_manager
                 compressed = self.compressor.compress_data(data, stats_manager=self.stats)
-                with open(blob_path, 'wb') as out:
-                    out.write(compressed)
-
-            self.db.add_blob(
-                hash_value=hash_value,
-                compressed_path=blob_path,
-                size_original=size,
-                size_compressed=len(compressed)
-            )
-            print(f"Stored blob {hash_value} at {blob_path}")
+
+                # Delta contra um blob parecido, se compensar; senao o blob comprimido
+                blob_path = self.delta.store(hash_value, data, compressed=compressed)
+                print(f"Stored blob {hash_value} at {blob_path}")
+            else:
+                print(f"Stored sparse file {hash_value}: {chunks.count(None)} of {len(chunks)} blocks are holes")
 
         self.db.add_file(
             path=file_path,
             hash_value=hash_value,
-            size=size
+            size=size,
+            chunks=chunks
         )
 
+    def _store_sparse(self, data):
+        """
+        Gravar data em blocos de ZERO_BLOCK_SIZE sem armazenar os blocos zerados.
+        Retorna a lista de hashes (None = buraco), ou None se nao houver bloco zerado.
+        """
+        view = memoryview(data)
+        blocks = [view[i:i + ZERO_BLOCK_SIZE] for i in range(0, len(data), ZERO_BLOCK_SIZE)]
+        # Uma verificacao por bloco, reaproveitada na gravacao
+        zero = [is_zero_block(block) for block in blocks]
+        if not any(zero):
+            return None
+
+        chunks = []
+        for block, is_zero in zip(blocks, zero):
+            if is_zero:
+                chunks.append(None)
+                continue
+            h = hashlib.sha256(block).hexdigest()
+            if not self.db.increment_blob_ref(h):
+                block = bytes(block)
+                compressed = self.compressor.compress_data(block, stats_manager=self.stats)
+                self.delta.store(h, block, compressed=compressed)
+            chunks.append(h)
+        return chunks
+
     def retrieve_file(self, file_path, output_path):
         info = self.db.get_file_by_path(file_path)
         if not info:
             raise FileNotFoundError(f"No record for {file_path}")
 
-        _, _, hash_value, _ = info
+        _, _, hash_value, size, chunks = info
+        for h in json.loads(chunks) if chunks is not None else [hash_value]:
+            if h is not None:
+                self.tiering.record_access(h)
+
+        if chunks is not None:
+            self._retrieve_sparse(json.loads(chunks), size, output_path)
+            print(f"File restored to {output_path}")
+            return
 
         data, source = self.cache.get(hash_value)
         if data:
@@ -77,10 +131,7 @@ class StorageManager:
             if not blob:
                 raise FileNotFoundError(f"No blob found for hash {hash_value}")
 
-            blob_path = blob[1]
-            with open(blob_path, 'rb') as f:
-                compressed = f.read()
-                data = self.compressor.decompress(compressed)
+            data = self.delta.load(blob)
 
             self.cache.add(hash_value, data)
 
@@ -89,7 +140,51 @@ class StorageManager:
 
         print(f"File restored to {output_path}")
 
+    def _retrieve_sparse(self, chunks, size, output_path):
+        """Restaurar um arquivo esparso: buracos viram regiões nao escritas (esparsas no destino)"""
+        with open(output_path, 'wb') as out:
+            for index, h in enumerate(chunks):
+                if h is None:
+                    continue
+                data, _ = self.cache.get(h)
+                if data is None:
+                    data = self.delta.get(h)
+                    if data is None:
+                        raise FileNotFoundError(f"No blob found for hash {h}")
+                    self.cache.add(h, data)
+                out.seek(index * ZERO_BLOCK_SIZE)
+                out.write(data)
+            out.truncate(size)
+
+    def clone(self, src_path, dst_path):
+        """Copiar um arquivo armazenado sem ler os dados: dst passa a referenciar os mesmos blobs"""
+        if not self.db.clone_file(src_path, dst_path):
+            raise FileNotFoundError(f"No record for {src_path}")
+
+    def snapshot(self, src_dir, dst_dir):
+        """
+        Copiar todos os arquivos registrados sob src_dir para dst_dir, so em
+        metadados e numa unica transacao. Retorna o numero de arquivos copiados.
+        """
+        src_prefix = os.path.join(src_dir, '')
+        dst_prefix = os.path.join(dst_dir, '')
+        if os.path.normcase(os.path.normpath(src_dir)) == os.path.normcase(os.path.normpath(dst_dir)):
+            raise ValueError("Snapshot destination must differ from its source")
+        return self.db.clone_tree(src_prefix, dst_prefix)
+
+    def delete_file(self, file_path):
+        """Remover o registro de um arquivo; o blob e coletado pelo GC quando ficar sem referencias"""
+        if not self.db.remove_file(file_path):
+            raise FileNotFoundError(f"No record for {file_path}")
+
     def close(self):
+        # O cache e compartilhado: apenas garante a persistencia do que e nosso
+        self._stats_stop.set()
+        self.gc.stop()
+        self.scrubber.stop()
+        self.tiering.stop()
+        self.cache.flush()
+        self.blob_store.close()
         self.db.close()
 
     # Adicionar estes metodos à classe StorageManager:
@@ -135,6 +230,7 @@ class StorageManager:
         return {
             **stats,
             'cache_details': cache_stats,
+            'metadata_cache': self.db.get_cache_stats(),
             'compression_details': {
                 'total_original': compression_stats[0] if compression_stats[0] else 0,
                 'total_compressed': compression_stats[1] if compression_stats[1] else 0,
@@ -151,7 +247,8 @@ class StorageManager:
     def start_stats_monitoring(self, interval=5):
         """Iniciar monitoramento automatico de estatisticas"""
         def monitor_loop():
-            while True:
+            # Encerra no close(): o banco deixa de existir para update_statistics
+            while not self._stats_stop.is_set():
                 try:
                     self.update_statistics()
                     time.sleep(interval)
@@ -159,7 +256,6 @@ class StorageManager:
                     print(f"Erro no monitoramento de estatisticas: {e}")
                     time.sleep(interval)
         
-        import threading
         monitor_thread = threading.Thread(target=monitor_loop, daemon=True)
         monitor_thread.start()
         return monitor_thread
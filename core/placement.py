@@ -0,0 +1,60 @@
+import os
+import bisect
+import hashlib
+
+
+def fanout_path(root, hash_value, suffix='.zst', levels=2):
+    """
+    Caminho de um blob com fan-out pelo prefixo do hash: root/ab/cd/<hash>.zst
+
+    Mantem cada diretorio com no maximo 256 subdiretorios/arquivos por nivel.
+    """
+    parts = [hash_value[2 * i:2 * i + 2] for i in range(levels)]
+    return os.path.join(root, *parts, f'{hash_value}{suffix}')
+
+
+class VolumeRing:
+    """
+    Anel de hashing consistente para distribuir blobs entre volumes.
+
+    Cada volume recebe 'weight * vnodes' pontos no anel, de modo que a
+    fracao de blobs de cada volume e proporcional ao seu peso e adicionar um
+    volume so move os blobs que passam a pertencer a ele.
+    """
+
+    def __init__(self, volumes=None, vnodes=64):
+        self.vnodes = vnodes
+        self.weights = {}  # {root: peso}
+        self._points = []
+        self._owners = []
+        for root, weight in (volumes or {}).items():
+            self.weights[os.path.normpath(root)] = weight
+        self._rebuild()
+
+    @staticmethod
+    def _position(value):
+        return int(hashlib.sha256(value.encode('utf-8')).hexdigest()[:16], 16)
+
+    def _rebuild(self):
+        ring = []
+        for root, weight in self.weights.items():
+            for i in range(max(1, int(weight * self.vnodes))):
+                ring.append((self._position(f'{root}#{i}'), root))
+        ring.sort()
+        self._points = [point for point, _ in ring]
+        self._owners = [root for _, root in ring]
+
+    def add_volume(self, root, weight=1):
+        self.weights[os.path.normpath(root)] = weight
+        self._rebuild()
+
+    def volumes(self):
+        return list(self.weights)
+
+    def volume_for(self, hash_value):
+        """Volume responsavel por um hash (hex SHA-256)"""
+        if len(self._owners) == 1:
+            return self._owners[0]
+        position = int(hash_value[:16], 16)
+        index = bisect.bisect(self._points, position) % len(self._points)
+        return self._owners[index]
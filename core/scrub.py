@@ -0,0 +1,223 @@
+import argparse
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import zstandard as zstd
+
+from .delta import BASE_HASH_COLUMN, DeltaStore, decode_delta
+
+
+class RateLimiter:
+    """Limitador de taxa (bytes/s) compartilhado entre as threads de verificacao"""
+
+    def __init__(self, rate, stop_event=None):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._next_free = time.monotonic()
+        self._stop_event = stop_event or threading.Event()
+
+    def acquire(self, nbytes):
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_free)
+            self._next_free = start + nbytes / self.rate
+        if start > now:
+            self._stop_event.wait(start - now)
+
+
+class Scrubber:
+    """
+    Verificador de integridade dos blobs.
+
+    Percorre a tabela blobs em ordem de hash, le, descomprime e recalcula o
+    SHA-256 de cada blob num pool de threads, limitado a rate_limit_mb MB/s.
+    O resultado ('ok', 'corrupt' ou 'missing') e a hora da verificacao ficam
+    em cada blob, e a posicao da varredura fica em scrub_state: uma rodada
+    interrompida continua de onde parou.
+    """
+
+    def __init__(self, db, blob_store, workers=4, rate_limit_mb=50.0, batch_size=256,
+                 interval=3600.0, referrers=None, delta=None):
+        self.db = db
+        self.blob_store = blob_store
+        self.delta = delta or DeltaStore(db, blob_store)
+        self.workers = workers
+        self.batch_size = batch_size
+        self.interval = interval
+        # referrers(hash) -> caminhos que usam o blob; por padrao a tabela files
+        self.referrers = referrers or db.get_paths_for_hash
+
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()  # uma varredura por vez
+        self._limiter = RateLimiter(rate_limit_mb * 1024 * 1024 if rate_limit_mb else None,
+                                    self._stop_event)
+
+        self.blobs_verified = 0
+        self.bytes_verified = 0
+        self.corrupt_found = 0
+        self.missing_found = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name='blob-scrub')
+            self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.run()
+            except Exception as e:
+                print(f"Erro na verificacao de integridade dos blobs: {e}")
+
+    def verify(self, blob):
+        """Verificar uma linha da tabela blobs; retorna 'ok', 'corrupt' ou 'missing'"""
+        hash_value, size_compressed = blob[0], blob[3]
+        self._limiter.acquire(size_compressed or 0)
+        try:
+            compressed = self.blob_store.read_blob(blob)
+        except (OSError, KeyError):
+            return 'missing'
+        if len(compressed) != size_compressed:
+            return 'corrupt'
+        base_hash = blob[BASE_HASH_COLUMN] if len(blob) > BASE_HASH_COLUMN else None
+        try:
+            if base_hash is None:
+                data = zstd.ZstdDecompressor().decompress(compressed)
+            else:
+                data = decode_delta(compressed, self.delta.load_base(base_hash), blob[2])
+        except zstd.ZstdError:
+            return 'corrupt'
+        except OSError:
+            # Base do delta ilegivel: o proprio blob nao pode ser reconstruido
+            return 'missing'
+        if hashlib.sha256(data).hexdigest() != hash_value:
+            return 'corrupt'
+        return 'ok'
+
+    def _verify_row(self, blob):
+        status = self.verify(blob)
+        if status != 'ok':
+            # O blob pode ter sido movido, recomprimido ou coletado durante a verificacao
+            current = self.db.get_blob(blob[0])
+            if current is None:
+                return None
+            if current[1:7] != blob[1:7]:
+                status = self.verify(current)
+        return blob[0], status, time.time(), blob[3] or 0
+
+    def run(self, max_blobs=None):
+        """
+        Continuar a varredura a partir da ultima posicao salva.
+
+        Para ao fim da tabela (a rodada seguinte recomeca do inicio), ao
+        verificar max_blobs blobs ou em stop(). Retorna um resumo da execucao.
+        """
+        summary = {'verified': 0, 'ok': 0, 'corrupt': 0, 'missing': 0, 'completed_pass': False}
+        with self._lock, ThreadPoolExecutor(max_workers=self.workers,
+                                            thread_name_prefix='scrub') as executor:
+            cursor = self.db.get_scrub_state('cursor', '')
+            while not self._stop_event.is_set():
+                limit = self.batch_size
+                if max_blobs is not None:
+                    limit = min(limit, max_blobs - summary['verified'])
+                    if limit <= 0:
+                        break
+                rows = self.db.get_blobs_after(cursor, limit)
+                if not rows:
+                    # Rodada completa: a proxima comeca do inicio
+                    cursor = ''
+                    self.db.set_scrub_state('cursor', cursor)
+                    self.db.set_scrub_state('last_pass_completed', time.time())
+                    summary['completed_pass'] = True
+                    break
+
+                results = [r for r in executor.map(self._verify_row, rows) if r is not None]
+                self.db.record_scrub_results([r[:3] for r in results])
+                for hash_value, status, _, size in results:
+                    summary['verified'] += 1
+                    summary[status] += 1
+                    self.bytes_verified += size
+                    if status != 'ok':
+                        print(f"Blob {status}: {hash_value} (usado por {self.referrers(hash_value)})")
+
+                cursor = rows[-1][0]
+                self.db.set_scrub_state('cursor', cursor)
+
+        self.blobs_verified += summary['verified']
+        self.corrupt_found += summary['corrupt']
+        self.missing_found += summary['missing']
+        return summary
+
+    def report(self):
+        """Blobs com problema e os caminhos que os referenciam"""
+        return [
+            {
+                'hash': hash_value,
+                'status': status,
+                'verified_at': verified_at,
+                'paths': self.referrers(hash_value)
+            }
+            for hash_value, status, verified_at in self.db.get_damaged_blobs()
+        ]
+
+    def get_stats(self):
+        last_pass = self.db.get_scrub_state('last_pass_completed')
+        return {
+            'blobs_verified': self.blobs_verified,
+            'bytes_verified': self.bytes_verified,
+            'corrupt_found': self.corrupt_found,
+            'missing_found': self.missing_found,
+            'cursor': self.db.get_scrub_state('cursor', ''),
+            'last_pass_completed': float(last_pass) if last_pass else None
+        }
+
+
+def main(argv=None):
+    """Comando de verificacao: python -m core.scrub --db metadata.db --data ./data/blobs"""
+    from .database import MetadataDB
+    from .blob_store import BlobStore
+
+    parser = argparse.ArgumentParser(description='Verificar a integridade dos blobs do QuarkDrive')
+    parser.add_argument('--db', default='metadata.db', help='banco de metadados')
+    parser.add_argument('--data', default='./data/blobs', help='pasta dos blobs')
+    parser.add_argument('--workers', type=int, default=4, help='threads de verificacao')
+    parser.add_argument('--rate', type=float, default=50.0, help='limite de leitura em MB/s (0 = sem limite)')
+    parser.add_argument('--max-blobs', type=int, default=None,
+                        help='verificar no maximo N blobs e parar (retoma na proxima execucao)')
+    parser.add_argument('--report', action='store_true', help='apenas listar blobs com problema')
+    args = parser.parse_args(argv)
+
+    db = MetadataDB(args.db)
+    blob_store = BlobStore(args.data, db)
+    scrubber = Scrubber(db, blob_store, workers=args.workers, rate_limit_mb=args.rate)
+    try:
+        if not args.report:
+            summary = scrubber.run(max_blobs=args.max_blobs)
+            print(f"Verificados: {summary['verified']} | ok: {summary['ok']} | "
+                  f"corrompidos: {summary['corrupt']} | ausentes: {summary['missing']}")
+            if not summary['completed_pass']:
+                print("Rodada incompleta: a proxima execucao continua de onde parou")
+        damaged = scrubber.report()
+        for entry in damaged:
+            paths = ', '.join(entry['paths']) or '(nenhum arquivo)'
+            print(f"{entry['status']}: {entry['hash']} -> {paths}")
+        return 1 if damaged else 0
+    finally:
+        blob_store.close()
+        db.close()
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,63 @@
+import re
+import zlib
+import hashlib
+import collections
+
+# Parametros do MinHash: NUM_HASHES minimos agrupados em super-features de FEATURE_GROUP
+NUM_HASHES = 12
+FEATURE_GROUP = 3
+SHINGLE_SIZE = 32
+SAMPLE_SIZE = 64 * 1024
+
+_PRIME = (1 << 61) - 1
+_PERMUTATIONS = [((i + 1) * 0x9E3779B97F4A7C15 % _PRIME, (i + 7) * 0xC2B2AE3D27D4EB4F % _PRIME)
+                 for i in range(NUM_HASHES)]
+
+
+def _anchor_byte(data):
+    """
+    Byte usado como ancora dos shingles: o menor valor com frequencia entre
+    1/1024 e 1/16 na amostra inicial. Os limites ficam longe das frequencias
+    tipicas, entao versões parecidas do mesmo arquivo escolhem a mesma ancora
+    e os shingles sobrevivem a insercões e deslocamentos.
+    """
+    sample = data[:SAMPLE_SIZE]
+    counts = collections.Counter(sample)
+    low, high = len(sample) / 1024, len(sample) / 16
+    for b in sorted(counts):
+        if low <= counts[b] <= high:
+            return b
+    return min(counts)
+
+
+def compute_sketch(data, max_shingles=16384):
+    """
+    Calcular as super-features (MinHash) de um bloco de dados.
+
+    Retorna uma lista de inteiros; blobs que compartilham super-features sao
+    provavelmente quase iguais.
+    """
+    if not data:
+        return []
+    anchor = re.escape(bytes([_anchor_byte(data)]))
+    # Dados grandes: amostrar os shingles pelo valor (nao pela posicao), para
+    # que versões parecidas mantenham os mesmos
+    expected = len(data) // 256
+    mask = (1 << max(0, (expected // max_shingles).bit_length())) - 1
+    shingles = set()
+    for match in re.finditer(anchor, data):
+        start = match.start()
+        shingle = zlib.crc32(data[start:start + SHINGLE_SIZE])
+        if shingle & mask == 0:
+            shingles.add(shingle)
+    if not shingles:
+        return []
+
+    minimums = [min((a * s + b) % _PRIME for s in shingles) for a, b in _PERMUTATIONS]
+    features = []
+    for i in range(0, NUM_HASHES, FEATURE_GROUP):
+        group = minimums[i:i + FEATURE_GROUP]
+        digest = hashlib.blake2b(repr((i, group)).encode(), digest_size=8).digest()
+        # Inteiro de 63 bits para caber numa coluna INTEGER do SQLite
+        features.append(int.from_bytes(digest, 'big') >> 1)
+    return features
@@ -0,0 +1,127 @@
+import threading
+import time
+
+import zstandard as zstd
+
+# Janela maxima do modo long: acima de 2^27 os descompressores precisariam de max_window_size
+LONG_WINDOW_LOG = 27
+
+
+class Recompressor:
+    """
+    Recompressao de blobs frios em segundo plano.
+
+    As leituras (VFS e StorageManager) chamam record_access(); os acessos sao
+    acumulados em memoria e gravados em lote no MetadataDB a cada ciclo. Blobs
+    completos sem leitura ha cold_after segundos e comprimidos abaixo de level
+    sao recomprimidos (com long=True, zstd --long) e trocados atomicamente
+    pelo BlobStore. O trabalho de CPU fica limitado a cpu_budget de um nucleo.
+    Deltas ficam como estao: ja sao pequenos e dependem da base.
+    """
+
+    def __init__(self, db, blob_store, level=19, long=True, cold_after=7 * 24 * 3600.0,
+                 interval=3600.0, cpu_budget=0.25, batch_size=100):
+        self.db = db
+        self.blob_store = blob_store
+        self.level = level
+        self.long = long
+        self.cold_after = cold_after
+        self.interval = interval
+        self.cpu_budget = cpu_budget
+        self.batch_size = batch_size
+
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()  # um ciclo por vez
+        self._access_lock = threading.Lock()
+        self._accessed = {}  # {hash: momento da ultima leitura}
+
+        self.blobs_recompressed = 0
+        self.bytes_saved = 0
+
+    def record_access(self, hash_value):
+        """Marcar um blob como lido agora (barato: so memoria)"""
+        with self._access_lock:
+            self._accessed[hash_value] = time.time()
+
+    def flush_access(self):
+        with self._access_lock:
+            accessed, self._accessed = self._accessed, {}
+        if accessed:
+            self.db.touch_blobs(accessed)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name='blob-recompress')
+            self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush_access()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Erro na recompressao de blobs frios: {e}")
+
+    def _throttle(self, cpu_seconds):
+        """Pausar o suficiente para manter o uso de CPU dentro de cpu_budget"""
+        if self.cpu_budget and self.cpu_budget < 1:
+            self._stop_event.wait(cpu_seconds * (1 / self.cpu_budget - 1))
+
+    def _compressor(self, size):
+        if not self.long:
+            return zstd.ZstdCompressor(level=self.level)
+        window_log = min(LONG_WINDOW_LOG, max(10, (max(size, 1) - 1).bit_length()))
+        params = zstd.ZstdCompressionParameters.from_level(
+            self.level, window_log=window_log, enable_ldm=True, source_size=size)
+        return zstd.ZstdCompressor(compression_params=params)
+
+    def run_once(self, now=None):
+        """Recomprimir um ciclo de blobs frios; retorna quantos foram trocados"""
+        with self._lock:
+            self.flush_access()
+            now = time.time() if now is None else now
+            replaced = 0
+            for blob in self.db.get_cold_blobs(now - self.cold_after, self.level, self.batch_size):
+                if self._stop_event.is_set():
+                    break
+                started = time.thread_time()
+                if self.recompress(blob):
+                    replaced += 1
+                self._throttle(time.thread_time() - started)
+            return replaced
+
+    def recompress(self, blob):
+        hash_value, size_compressed = blob[0], blob[3]
+        try:
+            data = zstd.ZstdDecompressor().decompress(self.blob_store.read_blob(blob))
+        except (OSError, KeyError, zstd.ZstdError):
+            # Ilegivel ou coletado: fica para o scrub e o GC
+            return False
+
+        compressed = self._compressor(len(data)).compress(data)
+        if len(compressed) >= size_compressed:
+            # Nao compensa: registrar o nivel para nao tentar de novo
+            self.db.set_blob_level(hash_value, self.level)
+            return False
+        if not self.blob_store.replace(blob, compressed, self.level):
+            return False
+        self.blobs_recompressed += 1
+        self.bytes_saved += size_compressed - len(compressed)
+        return True
+
+    def get_stats(self):
+        with self._access_lock:
+            pending = len(self._accessed)
+        return {
+            'blobs_recompressed': self.blobs_recompressed,
+            'bytes_saved': self.bytes_saved,
+            'pending_accesses': pending
+        }
@@ -0,0 +1,310 @@
+import errno
+import os
+import posixpath
+import stat
+from contextlib import asynccontextmanager
+from functools import partial, wraps
+
+try:
+    import pyfuse3
+    import trio
+except ImportError:  # dependencia opcional (Linux com libfuse 3)
+    pyfuse3 = trio = None
+
+from .fuse_mount import DEFAULT_MOUNT_OPTIONS, use_direct_io
+from .manifest import CHUNK_SIZE
+from .vfs_core import DedupCompressFS
+
+
+def _fuse_errors(method):
+    """
+    Converter erros do nucleo em FUSEError (o pyfuse3 so entende FUSEError):
+    OSError mantem o errno; qualquer outra excecao vira EIO.
+    """
+    @wraps(method)
+    async def wrapper(self, *args):
+        try:
+            return await method(self, *args)
+        except pyfuse3.FUSEError:
+            raise
+        except OSError as e:
+            raise pyfuse3.FUSEError(e.errno or errno.EIO)
+        except Exception as e:
+            print(f"Erro inesperado em {method.__name__}: {e!r}")
+            raise pyfuse3.FUSEError(errno.EIO)
+    return wrapper
+
+
+class _ReadWriteLock:
+    """
+    Lock trio de leitores/escritor: varias leituras juntas ou uma escrita sozinha.
+    Um escritor esperando bloqueia leitores novos, entao escritas nao passam fome.
+    """
+
+    def __init__(self):
+        self._changed = trio.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @asynccontextmanager
+    async def read(self):
+        async with self._changed:
+            while self._writer or self._waiting_writers:
+                await self._changed.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            async with self._changed:
+                self._readers -= 1
+                self._changed.notify_all()
+
+    @asynccontextmanager
+    async def write(self):
+        async with self._changed:
+            self._waiting_writers += 1
+            try:
+                while self._writer or self._readers:
+                    await self._changed.wait()
+            finally:
+                self._waiting_writers -= 1
+                # Um escritor cancelado na espera pode liberar leitores retidos
+                self._changed.notify_all()
+            self._writer = True
+        try:
+            yield
+        finally:
+            async with self._changed:
+                self._writer = False
+                self._changed.notify_all()
+
+
+class AsyncDedupFS(pyfuse3.Operations if pyfuse3 else object):
+    """
+    VFS assincrono sobre pyfuse3 (trio).
+
+    Usa o mesmo nucleo do DedupCompressFS (arvore de inodes, handles, blob
+    store, deltas e cache); so a camada FUSE muda. Cada requisicao e uma
+    tarefa trio: o trabalho bloqueante (hash, compressao, descompressao, I/O
+    dos blobs) vai para um pool de ate max_threads threads, entao milhares de
+    requisicoes em voo custam tarefas, nao threads. Cada inode tem um lock de
+    leitores/escritor (o nucleo nao protege o manifesto): leituras do mesmo
+    arquivo correm em paralelo, escritas e truncamentos sao exclusivos.
+    """
+
+    def __init__(self, backend_folder=None, core=None, max_threads=64, mount_options=None, **kwargs):
+        if pyfuse3 is None:
+            raise RuntimeError("pyfuse3 e trio sao necessarios para o VFS assincrono")
+        super().__init__()
+        self.core = core if core is not None else DedupCompressFS(backend_folder, **kwargs)
+        self.namespace = self.core.namespace
+        self.handles = self.core.handles
+        options = {**DEFAULT_MOUNT_OPTIONS, **(mount_options or {})}
+        self.attr_timeout = options['attr_timeout']
+        self.entry_timeout = options['entry_timeout']
+        self.direct_io_patterns = tuple(options['direct_io'])
+        self._limiter = trio.CapacityLimiter(max_threads)
+        self._inode_locks = {}  # {ino: _ReadWriteLock}
+
+    async def _run(self, fn, *args):
+        """Executar fn(*args) no pool de threads sem bloquear o loop"""
+        return await trio.to_thread.run_sync(partial(fn, *args), limiter=self._limiter)
+
+    def _lock(self, ino):
+        lock = self._inode_locks.get(ino)
+        if lock is None:
+            lock = self._inode_locks[ino] = _ReadWriteLock()
+        return lock
+
+    def _node(self, inode):
+        node = self.namespace.inodes.get(inode) or self.core._orphans.get(inode)
+        if node is None:
+            raise pyfuse3.FUSEError(errno.ENOENT)
+        return node
+
+    def _child_path(self, parent_inode, name):
+        return posixpath.join(self.namespace.path_of(self._node(parent_inode)), os.fsdecode(name))
+
+    def _attrs(self, node):
+        entry = pyfuse3.EntryAttributes()
+        entry.st_ino = node.ino
+        entry.generation = 0
+        entry.entry_timeout = self.entry_timeout
+        entry.attr_timeout = self.attr_timeout
+        entry.st_mode = node.mode
+        entry.st_uid = os.getuid()
+        entry.st_gid = os.getgid()
+        entry.st_blksize = CHUNK_SIZE
+        if node.is_dir():
+            entry.st_nlink = 2
+            entry.st_size = 0
+        else:
+            entry.st_nlink = 1
+            entry.st_size = node.manifest.size
+        entry.st_blocks = (entry.st_size + 511) // 512
+        mtime_ns = int(node.mtime * 1e9)
+        entry.st_atime_ns = entry.st_mtime_ns = entry.st_ctime_ns = mtime_ns
+        return entry
+
+    def _file_info(self, node, fh):
+        info = pyfuse3.FileInfo(fh=fh)
+        if self.direct_io_patterns and use_direct_io(node.name, self.direct_io_patterns):
+            info.direct_io = True
+        return info
+
+    # Metadados
+    @_fuse_errors
+    async def lookup(self, parent_inode, name, ctx=None):
+        parent = self._node(parent_inode)
+        if name == b'.':
+            return self._attrs(parent)
+        if name == b'..':
+            return self._attrs(self._node(parent.parent or parent.ino))
+        if not parent.is_dir():
+            raise pyfuse3.FUSEError(errno.ENOTDIR)
+        node = parent.children.get(os.fsdecode(name))
+        if node is None:
+            raise pyfuse3.FUSEError(errno.ENOENT)
+        return self._attrs(node)
+
+    @_fuse_errors
+    async def getattr(self, inode, ctx=None):
+        return self._attrs(self._node(inode))
+
+    @_fuse_errors
+    async def setattr(self, inode, attr, fields, fh, ctx):
+        node = self._node(inode)
+        if fields.update_size:
+            async with self._lock(inode).write():
+                await self._run(self.core.truncate, self.namespace.path_of(node), attr.st_size, fh)
+        if fields.update_mode:
+            node.mode = stat.S_IFMT(node.mode) | stat.S_IMODE(attr.st_mode)
+        if fields.update_mtime:
+            node.mtime = attr.st_mtime_ns / 1e9
+        if fields.update_mode or fields.update_mtime:
+            self.namespace.mark_dirty(node)
+        return self._attrs(node)
+
+    @_fuse_errors
+    async def statfs(self, ctx):
+        values = self.core.statfs('/')
+        stats = pyfuse3.StatvfsData()
+        for key, value in values.items():
+            setattr(stats, key, value)
+        return stats
+
+    @_fuse_errors
+    async def getxattr(self, inode, name, ctx):
+        path = self.namespace.path_of(self._node(inode))
+        return await self._run(self.core.getxattr, path, os.fsdecode(name))
+
+    @_fuse_errors
+    async def listxattr(self, inode, ctx):
+        path = self.namespace.path_of(self._node(inode))
+        return [os.fsencode(name) for name in self.core.listxattr(path)]
+
+    async def opendir(self, inode, ctx):
+        if not self._node(inode).is_dir():
+            raise pyfuse3.FUSEError(errno.ENOTDIR)
+        return inode
+
+    async def readdir(self, fh, start_id, token):
+        # start_id e a posicao na lista de filhos: O(filhos) por chamada.
+        # Copia sob o lock da arvore: mkdir/unlink/rename alteram os filhos em threads do pool
+        node = self._node(fh)
+        with self.namespace.lock:
+            children = list(node.children.values())
+        for index in range(start_id, len(children)):
+            node = children[index]
+            if not pyfuse3.readdir_reply(token, os.fsencode(node.name), self._attrs(node), index + 1):
+                break
+
+    async def releasedir(self, fh):
+        pass
+
+    @_fuse_errors
+    async def mkdir(self, parent_inode, name, mode, ctx):
+        node = await self._run(self.namespace.mkdir, self._child_path(parent_inode, name), mode)
+        return self._attrs(node)
+
+    @_fuse_errors
+    async def rmdir(self, parent_inode, name, ctx):
+        await self._run(self.core.rmdir, self._child_path(parent_inode, name))
+
+    @_fuse_errors
+    async def unlink(self, parent_inode, name, ctx):
+        await self._run(self.core.unlink, self._child_path(parent_inode, name))
+
+    @_fuse_errors
+    async def rename(self, parent_inode_old, name_old, parent_inode_new, name_new, flags, ctx):
+        if flags & pyfuse3.RENAME_EXCHANGE:
+            raise pyfuse3.FUSEError(errno.EINVAL)
+        new = self._child_path(parent_inode_new, name_new)
+        if flags & pyfuse3.RENAME_NOREPLACE and self.namespace.get(new) is not None:
+            raise pyfuse3.FUSEError(errno.EEXIST)
+        await self._run(self.core.rename, self._child_path(parent_inode_old, name_old), new)
+
+    # Arquivos
+    @_fuse_errors
+    async def open(self, inode, flags, ctx):
+        node = self._node(inode)
+        if node.is_dir():
+            raise pyfuse3.FUSEError(errno.EISDIR)
+        return self._file_info(node, self.handles.open(node, flags))
+
+    @_fuse_errors
+    async def create(self, parent_inode, name, mode, flags, ctx):
+        fh = await self._run(self.core.create, self._child_path(parent_inode, name), mode)
+        node = self.handles.get(fh).node
+        return self._file_info(node, fh), self._attrs(node)
+
+    @_fuse_errors
+    async def read(self, fh, off, size):
+        handle = self.handles.get(fh)
+        if handle is None:
+            raise pyfuse3.FUSEError(errno.EBADF)
+        async with self._lock(handle.node.ino).read():
+            return await self._run(self.core.read, None, size, off, fh)
+
+    @_fuse_errors
+    async def write(self, fh, off, buf):
+        handle = self.handles.get(fh)
+        if handle is None:
+            raise pyfuse3.FUSEError(errno.EBADF)
+        async with self._lock(handle.node.ino).write():
+            return await self._run(self.core.write, None, buf, off, fh)
+
+    @_fuse_errors
+    async def flush(self, fh):
+        await self._run(self.core.flush, None, fh)
+
+    @_fuse_errors
+    async def fsync(self, fh, datasync):
+        await self._run(self.core.fsync, None, datasync, fh)
+
+    @_fuse_errors
+    async def release(self, fh):
+        handle = self.handles.get(fh)
+        await self._run(self.core.release, None, fh)
+        if handle is not None and not self.handles.is_open(handle.node):
+            self._inode_locks.pop(handle.node.ino, None)
+
+    async def forget(self, inode_list):
+        pass
+
+    def destroy(self):
+        self.core.destroy('/')
+
+
+def mount_async(backend_folder, mountpoint, mount_options=None, max_threads=64, **kwargs):
+    """Montar o VFS assincrono em mountpoint (bloqueia ate desmontar)"""
+    fs = AsyncDedupFS(backend_folder, max_threads=max_threads, mount_options=mount_options, **kwargs)
+    options = set(pyfuse3.default_options)
+    options.add('fsname=quarkdrive')
+    pyfuse3.init(fs, mountpoint, options)
+    try:
+        trio.run(pyfuse3.main)
+    finally:
+        pyfuse3.close(unmount=True)
+        fs.destroy()
@@ -8,11 +8,12 @@ import threading
 if platform.system() == 'Windows':
     from .windows_mount import mount_windows_filesystem, unmount_windows_filesystem, WindowsVFSMount
 else:
-    from fuse import FUSE
+    from .fuse_mount import mount_fuse
 
-def mount_filesystem(mount_point, dedup=True, compress=True, cache=True):
+def mount_filesystem(mount_point, dedup=True, compress=True, cache=True, mount_options=None):
     """
     Monta o sistema de arquivos virtual com verificacões adicionais.
+    mount_options: cache do kernel e tamanho de I/O no Linux (ver fuse_mount.DEFAULT_MOUNT_OPTIONS).
     """
     import logging
     import traceback
@@ -54,7 +55,10 @@ def mount_filesystem(mount_point, dedup=True, compress=True, cache=True):
             
             def safe_write(path, data):
                 try:
-                    return fs.write(path, data, 0, None)
+                    written = fs.write(path, data, 0, None)
+                    # O Dokan nao chama flush/release: gravar o manifesto (e liberar os chunks antigos) aqui
+                    fs.flush(path, None)
+                    return written
                 except Exception as e:
                     logger.error(f"Erro no callback write: {str(e)}")
                     return 0
@@ -96,6 +100,8 @@ def mount_filesystem(mount_point, dedup=True, compress=True, cache=True):
                 try:
                     vfs_mount = future.result(timeout=20)  # 20 segundos de timeout
                     if vfs_mount:
+                        # unmount_filesystem chama destroy (grava manifestos e fecha o banco)
+                        vfs_mount.fs = fs
                         logger.info(f"Sistema de arquivos montado com sucesso em {mount_point}")
                     else:
                         logger.error("Falha ao montar sistema de arquivos Windows")
@@ -106,12 +112,7 @@ def mount_filesystem(mount_point, dedup=True, compress=True, cache=True):
         else:
             # Linux: usar FUSE (codigo existente)
             def mount_thread():
-                FUSE(
-                    fs,
-                    mount_point,
-                    nothreads=True,
-                    foreground=True
-                )
+                mount_fuse(fs, mount_point, mount_options)
             
             thread = threading.Thread(target=mount_thread, daemon=True)
             thread.start()
@@ -138,7 +139,12 @@ def unmount_filesystem(mount_process):
         if platform.system() == 'Windows':
             if isinstance(mount_process, WindowsVFSMount):
                 logger.info(f"Desmontando sistema Windows em {getattr(mount_process, 'mount_point', 'desconhecido')}")
-                return unmount_windows_filesystem(mount_process)
+                unmounted = unmount_windows_filesystem(mount_process)
+                fs = getattr(mount_process, 'fs', None)
+                if unmounted and fs is not None:
+                    fs.destroy('/')
+                    mount_process.fs = None
+                return unmounted
             else:
                 logger.error(f"Tipo de montagem invalido: {type(mount_process)}")
         else:
@@ -1,23 +1,106 @@
+import fnmatch
 import platform
+import sys
+
 from .vfs_core import DedupCompressFS
+from .manifest import CHUNK_SIZE
+
+if platform.system() == 'Windows':
+    FUSE = None
+else:
+    try:
+        from fuse import FUSE
+    except (ImportError, OSError):  # libfuse 2 ausente (ex.: so pyfuse3/libfuse 3)
+        FUSE = None
+
+# Opcoes de montagem do FUSE (sobrescritas por mount_options em mount_filesystem)
+DEFAULT_MOUNT_OPTIONS = {
+    # Segundos que o kernel guarda atributos e entradas de diretorio sem perguntar ao VFS
+    'attr_timeout': 1.0,
+    'entry_timeout': 1.0,
+    # Cache de paginas do kernel: 'auto' (invalida quando mtime/tamanho mudam),
+    # 'kernel' (sempre mantem) ou 'none'
+    'cache': 'auto',
+    # Tamanho maximo de cada requisicao (a libfuse limita ao seu buffer: 128 KiB na libfuse 2)
+    'max_read': CHUNK_SIZE,
+    'max_write': CHUNK_SIZE,
+    'big_writes': True,
+    # Padroes de nome (fnmatch) de arquivos abertos com direct_io, sem cache de paginas
+    'direct_io': ()
+}
+
+CACHE_MODES = {'auto': 'auto_cache', 'kernel': 'kernel_cache', 'none': None}
+
+
+def fuse_options(options=None):
+    """Converter as opcoes do QuarkDrive nos argumentos -o do fusepy"""
+    options = {**DEFAULT_MOUNT_OPTIONS, **(options or {})}
+    if options['cache'] not in CACHE_MODES:
+        raise ValueError(f"Modo de cache invalido: {options['cache']}")
+    kwargs = {
+        'attr_timeout': options['attr_timeout'],
+        'entry_timeout': options['entry_timeout'],
+        'max_read': options['max_read'],
+        'max_write': options['max_write'],
+        'big_writes': bool(options['big_writes'])
+    }
+    cache_flag = CACHE_MODES[options['cache']]
+    if cache_flag:
+        kwargs[cache_flag] = True
+    return kwargs
+
+
+def use_direct_io(path, patterns):
+    """Se o arquivo (pelo nome) pertence a uma classe aberta com direct_io"""
+    name = path.rsplit('/', 1)[-1]
+    return any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+
+if FUSE is not None:
+    class TunedFUSE(FUSE):
+        """FUSE que liga direct_io no open/create dos arquivos que casam com os padroes"""
+
+        def __init__(self, operations, mountpoint, direct_io=(), **kwargs):
+            self.direct_io_patterns = tuple(direct_io)
+            super().__init__(operations, mountpoint, **kwargs)
+
+        def _tune(self, path, fip):
+            if self.direct_io_patterns and use_direct_io(path.decode(self.encoding),
+                                                         self.direct_io_patterns):
+                fip.contents.direct_io = 1
+
+        def open(self, path, fip):
+            self._tune(path, fip)
+            return super().open(path, fip)
+
+        def create(self, path, mode, fip):
+            self._tune(path, fip)
+            return super().create(path, mode, fip)
+
+
+def mount_fuse(fs, mountpoint, mount_options=None, foreground=True):
+    """Montar fs em mountpoint com as opcoes de cache e tamanho de I/O (bloqueia ate desmontar)"""
+    if FUSE is None:
+        raise RuntimeError("fusepy/libfuse indisponivel; no Linux com libfuse 3 use fs.async_vfs")
+    options = {**DEFAULT_MOUNT_OPTIONS, **(mount_options or {})}
+    return TunedFUSE(fs, mountpoint, direct_io=options['direct_io'], nothreads=True,
+                     foreground=foreground, **fuse_options(options))
+
 
 if __name__ == '__main__':
     if platform.system() == 'Windows':
         print("Este script e apenas para Linux. No Windows, use o main.py")
         sys.exit(1)
-        
-    import sys
-    from fuse import FUSE
-    
+
     if len(sys.argv) < 2:
         print("Uso: python fuse_mount.py <ponto_de_montagem>")
         sys.exit(1)
-        
+
     mountpoint = sys.argv[1]  # Pasta onde sera montado
     backend = './backend_data'  # Pasta onde serao armazenados os dados comprimidos
-    
+
     import os
     if not os.path.exists(backend):
         os.makedirs(backend)
 
-    FUSE(DedupCompressFS(backend), mountpoint, nothreads=True, foreground=True)
\ No newline at end of file
+    mount_fuse(DedupCompressFS(backend), mountpoint)
@@ -0,0 +1,74 @@
+import collections
+import threading
+
+
+class OpenFile:
+    """
+    Estado de um arquivo aberto: o inode resolvido no open e o ultimo chunk
+    decodificado (hash + dados). Como os chunks sao enderecados pelo
+    conteudo, o chunk guardado continua valido enquanto o manifesto apontar
+    para o mesmo hash, mesmo com escritas por outros handles.
+    """
+
+    __slots__ = ('node', 'flags', 'chunk')
+
+    def __init__(self, node, flags):
+        self.node = node
+        self.flags = flags
+        # (hash, dados) num unico atributo: leitores paralelos nunca veem um par misturado
+        self.chunk = (None, None)
+
+    def cached_chunk(self, h):
+        chunk_hash, data = self.chunk
+        return data if h is not None and h == chunk_hash else None
+
+    def remember_chunk(self, h, data):
+        self.chunk = (h, data)
+
+
+class HandleTable:
+    """
+    Tabela de handles inteiros do VFS. O handle 0 nunca e usado: fh 0/None
+    significa "sem handle" (chamadas que chegam so com o caminho).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handles = {}  # {fh: OpenFile}
+        self._free = []  # fhs liberados, reutilizados antes de crescer
+        self._next = 1
+        self._open_count = collections.Counter()  # {ino: handles abertos}
+
+    def open(self, node, flags=0):
+        with self._lock:
+            if self._free:
+                fh = self._free.pop()
+            else:
+                fh = self._next
+                self._next += 1
+            self._handles[fh] = OpenFile(node, flags)
+            self._open_count[node.ino] += 1
+            return fh
+
+    def get(self, fh):
+        return self._handles.get(fh) if fh else None
+
+    def close(self, fh):
+        """Fechar fh; retorna (OpenFile, era o ultimo handle do inode) ou (None, False)"""
+        with self._lock:
+            handle = self._handles.pop(fh, None)
+            if handle is None:
+                return None, False
+            self._free.append(fh)
+            ino = handle.node.ino
+            self._open_count[ino] -= 1
+            last = self._open_count[ino] <= 0
+            if last:
+                del self._open_count[ino]
+            return handle, last
+
+    def is_open(self, node):
+        return self._open_count.get(node.ino, 0) > 0
+
+    def __len__(self):
+        return len(self._handles)
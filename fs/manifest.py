@@ -0,0 +1,34 @@
+CHUNK_SIZE = 1024 * 1024  # 1MB por chunk
+HOLE = None  # chunk esparso (somente zeros)
+
+
+class FileManifest:
+    """
+    Manifesto de um arquivo do VFS: tamanho logico + lista de chunks.
+
+    Cada chunk cobre CHUNK_SIZE bytes (o ultimo pode ser menor) e e guardado
+    como um blob enderecado pelo hash do seu conteudo. Chunks so de zeros sao
+    buracos (HOLE): nao tem blob, e a leitura sintetiza os zeros.
+    """
+
+    __slots__ = ('size', 'chunks')
+
+    def __init__(self, size=0, chunks=None):
+        self.size = size
+        self.chunks = chunks if chunks is not None else []  # [hash | HOLE]
+
+    def chunk_index(self, offset):
+        return offset // CHUNK_SIZE
+
+    def chunk_range(self, offset, length):
+        """Indices dos chunks que cobrem [offset, offset + length)"""
+        end = min(offset + length, self.size)
+        if end <= offset:
+            return range(0)
+        return range(offset // CHUNK_SIZE, (end - 1) // CHUNK_SIZE + 1)
+
+    def chunk_length(self, index):
+        return max(0, min(CHUNK_SIZE, self.size - index * CHUNK_SIZE))
+
+    def copy(self):
+        return FileManifest(self.size, list(self.chunks))
@@ -0,0 +1,258 @@
+import errno
+import json
+import os
+import stat
+import threading
+import time
+
+from .manifest import FileManifest
+
+ROOT_INO = 1
+
+
+def _error(code, path):
+    return OSError(code, os.strerror(code), path)
+
+
+def split_path(path):
+    """'/a/b/c' -> ['a', 'b', 'c']"""
+    return [part for part in path.split('/') if part]
+
+
+class Inode:
+    """
+    No da arvore do VFS. Diretorios tem children {nome: Inode}; arquivos tem
+    um FileManifest. parent/name localizam o no no pai (a raiz nao tem pai).
+    """
+
+    __slots__ = ('ino', 'parent', 'name', 'mode', 'mtime', 'children', 'manifest')
+
+    def __init__(self, ino, parent, name, mode, mtime=None, manifest=None):
+        self.ino = ino
+        self.parent = parent
+        self.name = name
+        self.mode = mode
+        self.mtime = mtime if mtime is not None else time.time()
+        self.children = {} if stat.S_ISDIR(mode) else None
+        if manifest is None and self.children is None:
+            manifest = FileManifest()
+        self.manifest = manifest
+
+    def is_dir(self):
+        return self.children is not None
+
+
+class Namespace:
+    """
+    Arvore de diretorios do VFS, persistida na tabela inodes do MetadataDB.
+
+    Cada diretorio guarda um mapa nome -> filho, entao a busca custa
+    O(profundidade), readdir custa O(filhos) e rename de um diretorio inteiro
+    e O(1): so a linha do proprio no muda de pai. A estrutura (mkdir, create,
+    rename, remocoes) e gravada na hora; o conteudo (manifesto) de arquivos
+    alterados e marcado como sujo e gravado por sync().
+
+    Chunks que sairam de um manifesto sujo so perdem a referencia na mesma
+    transacao que grava o manifesto (ou que apaga o no): o manifesto gravado
+    nunca aponta para um chunk cuja referencia ja foi liberada.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.lock = threading.RLock()
+        self.inodes = {}  # {ino: Inode}
+        self._dirty = set()  # inos com manifesto ainda nao gravado
+        self._released = {}  # {ino: [hash]} chunks a liberar quando o manifesto for gravado
+        self._load()
+
+    def _load(self):
+        rows = self.db.get_inodes()
+        if not rows:
+            self.db.add_inode(None, '', stat.S_IFDIR | 0o755, time.time(), ino=ROOT_INO)
+            rows = self.db.get_inodes()
+        for ino, parent, name, mode, mtime, size, chunks in rows:
+            manifest = None
+            if not stat.S_ISDIR(mode):
+                manifest = FileManifest(size or 0, json.loads(chunks) if chunks else [])
+            self.inodes[ino] = Inode(ino, parent, name, mode, mtime, manifest)
+        for node in self.inodes.values():
+            if node.parent is not None:
+                self.inodes[node.parent].children[node.name] = node
+
+    @property
+    def root(self):
+        return self.inodes[ROOT_INO]
+
+    # Consulta
+    def lookup(self, path):
+        """Inode de path; OSError(ENOENT/ENOTDIR) se nao existir"""
+        node = self.root
+        for part in split_path(path):
+            if not node.is_dir():
+                raise _error(errno.ENOTDIR, path)
+            node = node.children.get(part)
+            if node is None:
+                raise _error(errno.ENOENT, path)
+        return node
+
+    def get(self, path):
+        try:
+            return self.lookup(path)
+        except OSError:
+            return None
+
+    def _parent_of(self, path):
+        parts = split_path(path)
+        if not parts:
+            raise _error(errno.EEXIST, path)
+        parent = self.lookup('/' + '/'.join(parts[:-1]))
+        if not parent.is_dir():
+            raise _error(errno.ENOTDIR, path)
+        return parent, parts[-1]
+
+    def path_of(self, node):
+        parts = []
+        while node.parent is not None:
+            parts.append(node.name)
+            node = self.inodes[node.parent]
+        return '/' + '/'.join(reversed(parts))
+
+    def listdir(self, path):
+        node = self.lookup(path)
+        if not node.is_dir():
+            raise _error(errno.ENOTDIR, path)
+        return list(node.children)
+
+    def files(self):
+        """Arquivos regulares (snapshot, seguro para threads de segundo plano)"""
+        return [node for node in list(self.inodes.values()) if not node.is_dir()]
+
+    # Alteracao
+    def create(self, path, mode):
+        """
+        Criar um arquivo vazio. Se ja existir um arquivo em path, ele e
+        substituido e seu manifesto antigo e retornado (para liberar os chunks).
+        """
+        with self.lock:
+            parent, name = self._parent_of(path)
+            previous = parent.children.get(name)
+            if previous is not None:
+                if previous.is_dir():
+                    raise _error(errno.EISDIR, path)
+                old, previous.manifest = previous.manifest, FileManifest()
+                previous.mtime = time.time()
+                self.db.update_inode(previous.ino, 0, [], previous.mtime,
+                                     released=self._take_released(previous.ino))
+                return previous, old
+            return self._add(parent, name, stat.S_IFREG | (mode & 0o7777)), None
+
+    def mkdir(self, path, mode):
+        with self.lock:
+            parent, name = self._parent_of(path)
+            if name in parent.children:
+                raise _error(errno.EEXIST, path)
+            return self._add(parent, name, stat.S_IFDIR | (mode & 0o7777))
+
+    def _add(self, parent, name, mode):
+        now = time.time()
+        ino = self.db.add_inode(parent.ino, name, mode, now)
+        node = Inode(ino, parent.ino, name, mode, now)
+        self.inodes[ino] = node
+        parent.children[name] = node
+        parent.mtime = now
+        return node
+
+    def unlink(self, path):
+        """Remover um arquivo; retorna o no removido"""
+        with self.lock:
+            node = self.lookup(path)
+            if node.is_dir():
+                raise _error(errno.EISDIR, path)
+            self._remove(node)
+            return node
+
+    def rmdir(self, path):
+        with self.lock:
+            node = self.lookup(path)
+            if not node.is_dir():
+                raise _error(errno.ENOTDIR, path)
+            if node.parent is None:
+                raise _error(errno.EBUSY, path)
+            if node.children:
+                raise _error(errno.ENOTEMPTY, path)
+            self._remove(node)
+
+    def _remove(self, node):
+        parent = self.inodes[node.parent]
+        del parent.children[node.name]
+        del self.inodes[node.ino]
+        parent.mtime = time.time()
+        self.db.delete_inode(node.ino, released=self._take_released(node.ino))
+
+    def rename(self, old, new):
+        """
+        Mover old para new em O(1). Um arquivo em new e substituido (o no
+        substituido e retornado); um diretorio em new precisa estar vazio.
+        """
+        with self.lock:
+            node = self.lookup(old)
+            if node.parent is None:
+                raise _error(errno.EBUSY, old)
+            parent, name = self._parent_of(new)
+            # Um diretorio nao pode ir para dentro de si mesmo
+            ancestor = parent
+            while ancestor is not None:
+                if ancestor is node:
+                    raise _error(errno.EINVAL, new)
+                ancestor = self.inodes.get(ancestor.parent)
+
+            replaced = parent.children.get(name)
+            if replaced is node:
+                return None
+            if replaced is not None:
+                if replaced.is_dir() != node.is_dir():
+                    raise _error(errno.EISDIR if replaced.is_dir() else errno.ENOTDIR, new)
+                if replaced.is_dir() and replaced.children:
+                    raise _error(errno.ENOTEMPTY, new)
+                del self.inodes[replaced.ino]
+
+            self.db.move_inode(node.ino, parent.ino, name, replaced.ino if replaced else None,
+                               released=self._take_released(replaced.ino) if replaced else ())
+            del self.inodes[node.parent].children[node.name]
+            node.parent, node.name = parent.ino, name
+            parent.children[name] = node
+            parent.mtime = time.time()
+            return replaced
+
+    # Persistencia do conteudo
+    def mark_dirty(self, node, released=()):
+        """
+        Marcar o manifesto de node para gravacao. released: chunks ja retirados
+        do manifesto em memoria, liberados junto com a gravacao.
+        """
+        with self.lock:
+            node.mtime = time.time()
+            self._dirty.add(node.ino)
+            if released:
+                self._released.setdefault(node.ino, []).extend(h for h in released if h is not None)
+
+    def _take_released(self, ino):
+        self._dirty.discard(ino)
+        return self._released.pop(ino, [])
+
+    def sync(self, node=None):
+        """Gravar o manifesto de node (ou de todos os arquivos sujos) e liberar os chunks retirados"""
+        with self.lock:
+            inos = [node.ino] if node is not None else list(self._dirty)
+            rows = []
+            for ino in inos:
+                if ino not in self._dirty:
+                    continue
+                released = self._take_released(ino)
+                current = self.inodes.get(ino)
+                if current is not None:
+                    manifest = current.manifest
+                    rows.append((ino, manifest.size, list(manifest.chunks), current.mtime, released))
+            if rows:
+                # Ainda sob o lock: uma gravacao mais nova do mesmo no nunca chega antes desta
+                self.db.update_inodes(rows)
@@ -0,0 +1,129 @@
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .manifest import CHUNK_SIZE
+
+
+class _StreamState:
+    """Padrao de acesso de um handle aberto"""
+
+    __slots__ = ('last_end', 'sequential_reads', 'window', 'prefetched_upto',
+                 'bytes_read', 'started_at')
+
+    def __init__(self, min_window):
+        self.last_end = None
+        self.sequential_reads = 0
+        self.window = min_window
+        self.prefetched_upto = -1  # maior indice de chunk ja agendado
+        self.bytes_read = 0
+        self.started_at = time.time()
+
+
+class ReadAheadEngine:
+    """
+    Read-ahead sequencial para o VFS.
+
+    Detecta leituras sequenciais por handle e agenda, num pool de threads,
+    a leitura e descompressao dos proximos chunks para o HybridCache. A
+    janela cresce (dobrando) ate cobrir lead_time segundos da vazao
+    observada do leitor, limitada a max_window chunks.
+    """
+
+    def __init__(self, fetch_chunk, max_workers=4, min_window=2, max_window=32,
+                 lead_time=1.0, sequential_threshold=2):
+        self.fetch_chunk = fetch_chunk  # fetch_chunk(hash) carrega o chunk no cache
+        self.min_window = min_window
+        self.max_window = max_window
+        self.lead_time = lead_time
+        self.sequential_threshold = sequential_threshold
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='readahead')
+        self._lock = threading.Lock()
+        self._streams = {}  # {(path, fh): _StreamState}
+        self._in_flight = set()
+
+        self.prefetch_submitted = 0
+        self.prefetch_completed = 0
+        self.prefetch_errors = 0
+
+    def on_read(self, stream_key, chunks, offset, length):
+        """Registrar uma leitura e, se o padrao for sequencial, agendar os proximos chunks"""
+        if length <= 0:
+            return
+        now = time.time()
+        to_fetch = []
+        with self._lock:
+            state = self._streams.get(stream_key)
+            if state is None:
+                state = self._streams[stream_key] = _StreamState(self.min_window)
+
+            # Tolerancia de um pedido para reordenacões do kernel
+            if state.last_end is not None and abs(offset - state.last_end) <= length:
+                state.sequential_reads += 1
+            else:
+                state.sequential_reads = 0
+                state.window = self.min_window
+                state.prefetched_upto = -1
+                state.bytes_read = 0
+                state.started_at = now
+            state.last_end = offset + length
+            state.bytes_read += length
+
+            if state.sequential_reads < self.sequential_threshold:
+                return
+
+            self._adapt_window(state, now)
+            current = (offset + length - 1) // CHUNK_SIZE
+            first = max(current + 1, state.prefetched_upto + 1)
+            last = min(current + state.window, len(chunks) - 1)
+            for index in range(first, last + 1):
+                h = chunks[index]
+                if h is not None and h not in self._in_flight:
+                    self._in_flight.add(h)
+                    to_fetch.append(h)
+            state.prefetched_upto = max(state.prefetched_upto, last)
+
+        for h in to_fetch:
+            self.prefetch_submitted += 1
+            self._executor.submit(self._prefetch, h)
+
+    def _adapt_window(self, state, now):
+        elapsed = max(now - state.started_at, 1e-3)
+        throughput = state.bytes_read / elapsed
+        desired = math.ceil(throughput * self.lead_time / CHUNK_SIZE)
+        target = min(self.max_window, max(self.min_window, desired))
+        if state.window < target:
+            state.window = min(target, state.window * 2)
+        elif state.window > target:
+            state.window -= 1
+
+    def _prefetch(self, h):
+        try:
+            self.fetch_chunk(h)
+            self.prefetch_completed += 1
+        except Exception as e:
+            self.prefetch_errors += 1
+            print(f"Erro no read-ahead do chunk {h}: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(h)
+
+    def forget(self, stream_key):
+        with self._lock:
+            self._streams.pop(stream_key, None)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'streams': len(self._streams),
+                'in_flight': len(self._in_flight),
+                'prefetch_submitted': self.prefetch_submitted,
+                'prefetch_completed': self.prefetch_completed,
+                'prefetch_errors': self.prefetch_errors
+            }
+
+    def shutdown(self):
+        """Cancelar prefetches ainda na fila e esperar os que ja estao rodando"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
@@ -2,6 +2,8 @@ import os
 import errno
 import hashlib
 import platform
+import shutil
+import threading
 
 # Importar modulo correto baseado no SO
 if platform.system() == 'Windows':
@@ -11,188 +13,622 @@ if platform.system() == 'Windows':
     # FUSE sera importado do modulo winfuse quando necessario
     FUSE = None
 else:
-    # No Linux, usar fusepy
-    from fuse import FUSE, Operations
-
-from cache.cache import HybridCache
+    # No Linux, usar fusepy (dispensavel quando o VFS roda sobre o pyfuse3, ver async_vfs)
+    try:
+        from fuse import FUSE, Operations
+    except (ImportError, OSError):
+        class Operations:
+            pass
+        FUSE = None
+
+from cache.registry import get_shared_cache
+from core.database import MetadataDB
+from core.blob_store import BlobStore
+from core.garbage_collector import GarbageCollector
+from core.scrub import Scrubber
+from core.delta import DeltaStore
+from core.tiering import Recompressor
+from core.deduplication import is_zero_block
+from .manifest import CHUNK_SIZE, HOLE
+from .namespace import Namespace
+from .handles import HandleTable
+from .readahead import ReadAheadEngine
 import zstandard as zstd
 
+# Atributos estendidos somente leitura, servidos pelo MetadataDB
+XATTR_PREFIX = 'user.quarkdrive.'
+FILE_XATTRS = ('hash', 'compressed_size', 'codec', 'refcount')
+ROOT_XATTRS = ('logical_size', 'physical_size')
+STATFS_BLOCK = 4096
+# Chave em scrub_state: '1' enquanto montado, '0' depois de um destroy limpo
+VFS_OPEN_KEY = 'vfs_open'
+# Sem os.statvfs (Windows): limite de arquivos de um volume NTFS
+STATFS_MAX_FILES = 2 ** 32 - 1
+
+# Modos do fallocate (linux/falloc.h)
+FALLOC_FL_KEEP_SIZE = 0x01
+FALLOC_FL_PUNCH_HOLE = 0x02
+FALLOC_FL_ZERO_RANGE = 0x10
+
+# Zeros compartilhados: buracos e preenchimentos sao fatias dele, sem alocar por leitura
+_ZEROS = memoryview(bytes(CHUNK_SIZE))
+
 
 class DedupCompressFS(Operations):
     """
     Sistema de Arquivos Virtual com:
-    - Desduplicacao
+    - Desduplicacao (por chunk de CHUNK_SIZE bytes)
     - Compactacao
     - Cache Inteligente
+    - Read-ahead sequencial
     """
 
-    def __init__(self, backend_folder):
+    def __init__(self, backend_folder, cache=None, readahead_workers=4, volumes=None,
+                 gc_interval=60.0, scrub_interval=None, recompress_interval=3600.0, sync_interval=5.0,
+                 delta_writes=False):
         self.backend_folder = backend_folder
         os.makedirs(self.backend_folder, exist_ok=True)
 
-        self.cache = HybridCache()
-
-        self.zstd_compressor = zstd.ZstdCompressor(level=5)
-        self.zstd_decompressor = zstd.ZstdDecompressor()
-
-        self.hash_map = {}  # {filename: hash}
+        # Cache unico do processo, compartilhado com o StorageManager
+        self.cache = cache if cache is not None else get_shared_cache()
+
+        # Blobs dos chunks: pequenos em pack files, grandes em arquivos proprios;
+        # volumes={raiz: peso} distribui os blobs entre varios discos
+        self.db = MetadataDB(os.path.join(self.backend_folder, 'metadata.db'))
+        self.blob_store = BlobStore(self.backend_folder, self.db, volumes=volumes)
+        # Deltas ja gravados sao lidos sempre; gravar novos exige sketch e ate tres
+        # encodes zstd de nivel alto, entao fica fora do caminho de escrita salvo
+        # com delta_writes=True (so chunks completos pagam o sketch)
+        self.delta = DeltaStore(self.db, self.blob_store, cache=self.cache, min_size=CHUNK_SIZE)
+        self.delta_writes = delta_writes
+
+        # ZstdCompressor nao e thread-safe: o front end assincrono grava arquivos
+        # distintos em paralelo, entao cada thread usa o seu (ver _compressor)
+        self._local = threading.local()
+
+        # Arvore de diretorios persistida no MetadataDB (inodes com manifestos)
+        self.namespace = Namespace(self.db)
+        # Montagem anterior sem destroy (queda): referencias somadas por escritas cujo
+        # manifesto nao chegou a ser gravado ficaram sobrando; recontar a partir do banco
+        if self.db.get_scrub_state(VFS_OPEN_KEY) == '1':
+            self.db.recount_blob_refs()
+        self.db.set_scrub_state(VFS_OPEN_KEY, '1')
+        # Handles inteiros de open/create: fixam o inode e o ultimo chunk decodificado
+        self.handles = HandleTable()
+        self._orphans = {}  # {ino: Inode} removidos com handles ainda abertos
+
+        self.readahead = ReadAheadEngine(self._prefetch_chunk, max_workers=readahead_workers)
+
+        # Cada chunk num manifesto segura uma referencia ao seu blob
+        self.gc = GarbageCollector(self.db, self.blob_store, roots=self._live_chunks,
+                                   interval=gc_interval)
+        self.gc.start()
+        self.scrubber = Scrubber(self.db, self.blob_store, interval=scrub_interval,
+                                 referrers=self._files_using_chunk, delta=self.delta)
+        if scrub_interval:
+            self.scrubber.start()
+        # Chunks sem leitura ha muito tempo sao recomprimidos num nivel alto
+        self.tiering = Recompressor(self.db, self.blob_store, interval=recompress_interval)
+        if recompress_interval:
+            self.tiering.start()
+
+        # Manifestos sujos de arquivos que ficam abertos (ou montagens sem flush/release,
+        # como a do Windows) sao gravados a cada sync_interval segundos
+        self.sync_interval = sync_interval
+        self._sync_stop = threading.Event()
+        self._sync_thread = None
+        if sync_interval:
+            self._sync_thread = threading.Thread(target=self._sync_loop, daemon=True, name='namespace-sync')
+            self._sync_thread.start()
+
+    def _sync_loop(self):
+        while not self._sync_stop.wait(self.sync_interval):
+            try:
+                self.namespace.sync()
+            except Exception as e:
+                print(f"Erro ao gravar manifestos: {e}")
 
     # Helpers
     def _hash(self, data):
         return hashlib.sha256(data).hexdigest()
 
-    def _path_from_hash(self, h):
-        return os.path.join(self.backend_folder, h)
-
-    def _get_size(self, filename):
+    def _get_file(self, path):
+        node = self.namespace.lookup(path)
+        if node.is_dir():
+            raise IsADirectoryError(errno.EISDIR, os.strerror(errno.EISDIR), path)
+        return node
+
+    def _get_manifest(self, path):
+        return self._get_file(path).manifest
+
+    def _file_for(self, path, fh):
+        """(Inode, OpenFile | None): pelo handle quando houver, sem resolver o caminho"""
+        handle = self.handles.get(fh)
+        if handle is not None:
+            return handle.node, handle
+        return self._get_file(path), None
+
+    def _chunk_data(self, h, handle):
+        """Conteudo de um chunk, reaproveitando o ultimo chunk decodificado pelo handle"""
+        if handle is not None:
+            data = handle.cached_chunk(h)
+            if data is not None:
+                return data
+        data = self._read_chunk(h)
+        if handle is not None:
+            handle.remember_chunk(h, data)
+        return data
+
+    def _open_for_write(self, path):
+        """Arquivo de path, criado vazio se ainda nao existir"""
+        node = self.namespace.get(path)
+        if node is None:
+            node, _ = self.namespace.create(path, 0o644)
+        elif node.is_dir():
+            raise IsADirectoryError(errno.EISDIR, os.strerror(errno.EISDIR), path)
+        return node
+
+    def _get_size(self, path):
         """Obter tamanho real do arquivo descomprimido"""
-        if filename not in self.hash_map:
-            return 0
-            
-        h = self.hash_map[filename]
+        node = self.namespace.get('/' + path.lstrip('/'))
+        return node.manifest.size if node is not None and not node.is_dir() else 0
+
+    def _load_chunk(self, h):
+        """Ler e descomprimir um chunk do backend"""
+        # DeltaStore usa um descompressor por thread: seguro nas threads de read-ahead
+        data = self.delta.get(h)
+        if data is None:
+            raise FileNotFoundError(errno.ENOENT, f"Blob {h} nao encontrado")
+        return data
+
+    def _read_chunk(self, h):
+        self.tiering.record_access(h)
         data, _ = self.cache.get(h)
-        
         if data is None:
-            compressed_path = self._path_from_hash(h)
-            if os.path.exists(compressed_path):
-                with open(compressed_path, 'rb') as f:
-                    compressed = f.read()
-                data = self.zstd_decompressor.decompress(compressed)
+            data = self._load_chunk(h)
+            self.cache.add(h, data)
+        return data
+
+    def _prefetch_chunk(self, h):
+        """Carregar um chunk na RAM do cache (usado pelo read-ahead)"""
+        if not self.cache.in_ram(h):
+            self.cache.add_to_ram(h, self._load_chunk(h))
+
+    def _live_chunks(self):
+        """Hashes referenciados pelos manifestos (raizes do GC), inclusive de arquivos removidos ainda abertos"""
+        for node in self.namespace.files() + list(self._orphans.values()):
+            yield from (h for h in list(node.manifest.chunks) if h is not HOLE)
+
+    def _files_using_chunk(self, h):
+        return [self.namespace.path_of(node) for node in self.namespace.files()
+                if h in node.manifest.chunks]
+
+    def _release_chunks(self, hashes, node=None):
+        """
+        Liberar as referencias de chunks. Com node (chunks retirados de um manifesto
+        vivo) a liberacao espera a gravacao do manifesto, na mesma transacao.
+        """
+        if node is not None:
+            self.namespace.mark_dirty(node, released=hashes)
+            return
+        for h in hashes:
+            if h is not HOLE:
+                self.db.decrement_blob_ref(h)
+
+    def _release_node(self, node):
+        """Liberar os chunks de um arquivo removido; com handles abertos, so no ultimo release"""
+        if self.handles.is_open(node):
+            self._orphans[node.ino] = node
+        else:
+            self._release_chunks(node.manifest.chunks)
+
+    def _compressor(self):
+        compressor = getattr(self._local, 'compressor', None)
+        if compressor is None:
+            compressor = self._local.compressor = zstd.ZstdCompressor(level=5)
+        return compressor
+
+    def _store_chunk(self, data, replaces=None):
+        """
+        Gravar um chunk (deduplicado pelo hash) e retornar seu hash com uma referencia.
+        Chunks so de zeros viram HOLE, sem compressao nem armazenamento.
+        replaces: chunk substituido, que nao deve virar base de delta do novo.
+        """
+        if is_zero_block(data):
+            return HOLE
+        data = bytes(data)
+        h = self._hash(data)
+        if not self.db.increment_blob_ref(h):
+            compressed = self._compressor().compress(data)
+            if self.delta_writes:
+                self.delta.store(h, data, compressed=compressed,
+                                 exclude=(replaces,) if replaces else ())
             else:
-                return 0
-                
-        return len(data)
+                self.blob_store.put(h, compressed, len(data))
+        self.cache.add(h, data)
+        return h
+
+    def _extend(self, node, new_size):
+        """Estender o arquivo ate new_size; a regiao nova e esparsa"""
+        manifest = node.manifest
+        chunks = manifest.chunks
+        # Um ultimo chunk HOLE cresce sozinho com o tamanho do arquivo
+        if chunks and manifest.size % CHUNK_SIZE and chunks[-1] is not HOLE:
+            # Completar o ultimo chunk parcial
+            index = len(chunks) - 1
+            data = self._read_chunk(chunks[index])
+            target = min(CHUNK_SIZE, new_size - index * CHUNK_SIZE)
+            if target > len(data):
+                old = chunks[index]
+                chunks[index] = self._store_chunk(data + bytes(target - len(data)), replaces=old)
+                self._release_chunks([old], node)
+        while len(chunks) * CHUNK_SIZE < new_size:
+            chunks.append(HOLE)
+        manifest.size = max(manifest.size, new_size)
 
     # Filesystem Methods
     def getattr(self, path, fh=None):
-        if path == '/':
-            st = os.lstat(self.backend_folder)
-            return dict((key, getattr(st, key)) for key in ('st_mode', 'st_nlink'))
-
-        if path.lstrip('/') not in self.hash_map:
-            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+        handle = self.handles.get(fh)
+        node = handle.node if handle is not None else self.namespace.lookup(path)
 
         st = os.lstat(self.backend_folder)
-        size = self._get_size(path.lstrip('/'))
-        return {
-            'st_mode': 0o100644,
-            'st_nlink': 1,
-            'st_size': size,
-            **{k: getattr(st, k) for k in ('st_uid', 'st_gid', 'st_atime', 'st_mtime', 'st_ctime')}
+        attrs = {
+            'st_mode': node.mode,
+            'st_mtime': node.mtime,
+            'st_ctime': node.mtime,
+            **{k: getattr(st, k) for k in ('st_uid', 'st_gid', 'st_atime')}
         }
+        if node.is_dir():
+            attrs.update(st_nlink=2, st_size=0)
+        else:
+            attrs.update(st_nlink=1, st_size=node.manifest.size)
+        return attrs
 
     def readdir(self, path, fh):
-        return ['.', '..'] + list(self.hash_map.keys())
+        return ['.', '..'] + self.namespace.listdir(path)
+
+    def statfs(self, path):
+        """
+        Espaco fisico do backend; o tamanho logico fica em user.quarkdrive.logical_size
+        da raiz. Os inodes livres sao os do volume do backend (cada arquivo novo pode
+        criar arquivos de blob la), somados aos inodes ja usados pela arvore.
+        """
+        usage = shutil.disk_usage(self.backend_folder)
+        free = usage.free // STATFS_BLOCK
+        used_inodes = len(self.namespace.inodes)
+        if hasattr(os, 'statvfs'):
+            backend = os.statvfs(self.backend_folder)
+            free_inodes, avail_inodes = backend.f_ffree, backend.f_favail
+        else:
+            free_inodes = avail_inodes = max(0, STATFS_MAX_FILES - used_inodes)
+        return {
+            'f_bsize': STATFS_BLOCK,
+            'f_frsize': STATFS_BLOCK,
+            'f_blocks': usage.total // STATFS_BLOCK,
+            'f_bfree': free,
+            'f_bavail': free,
+            'f_files': used_inodes + free_inodes,
+            'f_ffree': free_inodes,
+            'f_favail': avail_inodes,
+            'f_namemax': 255
+        }
 
-    # Read / Write
-    def read(self, path, size, offset, fh):
-        filename = path.lstrip('/')
+    def _xattrs(self, node):
+        """
+        Atributos de um no, so com metadados (nenhum blob e lido):
+        - hash: sha256 da lista de chunks (igual para conteudos iguais)
+        - compressed_size: soma dos blobs dos chunks, sem descontar o compartilhamento
+        - codec: codecs usados pelos chunks ('zstd', 'zstd-delta', 'hole')
+        - refcount: menor ref_count entre os chunks (1 = ha dados so deste arquivo)
+        Na raiz: logical_size (soma dos arquivos) e physical_size (soma dos blobs).
+        """
+        if node.ino == self.namespace.root.ino:
+            return {'logical_size': self.db.get_logical_size(),
+                    'physical_size': self.db.get_total_compressed_size()}
+        if node.is_dir():
+            return {}
+        chunks = list(node.manifest.chunks)
+        summaries = self.db.get_blob_summaries(h for h in chunks if h is not HOLE)
+        codecs = set()
+        compressed_size = 0
+        for h in chunks:
+            if h is HOLE:
+                codecs.add('hole')
+                continue
+            size_compressed, _, base_hash, _ = summaries.get(h, (0, 0, None, False))
+            compressed_size += size_compressed
+            codecs.add('zstd-delta' if base_hash else 'zstd')
+        manifest_hash = self._hash('\n'.join(h or '' for h in chunks).encode())
+        return {
+            'hash': manifest_hash,
+            'compressed_size': compressed_size,
+            'codec': ','.join(sorted(codecs)),
+            'refcount': min((ref for _, ref, _, _ in summaries.values()), default=0)
+        }
 
-        if filename not in self.hash_map:
-            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+    def getxattr(self, path, name, position=0):
+        node = self.namespace.lookup(path)
+        if name.startswith(XATTR_PREFIX):
+            value = self._xattrs(node).get(name[len(XATTR_PREFIX):])
+            if value is not None:
+                return str(value).encode()
+        raise OSError(errno.ENODATA, os.strerror(errno.ENODATA), path)
+
+    def listxattr(self, path):
+        node = self.namespace.lookup(path)
+        if node.ino == self.namespace.root.ino:
+            names = ROOT_XATTRS
+        else:
+            names = () if node.is_dir() else FILE_XATTRS
+        return [XATTR_PREFIX + name for name in names]
+
+    def setxattr(self, path, name, value, options, position=0):
+        # Somente leitura: os valores vem dos metadados
+        raise OSError(errno.ENOTSUP, os.strerror(errno.ENOTSUP), path)
+
+    def removexattr(self, path, name):
+        raise OSError(errno.ENOTSUP, os.strerror(errno.ENOTSUP), path)
+
+    def mkdir(self, path, mode):
+        self.namespace.mkdir(path, mode)
+        return 0
 
-        h = self.hash_map[filename]
-        data, source = self.cache.get(h)
+    def rmdir(self, path):
+        self.namespace.rmdir(path)
+        return 0
 
-        if data is None:
-            compressed_path = self._path_from_hash(h)
-            with open(compressed_path, 'rb') as f:
-                compressed = f.read()
-            data = self.zstd_decompressor.decompress(compressed)
-            self.cache.add(h, data)
+    def rename(self, old, new):
+        # O(1): so o no movido muda de pai; um arquivo sobrescrito libera seus chunks
+        replaced = self.namespace.rename(old, new)
+        if replaced is not None and not replaced.is_dir():
+            self._release_node(replaced)
+        return 0
+
+    # Open / Read / Write
+    def open(self, path, flags):
+        return self.handles.open(self._get_file(path), flags)
 
-        return data[offset:offset + size]
+    def read(self, path, size, offset, fh):
+        node, handle = self._file_for(path, fh)
+        manifest = node.manifest
+
+        end = min(offset + size, manifest.size)
+        # Fatias memoryview dos chunks em cache: a resposta e copiada uma unica vez, no join
+        parts = []
+        for index in manifest.chunk_range(offset, size):
+            chunk_start = index * CHUNK_SIZE
+            lo = max(offset - chunk_start, 0)
+            hi = min(end - chunk_start, CHUNK_SIZE)
+            h = manifest.chunks[index]
+            if h is HOLE:
+                # Buraco: zeros sem I/O
+                parts.append(_ZEROS[lo:hi])
+                continue
+            data = self._chunk_data(h, handle)
+            parts.append(data if lo == 0 and hi == len(data) else memoryview(data)[lo:hi])
+
+        self.readahead.on_read((path, fh), manifest.chunks, offset, max(0, end - offset))
+
+        if len(parts) == 1 and isinstance(parts[0], bytes):
+            # Chunk inteiro: o proprio objeto do cache, sem copia
+            return parts[0]
+        return b''.join(parts)
 
     def write(self, path, data, offset, fh):
-        filename = path.lstrip('/')
-        existing = b''
-
-        if filename in self.hash_map:
-            h = self.hash_map[filename]
-            cached, _ = self.cache.get(h)
-            if cached is None:
-                compressed_path = self._path_from_hash(h)
-                with open(compressed_path, 'rb') as f:
-                    compressed = f.read()
-                cached = self.zstd_decompressor.decompress(compressed)
-
-            existing = cached
-
-        new_data = bytearray(existing)
-        if len(new_data) < offset:
-            new_data.extend(b'\x00' * (offset - len(new_data)))
-        new_data[offset:offset + len(data)] = data
-
-        h = self._hash(new_data)
-        compressed = self.zstd_compressor.compress(new_data)
-
-        with open(self._path_from_hash(h), 'wb') as f:
-            f.write(compressed)
-
-        self.hash_map[filename] = h
-        self.cache.add(h, bytes(new_data))
-        
+        handle = self.handles.get(fh)
+        node = handle.node if handle is not None else self._open_for_write(path)
+        manifest = node.manifest
+
+        if offset > manifest.size:
+            self._extend(node, offset)
+
+        end = offset + len(data)
+        first = offset // CHUNK_SIZE
+        last = (end - 1) // CHUNK_SIZE
+        view = memoryview(data)
+        for index in range(first, last + 1):
+            chunk_start = index * CHUNK_SIZE
+            lo = max(offset, chunk_start)
+            hi = min(end, chunk_start + CHUNK_SIZE)
+            piece = view[lo - offset:hi - offset]
+
+            if lo == chunk_start and hi - chunk_start >= manifest.chunk_length(index):
+                # Chunk sobrescrito por inteiro: nao ler nem descomprimir o anterior
+                chunk = data if len(piece) == len(data) and isinstance(data, bytes) else bytes(piece)
+            else:
+                if index < len(manifest.chunks) and manifest.chunks[index] is not HOLE:
+                    base = memoryview(self._chunk_data(manifest.chunks[index], handle))
+                else:
+                    base = _ZEROS[:manifest.chunk_length(index)]
+                # Cabeca e cauda do chunk atual em volta do trecho novo: uma unica copia
+                chunk = b''.join((base[:lo - chunk_start], piece, base[hi - chunk_start:]))
+
+            if index < len(manifest.chunks):
+                old = manifest.chunks[index]
+                h = self._store_chunk(chunk, replaces=old)
+                manifest.chunks[index] = h
+                self._release_chunks([old], node)
+            else:
+                h = self._store_chunk(chunk)
+                manifest.chunks.append(h)
+            if handle is not None and h is not HOLE:
+                # Escritas pequenas seguidas no mesmo chunk nao voltam ao cache
+                handle.remember_chunk(h, chunk)
+
+        manifest.size = max(manifest.size, end)
+        self.namespace.mark_dirty(node)
+
         return len(data)
 
+    def copy_file_range(self, path_in, fh_in, offset_in, path_out, fh_out, offset_out, length, flags):
+        """
+        Copiar [offset_in, offset_in + length) de path_in para path_out.
+        Com offsets alinhados a CHUNK_SIZE os chunks sao compartilhados (so
+        referencias, sem ler nem recomprimir); o restante cai em read/write.
+
+        So no nucleo: nem o fusepy 3.0.1 nem o pyfuse3 (ate 3.5) registram
+        copy_file_range na libfuse, entao o kernel nunca entrega esta operacao
+        a uma montagem (cp faz read/write). Serve a quem usa o nucleo direto.
+        """
+        src = self._file_for(path_in, fh_in)[0].manifest
+        length = max(0, min(length, src.size - offset_in))
+        if length == 0:
+            return 0
+        if path_in == path_out and offset_in < offset_out + length and offset_out < offset_in + length:
+            raise OSError(errno.EINVAL, os.strerror(errno.EINVAL), path_out)
+        if offset_in % CHUNK_SIZE or offset_out % CHUNK_SIZE:
+            return self.write(path_out, self.read(path_in, length, offset_in, fh_in), offset_out, fh_out)
+
+        handle = self.handles.get(fh_out)
+        node = handle.node if handle is not None else self._open_for_write(path_out)
+        dst = node.manifest
+        if offset_out > dst.size:
+            self._extend(node, offset_out)
+
+        shared, released = [], []
+        copied = 0
+        while copied < length:
+            n = min(CHUNK_SIZE, length - copied)
+            index_in = (offset_in + copied) // CHUNK_SIZE
+            index_out = (offset_out + copied) // CHUNK_SIZE
+            end_out = offset_out + copied + n
+            # O chunk so pode ser compartilhado se ficar identico no destino:
+            # inteiro na origem e sem dados do destino depois dele
+            if src.chunk_length(index_in) != n or (n < CHUNK_SIZE and dst.size > end_out):
+                self.write(path_out, self.read(path_in, n, offset_in + copied, fh_in),
+                           offset_out + copied, fh_out)
+                copied += n
+                continue
+            h = src.chunks[index_in]
+            if h is not HOLE:
+                shared.append(h)
+            if index_out < len(dst.chunks):
+                released.append(dst.chunks[index_out])
+                dst.chunks[index_out] = h
+            else:
+                dst.chunks.append(h)
+            dst.size = max(dst.size, end_out)
+            copied += n
+
+        self.db.add_blob_refs(shared)
+        self._release_chunks(released, node)
+        return length
+
     def create(self, path, mode, fi=None):
-        filename = path.lstrip('/')
-        
-        # Criar arquivo vazio
-        h = self._hash(b'')
-        compressed = self.zstd_compressor.compress(b'')
-        
-        with open(self._path_from_hash(h), 'wb') as f:
-            f.write(compressed)
-            
-        self.hash_map[filename] = h
-        return 0
+        # Criar arquivo vazio (sem chunks); recriar libera o conteudo anterior
+        node, previous = self.namespace.create(path, mode)
+        if previous is not None:
+            self._release_chunks(previous.chunks)
+        return self.handles.open(node, os.O_WRONLY)
 
     def unlink(self, path):
-        filename = path.lstrip('/')
-        
-        if filename not in self.hash_map:
-            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
-            
-        # Remover do mapeamento
-        del self.hash_map[filename]
+        # Remover da arvore e liberar os chunks para o GC
+        # Com handles abertos o conteudo continua legivel ate o ultimo release
+        self._release_node(self.namespace.unlink(path))
         return 0
 
     def truncate(self, path, length, fh=None):
-        filename = path.lstrip('/')
-        
-        if filename not in self.hash_map:
-            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
-            
-        # Obter dados atuais
-        h = self.hash_map[filename]
-        data, _ = self.cache.get(h)
-        
-        if data is None:
-            compressed_path = self._path_from_hash(h)
-            with open(compressed_path, 'rb') as f:
-                compressed = f.read()
-            data = self.zstd_decompressor.decompress(compressed)
-            
-        # Truncar dados
-        new_data = data[:length]
-        
-        # Salvar dados truncados
-        h = self._hash(new_data)
-        compressed = self.zstd_compressor.compress(new_data)
-        
-        with open(self._path_from_hash(h), 'wb') as f:
-            f.write(compressed)
-            
-        self.hash_map[filename] = h
-        self.cache.add(h, new_data)
-        
+        node, handle = self._file_for(path, fh)
+        manifest = node.manifest
+        self.namespace.mark_dirty(node)
+
+        if length >= manifest.size:
+            self._extend(node, length)
+            return 0
+
+        # Descartar chunks excedentes e recodificar apenas o chunk de fronteira
+        # O tamanho encolhe antes da lista: um leitor concorrente nunca indexa alem dela
+        keep = (length + CHUNK_SIZE - 1) // CHUNK_SIZE
+        manifest.size = length
+        dropped = manifest.chunks[keep:]
+        del manifest.chunks[keep:]
+        tail = length % CHUNK_SIZE
+        if tail and manifest.chunks[-1] is not HOLE:
+            data = self._chunk_data(manifest.chunks[-1], handle)
+            dropped.append(manifest.chunks[-1])
+            manifest.chunks[-1] = self._store_chunk(data[:tail], replaces=manifest.chunks[-1])
+        self._release_chunks(dropped, node)
+
         return 0
 
+    def fallocate(self, path, mode, offset, length, fh=None):
+        """
+        Sem alocacao real (o armazenamento e esparso e deduplicado): reservar so
+        estende o tamanho com buracos; PUNCH_HOLE/ZERO_RANGE viram buracos nos
+        chunks cobertos e recodificam apenas os chunks de fronteira.
+        """
+        if mode & ~(FALLOC_FL_KEEP_SIZE | FALLOC_FL_PUNCH_HOLE | FALLOC_FL_ZERO_RANGE):
+            raise OSError(errno.EOPNOTSUPP, os.strerror(errno.EOPNOTSUPP), path)
+        if mode & FALLOC_FL_PUNCH_HOLE and not mode & FALLOC_FL_KEEP_SIZE:
+            raise OSError(errno.EINVAL, os.strerror(errno.EINVAL), path)
+        if offset < 0 or length <= 0:
+            raise OSError(errno.EINVAL, os.strerror(errno.EINVAL), path)
+
+        node, handle = self._file_for(path, fh)
+        manifest = node.manifest
+        end = offset + length
+        if mode & (FALLOC_FL_PUNCH_HOLE | FALLOC_FL_ZERO_RANGE):
+            self._zero_range(node, handle, offset, min(end, manifest.size))
+        if not mode & FALLOC_FL_KEEP_SIZE and end > manifest.size:
+            self._extend(node, end)
+        self.namespace.mark_dirty(node)
+        return 0
+
+    def _zero_range(self, node, handle, start, end):
+        """Zerar [start, end) dentro do arquivo, sem ler os chunks cobertos por inteiro"""
+        manifest = node.manifest
+        if end <= start:
+            return
+        for index in range(start // CHUNK_SIZE, (end - 1) // CHUNK_SIZE + 1):
+            old = manifest.chunks[index]
+            if old is HOLE:
+                continue
+            chunk_start = index * CHUNK_SIZE
+            lo = max(start, chunk_start) - chunk_start
+            hi = min(end, chunk_start + CHUNK_SIZE) - chunk_start
+            if lo == 0 and hi >= manifest.chunk_length(index):
+                manifest.chunks[index] = HOLE
+            else:
+                base = memoryview(self._chunk_data(old, handle))
+                chunk = b''.join((base[:lo], _ZEROS[:hi - lo], base[hi:]))
+                manifest.chunks[index] = self._store_chunk(chunk, replaces=old)
+            self._release_chunks([old], node)
+
+    def _sync(self, path, fh):
+        """Gravar o manifesto do arquivo no MetadataDB, se alterado"""
+        handle = self.handles.get(fh)
+        node = handle.node if handle is not None else self.namespace.get(path)
+        if node is not None:
+            self.namespace.sync(node)
+
     def flush(self, path, fh):
+        self._sync(path, fh)
         return 0
 
     def release(self, path, fh):
+        self.readahead.forget((path, fh))
+        self._sync(path, fh)
+        handle, last = self.handles.close(fh)
+        if last and self._orphans.pop(handle.node.ino, None) is not None:
+            self._release_chunks(handle.node.manifest.chunks)
         return 0
 
     def fsync(self, path, fdatasync, fh):
-        return 0
\ No newline at end of file
+        self._sync(path, fh)
+        return 0
+
+    def destroy(self, path):
+        # Persistir o write-back pendente do cache ao desmontar; o read-ahead
+        # para antes, pois seus prefetches leem do blob store e do banco
+        self.readahead.shutdown()
+        self.gc.stop()
+        self._sync_stop.set()
+        if self._sync_thread is not None:
+            self._sync_thread.join()
+        self.namespace.sync()
+        self.scrubber.stop()
+        self.tiering.stop()
+        self.cache.flush()
+        self.blob_store.close()
+        self.db.set_scrub_state(VFS_OPEN_KEY, '0')
+        self.db.close()
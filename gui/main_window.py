@@ -221,6 +221,27 @@ class QuarkDriveGUI:
                         with dpg.group(horizontal=True):
                             dpg.add_image(self.icons['cache'], width=16, height=16)
                             dpg.add_checkbox(label="Cache Hibrido", tag="enable_cache", default_value=True)
+
+                        if os.name != 'nt':
+                            # Opcoes do FUSE: cache do kernel e tamanho das requisicões
+                            dpg.add_spacer(height=10)
+                            dpg.add_input_float(label="Cache de atributos (s)", tag="fuse_attr_timeout",
+                                                default_value=1.0, min_value=0.0, min_clamped=True, width=100)
+                            dpg.add_input_float(label="Cache de entradas (s)", tag="fuse_entry_timeout",
+                                                default_value=1.0, min_value=0.0, min_clamped=True, width=100)
+                            dpg.add_combo(["auto", "kernel", "none"], label="Cache de paginas do kernel",
+                                          tag="fuse_cache_mode", default_value="auto", width=100)
+                            dpg.add_checkbox(label="Escritas grandes (big_writes)", tag="fuse_big_writes",
+                                             default_value=True)
+                            # Tamanho maximo de cada requisicao, ate um chunk (1 MiB)
+                            dpg.add_input_int(label="Leitura maxima (KiB)", tag="fuse_max_read",
+                                              default_value=1024, min_value=4, max_value=1024,
+                                              min_clamped=True, max_clamped=True, width=100)
+                            dpg.add_input_int(label="Escrita maxima (KiB)", tag="fuse_max_write",
+                                              default_value=1024, min_value=4, max_value=1024,
+                                              min_clamped=True, max_clamped=True, width=100)
+                            dpg.add_input_text(label="Arquivos com direct_io (ex.: *.db, *.log)",
+                                               tag="fuse_direct_io", default_value="", width=200)
                 
                 with dpg.tab(label="Estatisticas"):
                     with dpg.group(horizontal=True):
@@ -473,6 +494,21 @@ class QuarkDriveGUI:
         except Exception as e:
             self._append_log(f"[ERRO] Falha ao iniciar montagem: {str(e)}")
     
+    def _mount_options(self):
+        """Opcoes de montagem do FUSE escolhidas nas configuracões avancadas"""
+        if os.name == 'nt':
+            return None
+        patterns = [p.strip() for p in dpg.get_value("fuse_direct_io").split(',') if p.strip()]
+        return {
+            'attr_timeout': dpg.get_value("fuse_attr_timeout"),
+            'entry_timeout': dpg.get_value("fuse_entry_timeout"),
+            'cache': dpg.get_value("fuse_cache_mode"),
+            'big_writes': dpg.get_value("fuse_big_writes"),
+            'max_read': dpg.get_value("fuse_max_read") * 1024,
+            'max_write': dpg.get_value("fuse_max_write") * 1024,
+            'direct_io': patterns
+        }
+
     def _mount_worker(self, mount_point):
         """Thread worker para montagem do sistema de arquivos"""
         try:
@@ -482,7 +518,8 @@ class QuarkDriveGUI:
                 mount_point=mount_point,
                 dedup=True,
                 compress=True,
-                cache=True
+                cache=True,
+                mount_options=self._mount_options()
             )
             
             if self.mount_process:
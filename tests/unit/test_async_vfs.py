@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes unitarios para o VFS assincrono (pyfuse3/trio)
+"""
+
+import unittest
+from unittest import mock
+import tempfile
+import threading
+import time
+import shutil
+import errno
+from pathlib import Path
+import sys
+
+# Adicionar o diretorio raiz ao path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+try:
+    import pyfuse3
+    import trio
+    from fs.async_vfs import AsyncDedupFS
+except (ImportError, OSError) as e:  # pyfuse3 exige a libfuse 3 instalada
+    raise unittest.SkipTest(f"pyfuse3 indisponivel: {e}")
+
+class TestAsyncDedupFS(unittest.TestCase):
+    """Testes para as operacoes assincronas sobre o nucleo compartilhado"""
+
+    def setUp(self):
+        """Configuracao inicial para cada teste"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.fs = AsyncDedupFS(self.temp_dir, max_threads=4)
+
+    def tearDown(self):
+        """Limpeza apos cada teste"""
+        self.fs.destroy()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _run(self, coro_fn, *args):
+        return trio.run(coro_fn, *args)
+
+    def test_create_write_read(self):
+        """Testar create, escrita e leitura pelo handle"""
+        async def scenario():
+            info, attrs = await self.fs.create(pyfuse3.ROOT_INODE, b'a.txt', 0o644, 0, None)
+            await self.fs.write(info.fh, 0, b'conteudo')
+            await self.fs.release(info.fh)
+
+            entry = await self.fs.lookup(pyfuse3.ROOT_INODE, b'a.txt', None)
+            self.assertEqual(entry.st_ino, attrs.st_ino)
+            self.assertEqual(entry.st_size, 8)
+
+            info = await self.fs.open(entry.st_ino, 0, None)
+            data = await self.fs.read(info.fh, 0, 100)
+            await self.fs.release(info.fh)
+            return data
+
+        self.assertEqual(self._run(scenario), b'conteudo')
+
+    def test_concurrent_writes_same_inode(self):
+        """Testar escritas concorrentes em chunks distintos do mesmo arquivo"""
+        async def scenario():
+            info, _ = await self.fs.create(pyfuse3.ROOT_INODE, b'b.bin', 0o644, 0, None)
+            async with trio.open_nursery() as nursery:
+                for i in range(8):
+                    nursery.start_soon(self.fs.write, info.fh, i * 10, bytes([65 + i]) * 10)
+            data = await self.fs.read(info.fh, 0, 80)
+            await self.fs.release(info.fh)
+            return data
+
+        data = self._run(scenario)
+        self.assertEqual(data, b''.join(bytes([65 + i]) * 10 for i in range(8)))
+
+    def test_errors_become_fuse_errors(self):
+        """Testar que OSError do nucleo vira FUSEError com o mesmo errno"""
+        async def scenario():
+            with self.assertRaises(pyfuse3.FUSEError) as ctx:
+                await self.fs.lookup(pyfuse3.ROOT_INODE, b'inexistente', None)
+            self.assertEqual(ctx.exception.errno, errno.ENOENT)
+            await self.fs.mkdir(pyfuse3.ROOT_INODE, b'dir', 0o755, None)
+            with self.assertRaises(pyfuse3.FUSEError) as ctx:
+                await self.fs.mkdir(pyfuse3.ROOT_INODE, b'dir', 0o755, None)
+            self.assertEqual(ctx.exception.errno, errno.EEXIST)
+
+        self._run(scenario)
+
+    def test_unexpected_errors_become_eio(self):
+        """Testar que excecoes que nao sao OSError viram EIO"""
+        async def scenario():
+            info, _ = await self.fs.create(pyfuse3.ROOT_INODE, b'c.bin', 0o644, 0, None)
+            with mock.patch.object(self.fs.core, 'read', side_effect=IndexError('chunk')):
+                with self.assertRaises(pyfuse3.FUSEError) as ctx:
+                    await self.fs.read(info.fh, 0, 10)
+            await self.fs.release(info.fh)
+            self.assertEqual(ctx.exception.errno, errno.EIO)
+
+        self._run(scenario)
+        self.assertEqual(AsyncDedupFS.read.__name__, 'read')
+        self.assertTrue(hasattr(AsyncDedupFS.read, '__wrapped__'))
+
+    def test_reads_share_and_truncate_excludes(self):
+        """Testar que leituras do mesmo inode correm juntas e o truncamento roda sozinho"""
+        active = []
+        overlaps = []
+        lock = threading.Lock()
+
+        def tracked(fn):
+            def run(*args):
+                with lock:
+                    overlaps.extend((fn.__name__, other) for other in active)
+                    active.append(fn.__name__)
+                time.sleep(0.05)
+                try:
+                    return fn(*args)
+                finally:
+                    with lock:
+                        active.remove(fn.__name__)
+            return run
+
+        async def scenario():
+            info, attrs = await self.fs.create(pyfuse3.ROOT_INODE, b'd.bin', 0o644, 0, None)
+            await self.fs.write(info.fh, 0, b'x' * 100)
+            fields = mock.Mock(update_size=True, update_mode=False, update_mtime=False)
+            attr = mock.Mock(st_size=10)
+            with mock.patch.object(self.fs.core, 'read', tracked(self.fs.core.read)), \
+                    mock.patch.object(self.fs.core, 'truncate', tracked(self.fs.core.truncate)):
+                async with trio.open_nursery() as nursery:
+                    nursery.start_soon(self.fs.setattr, attrs.st_ino, attr, fields, info.fh, None)
+                    for _ in range(3):
+                        nursery.start_soon(self.fs.read, info.fh, 0, 100)
+            await self.fs.release(info.fh)
+
+        self._run(scenario)
+        self.assertIn(('read', 'read'), overlaps)
+        self.assertFalse([pair for pair in overlaps if 'truncate' in pair])
+
+    def test_statfs_errors_become_fuse_errors(self):
+        """Testar que um OSError do statfs do backend vira FUSEError"""
+        async def scenario():
+            with mock.patch.object(self.fs.core, 'statfs', side_effect=PermissionError(errno.EACCES, 'negado')):
+                with self.assertRaises(pyfuse3.FUSEError) as ctx:
+                    await self.fs.statfs(None)
+            self.assertEqual(ctx.exception.errno, errno.EACCES)
+
+        self._run(scenario)
+
+    def test_readdir_lists_children(self):
+        """Testar readdir sem montar, com a resposta do kernel simulada"""
+        replies = []
+
+        def reply(token, name, attrs, next_id):
+            replies.append((name, next_id))
+            return True
+
+        async def scenario():
+            await self.fs.mkdir(pyfuse3.ROOT_INODE, b'sub', 0o755, None)
+            info, _ = await self.fs.create(pyfuse3.ROOT_INODE, b'e.txt', 0o644, 0, None)
+            await self.fs.release(info.fh)
+            fh = await self.fs.opendir(pyfuse3.ROOT_INODE, None)
+            with mock.patch.object(pyfuse3, 'readdir_reply', side_effect=reply):
+                await self.fs.readdir(fh, 0, None)
+                await self.fs.readdir(fh, 1, None)
+
+        self._run(scenario)
+        self.assertEqual(replies, [(b'sub', 1), (b'e.txt', 2), (b'e.txt', 2)])
+
+if __name__ == '__main__':
+    unittest.main()
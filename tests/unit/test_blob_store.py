@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes unitarios para o armazenamento de blobs em pack files
+"""
+
+import unittest
+import tempfile
+import shutil
+import os
+import hashlib
+from pathlib import Path
+import sys
+
+# Adicionar o diretorio raiz ao path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from core.database import MetadataDB
+from core.blob_store import BlobStore
+from core.placement import VolumeRing, fanout_path
+
+class TestBlobStore(unittest.TestCase):
+    """Testes para blobs pequenos em packs e grandes em arquivos proprios"""
+
+    def setUp(self):
+        """Configuracao inicial para cada teste"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'metadata.db')
+        self.db = MetadataDB(self.db_path)
+        self.store = BlobStore(self.temp_dir, self.db, small_blob_limit=100, segment_size=1000,
+                               inline_limit=0)
+
+    def tearDown(self):
+        """Limpeza apos cada teste"""
+        self.store.close()
+        self.db.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_small_blobs_share_a_pack(self):
+        """Testar que blobs pequenos sao anexados ao mesmo pack"""
+        self.store.put('a' * 64, b'pequeno-1', 9)
+        self.store.put('b' * 64, b'pequeno-2', 9)
+
+        self.assertEqual(self.store.get('a' * 64), b'pequeno-1')
+        self.assertEqual(self.store.get('b' * 64), b'pequeno-2')
+        self.assertEqual(len(os.listdir(self.store.pack_folder)), 1)
+        self.assertFalse(os.path.exists(self.store._blob_path('a' * 64)))
+
+    def test_large_blob_keeps_own_file(self):
+        """Testar que blobs grandes continuam em arquivo proprio"""
+        data = os.urandom(500)
+        self.store.put('c' * 64, data, 500)
+
+        self.assertTrue(os.path.exists(self.store._blob_path('c' * 64)))
+        self.assertEqual(self.store.get('c' * 64), data)
+
+    def test_segment_rotation(self):
+        """Testar que um pack cheio e selado e um novo e aberto"""
+        blobs = {f'{i:064d}': os.urandom(90) for i in range(30)}
+        for hash_value, data in blobs.items():
+            self.store.put(hash_value, data, len(data))
+
+        self.assertGreater(len(os.listdir(self.store.pack_folder)), 1)
+        for hash_value, data in blobs.items():
+            self.assertEqual(self.store.get(hash_value), data)
+
+    def test_reopen_discards_unregistered_tail(self):
+        """Testar que bytes nao registrados de uma escrita interrompida sao descartados"""
+        self.store.put('d' * 64, b'registrado', 10)
+        pack_path = self.store._open_packs[os.path.normpath(self.temp_dir)][1]
+        self.store.close()
+        with open(pack_path, 'ab') as f:
+            f.write(b'lixo de uma queda')
+
+        reopened = BlobStore(self.temp_dir, self.db, small_blob_limit=100, segment_size=1000,
+                               inline_limit=0)
+        reopened.put('e' * 64, b'novo', 4)
+
+        self.assertEqual(reopened.get('d' * 64), b'registrado')
+        self.assertEqual(reopened.get('e' * 64), b'novo')
+        self.assertEqual(os.path.getsize(pack_path), len(b'registrado') + len(b'novo'))
+        reopened.close()
+
+    def test_missing_blob(self):
+        """Testar leitura de hash inexistente"""
+        self.assertIsNone(self.store.get('f' * 64))
+        self.assertFalse(self.store.exists('f' * 64))
+
+class TestInlineBlobs(unittest.TestCase):
+    """Testes para blobs minusculos guardados na linha do MetadataDB"""
+
+    def setUp(self):
+        """Configuracao inicial para cada teste"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = MetadataDB(os.path.join(self.temp_dir, 'metadata.db'))
+        self.store = BlobStore(self.temp_dir, self.db, small_blob_limit=100, inline_limit=32)
+
+    def tearDown(self):
+        """Limpeza apos cada teste"""
+        self.store.close()
+        self.db.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_tiny_blob_is_inlined(self):
+        """Testar que blobs abaixo de inline_limit nao criam arquivo nem pack"""
+        self.store.put('a' * 64, b'config=1', 8)
+
+        self.assertEqual(self.store.get('a' * 64), b'config=1')
+        self.assertIsNone(self.db.get_blob('a' * 64)[1])
+        self.assertEqual(os.listdir(self.store.pack_folder), [])
+
+    def test_inline_blob_is_deduplicated_and_collected(self):
+        """Testar dedup por hash e remocao pelo GC de blobs inline"""
+        self.store.put('b' * 64, b'x' * 10, 10)
+        self.store.put('b' * 64, b'y' * 10, 10)
+        self.assertEqual(self.store.get('b' * 64), b'x' * 10)
+
+        self.db.decrement_blob_ref('b' * 64)
+        self.assertEqual(self.store.delete_unreferenced('b' * 64), (10, None))
+        self.assertIsNone(self.store.get('b' * 64))
+
+    def test_inline_blobs_are_not_rebalanced(self):
+        """Testar que blobs inline ficam fora do rebalanceamento"""
+        self.store.put('c' * 64, b'pequeno', 7)
+        self.assertEqual(self.db.get_standalone_blobs(), [])
+
+class TestBlobPlacement(unittest.TestCase):
+    """Testes para fan-out por prefixo e distribuicao entre volumes"""
+
+    def setUp(self):
+        """Configuracao inicial para cada teste"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.volumes = [os.path.join(self.temp_dir, f'vol{i}') for i in range(3)]
+        self.db = MetadataDB(os.path.join(self.temp_dir, 'metadata.db'))
+
+    def tearDown(self):
+        """Limpeza apos cada teste"""
+        self.db.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _hashes(self, count):
+        return [hashlib.sha256(str(i).encode()).hexdigest() for i in range(count)]
+
+    def test_fanout_path(self):
+        """Testar o caminho ab/cd/<hash>.zst"""
+        h = 'abcd' + 'e' * 60
+        self.assertEqual(fanout_path('raiz', h), os.path.join('raiz', 'ab', 'cd', f'{h}.zst'))
+
+    def test_ring_respects_weights(self):
+        """Testar que a fracao de blobs por volume segue os pesos"""
+        ring = VolumeRing({'a': 1, 'b': 3})
+        counts = {'a': 0, 'b': 0}
+        for h in self._hashes(4000):
+            counts[ring.volume_for(h)] += 1
+        self.assertGreater(counts['b'], counts['a'] * 2)
+
+    def test_adding_volume_moves_only_its_share(self):
+        """Testar que adicionar um volume so move blobs para o novo volume"""
+        ring = VolumeRing({'a': 1, 'b': 1})
+        hashes = self._hashes(2000)
+        before = {h: ring.volume_for(h) for h in hashes}
+        ring.add_volume('c', 1)
+        for h in hashes:
+            after = ring.volume_for(h)
+            self.assertIn(after, (before[h], 'c'))
+
+    def test_blobs_spread_over_volumes(self):
+        """Testar que blobs grandes sao distribuidos entre os volumes"""
+        store = BlobStore(self.volumes[0], self.db, small_blob_limit=10, inline_limit=0,
+                          volumes={self.volumes[1]: 1})
+        blobs = {h: os.urandom(20) for h in self._hashes(50)}
+        for h, data in blobs.items():
+            store.put(h, data, 20)
+
+        used = {store.db.get_blob(h)[1].split(os.sep)[-4] for h in blobs}
+        self.assertEqual(used, {'vol0', 'vol1'})
+        for h, data in blobs.items():
+            self.assertEqual(store.get(h), data)
+        store.close()
+
+    def test_rebalance_after_adding_volume(self):
+        """Testar o rebalanceamento ao adicionar um volume, incluindo o layout plano antigo"""
+        store = BlobStore(self.volumes[0], self.db, small_blob_limit=10, inline_limit=0)
+        blobs = {h: os.urandom(20) for h in self._hashes(40)}
+        for h, data in blobs.items():
+            store.put(h, data, 20)
+
+        # Blob gravado pelo layout antigo, direto na raiz
+        legacy = hashlib.sha256(b'legado').hexdigest()
+        legacy_path = os.path.join(self.volumes[0], f'{legacy}.zst')
+        with open(legacy_path, 'wb') as f:
+            f.write(b'antigo' * 5)
+        self.db.add_blob(legacy, legacy_path, 30, 30)
+        blobs[legacy] = b'antigo' * 5
+
+        store.add_volume(self.volumes[1], 1)
+        store.close()
+
+        self.assertGreater(store.rebalance_stats['moved'], 1)
+        self.assertFalse(os.path.exists(legacy_path))
+        for h, data in blobs.items():
+            self.assertEqual(os.path.normpath(self.db.get_blob(h)[1]), store._blob_path(h))
+            self.assertEqual(store.get(h), data)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes unitarios para o filtro de Bloom de existencia de blobs
+"""
+
+import unittest
+from unittest import mock
+import tempfile
+import shutil
+import os
+import hashlib
+from pathlib import Path
+import sys
+
+# Adicionar o diretorio raiz ao path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from core.bloom import BloomFilter
+from core.database import MetadataDB
+
+def _hash(i):
+    return hashlib.sha256(str(i).encode()).hexdigest()
+
+class TestBloomFilter(unittest.TestCase):
+    """Testes para o filtro em si"""
+
+    def test_no_false_negatives_and_low_false_positives(self):
+        """Testar que itens adicionados sempre constam e a taxa de falsos positivos fica perto da alvo"""
+        bloom = BloomFilter(capacity=5000, error_rate=0.01)
+        for i in range(5000):
+            bloom.add(_hash(i))
+
+        self.assertTrue(all(_hash(i) in bloom for i in range(5000)))
+        false_positives = sum(_hash(i) in bloom for i in range(5000, 15000))
+        self.assertLess(false_positives, 300)
+
+class TestMetadataDBBlobFilter(unittest.TestCase):
+    """Testes para o filtro na frente das consultas de blobs"""
+
+    def setUp(self):
+        """Configuracao inicial para cada teste"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'metadata.db')
+        self.db = MetadataDB(self.db_path)
+
+    def tearDown(self):
+        """Limpeza apos cada teste"""
+        self.db.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_negative_lookup_skips_sqlite(self):
+        """Testar que um hash novo e respondido pelo filtro, sem consultar o banco"""
+        self.db.add_blob('a' * 64, 'a.zst', 10, 5)
+        with mock.patch.object(self.db, '_read', side_effect=AssertionError), \
+                mock.patch.object(self.db, '_write', side_effect=AssertionError):
+            self.assertFalse(self.db.increment_blob_ref('b' * 64))
+            self.assertIsNone(self.db.get_blob('b' * 64))
+        self.assertTrue(self.db.increment_blob_ref('a' * 64))
+
+    def test_filter_sees_blobs_from_other_instances_after_reopen(self):
+        """Testar que a reabertura apos uma queda enxerga blobs inseridos por outra instancia"""
+        self.db.add_blob('a' * 64, 'a.zst', 10, 5)
+        other = MetadataDB(self.db_path)
+        other.add_blob('c' * 64, 'c.zst', 10, 5)
+        other.close()
+        # Queda sem close: nada do filtro em memoria sobrevive
+        self.db.conn.close()
+
+        self.db = MetadataDB(self.db_path)
+        self.assertFalse(os.path.exists(self.db_path + '.bloom'))
+        self.assertIsNotNone(self.db.get_blob('a' * 64))
+        self.assertIsNotNone(self.db.get_blob('c' * 64))
+
+    def test_filter_grows_past_capacity(self):
+        """Testar que o filtro e refeito maior ao passar da capacidade"""
+        self.db.blob_filter = BloomFilter(capacity=10)
+        for i in range(25):
+            self.db.add_blob(_hash(i), f'{i}.zst', 10, 5)
+
+        self.assertGreaterEqual(self.db.blob_filter.capacity, 25)
+        for i in range(25):
+            self.assertIsNotNone(self.db.get_blob(_hash(i)))
+
+if __name__ == '__main__':
+    unittest.main()
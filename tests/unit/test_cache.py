@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes unitarios para o cache hibrido
+"""
+
+import unittest
+import tempfile
+import shutil
+import threading
+import os
+from pathlib import Path
+import sys
+
+# Adicionar o diretorio raiz ao path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from cache.cache import HybridCache
+from cache.governor import MemoryGovernor
+from cache import registry
+from cache.warm_start import load_hot_keys
+
+class TestHybridCache(unittest.TestCase):
+    """Testes para o cache RAM particionado"""
+
+    def setUp(self):
+        """Configuracao inicial para cada teste"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = HybridCache(ssd_folder=self.temp_dir, write_back_delay=60, num_shards=4,
+                                 adaptive_ram=False)
+
+    def tearDown(self):
+        """Limpeza apos cada teste"""
+        self.cache.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_ram_hit(self):
+        """Testar leitura de uma entrada presente na RAM"""
+        self.cache.add('abc', b'dados')
+
+        data, source = self.cache.get('abc')
+
+        self.assertEqual(data, b'dados')
+        self.assertEqual(source, 'RAM')
+        self.assertEqual(self.cache.ram_hits, 1)
+
+    def test_empty_data_is_hit(self):
+        """Testar que dados vazios contam como acerto e nao como falta"""
+        self.cache.add('vazio', b'')
+
+        data, source = self.cache.get('vazio')
+
+        self.assertEqual(data, b'')
+        self.assertEqual(source, 'RAM')
+
+    def test_miss(self):
+        """Testar chave inexistente"""
+        data, source = self.cache.get('inexistente')
+
+        self.assertIsNone(data)
+        self.assertIsNone(source)
+        self.assertEqual(self.cache.cache_misses, 1)
+
+    def test_ssd_hit_promotes_to_ram(self):
+        """Testar que um acerto no SSD promove a entrada para a RAM"""
+        self.cache.add_to_ssd('ssd', b'persistido')
+
+        _, source = self.cache.get('ssd')
+        _, source_again = self.cache.get('ssd')
+
+        self.assertEqual(source, 'SSD')
+        self.assertEqual(source_again, 'RAM')
+
+    def test_shard_eviction_respects_budget(self):
+        """Testar que cada shard respeita sua fatia do orcamento"""
+        for shard in self.cache.shards:
+            shard.limit = 10
+
+        for i in range(100):
+            self.cache.add_to_ram(f'k{i}', b'12345')
+
+        for shard in self.cache.shards:
+            self.assertLessEqual(shard.size, 10)
+        self.assertLessEqual(self.cache.ram_size, 40)
+
+    def test_entry_larger_than_shard_slice_is_kept(self):
+        """Testar que uma entrada maior que a fatia do shard continua na RAM"""
+        for shard in self.cache.shards:
+            shard.limit = 10
+
+        self.cache.add_to_ram('grande', b'x' * 100)
+        self.assertEqual(self.cache.get_from_ram('grande'), b'x' * 100)
+
+        self.cache.add_to_ram('grande', b'y' * 100)
+        self.assertEqual(self.cache.ram_size, 100)
+
+    def test_stats_aggregate_across_shards(self):
+        """Testar agregacao das estatisticas entre shards"""
+        keys = [f'chave{i}' for i in range(32)]
+        for key in keys:
+            self.cache.add(key, b'x')
+
+        def reader():
+            for key in keys:
+                self.cache.get(key)
+
+        threads = [threading.Thread(target=reader) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = self.cache.get_cache_stats()
+        self.assertEqual(stats['ram_hits'], 4 * len(keys))
+        self.assertEqual(stats['total_requests'], 4 * len(keys))
+        self.assertEqual(stats['num_shards'], 4)
+
+    def test_resize_evicts_and_records_event(self):
+        """Testar que reduzir o orcamento evicta entradas e registra o evento"""
+        for i in range(64):
+            self.cache.add_to_ram(f'k{i}', b'x' * 100)
+
+        self.cache.resize(400, reason='pressure')
+
+        stats = self.cache.get_cache_stats()
+        self.assertLessEqual(stats['ram_size'], 400)
+        self.assertEqual(stats['ram_limit'], 400)
+        self.assertEqual(stats['resize_count'], 1)
+        self.assertEqual(stats['resize_events'][-1]['reason'], 'pressure')
+
+    def test_flush_persists_dirty_entries(self):
+        """Testar que flush() grava todas as entradas sujas no SSD"""
+        for i in range(10):
+            self.cache.add(f'k{i}', f'dados{i}'.encode())
+
+        self.assertTrue(self.cache.flush(timeout=10))
+
+        for i in range(10):
+            with open(self.cache._ssd_path(f'k{i}'), 'rb') as f:
+                self.assertEqual(f.read(), f'dados{i}'.encode())
+        self.assertFalse([name for name in os.listdir(self.temp_dir) if '.tmp.' in name])
+        self.assertEqual(self.cache.get_cache_stats()['dirty_entries'], 0)
+
+    def test_repeated_writes_are_coalesced(self):
+        """Testar que gravacões repetidas da mesma chave sao coalescidas"""
+        for i in range(5):
+            self.cache.add('mesma', f'versao{i}'.encode())
+
+        self.cache.flush(timeout=10)
+
+        self.assertEqual(self.cache.get_from_ssd('mesma'), b'versao4')
+        self.assertGreaterEqual(self.cache.write_back.coalesced_count, 1)
+
+    def test_dirty_entry_survives_eviction(self):
+        """Testar que entradas sujas nao sao perdidas ao sair da fila LRU"""
+        for shard in self.cache.shards:
+            shard.limit = 10
+
+        self.cache.add('suja', b'0123456789')
+        for i in range(20):
+            self.cache.add_to_ram(f'k{i}', b'0123456789')
+
+        data, source = self.cache.get('suja')
+        self.assertEqual(data, b'0123456789')
+        self.assertEqual(source, 'RAM')
+
+        self.cache.flush(timeout=10)
+        self.assertEqual(self.cache.get_from_ssd('suja'), b'0123456789')
+
+    def test_remove_from_ssd_unpins_dirty_entry(self):
+        """Testar que remover uma entrada suja tambem a libera na RAM"""
+        self.cache.add('removida', b'dados')
+
+        self.cache.remove_from_ssd('removida')
+
+        stats = self.cache.get_cache_stats()
+        self.assertEqual(stats['dirty_entries'], 0)
+        self.assertEqual(stats['pinned_spilled_size'], 0)
+
+    def test_close_flushes_pending_writes(self):
+        """Testar que close() persiste o que estiver pendente"""
+        self.cache.add('final', b'ultimo')
+
+        self.cache.close()
+
+        self.assertEqual(self.cache.get_from_ssd('final'), b'ultimo')
+
+    def test_warm_start_prefetches_hot_keys(self):
+        """Testar que um novo cache recarrega as chaves quentes do snapshot"""
+        self.cache.add('quente', b'muito usado')
+        self.cache.add('fria', b'pouco usado')
+        for _ in range(5):
+            self.cache.get('quente')
+        self.cache.close()
+
+        restarted = HybridCache(ssd_folder=self.temp_dir, write_back_delay=60, num_shards=4,
+                                adaptive_ram=False, warm_start_budget=len(b'muito usado'))
+        try:
+            self.assertTrue(restarted.warm_starter.warm_start_done.wait(10))
+
+            self.assertEqual(restarted.get_from_ram('quente'), b'muito usado')
+            self.assertIsNone(restarted.get_from_ram('fria'))
+            self.assertIn('fria', restarted.ssd_index)
+        finally:
+            restarted.close()
+
+    def test_idle_snapshots_keep_hot_keys(self):
+        """Testar que snapshots sem novos acessos nao esvaziam as chaves quentes"""
+        self.cache.add('quente', b'muito usado')
+        for _ in range(5):
+            self.cache.get('quente')
+        self.cache.warm_starter.warm_start_done.wait(10)
+
+        for _ in range(10):
+            self.cache.warm_starter.snapshot()
+
+        self.assertEqual(dict(load_hot_keys(self.cache.warm_starter.snapshot_path)), {'quente': 5})
+
+    def test_ssd_index_short_circuits_misses(self):
+        """Testar que o indice do SSD responde faltas sem acessar o disco"""
+        self.cache.warm_starter.warm_start_done.wait(10)
+
+        self.cache.add_to_ssd('indexada', b'dados')
+
+        self.assertEqual(self.cache.get_from_ssd('indexada'), b'dados')
+        self.assertIsNone(self.cache.get_from_ssd('ausente'))
+        self.assertEqual(self.cache.get_cache_stats()['ssd_size'], len(b'dados'))
+
+
+class TestSharedCache(unittest.TestCase):
+    """Testes para o cache compartilhado do processo"""
+
+    def setUp(self):
+        """Configuracao inicial para cada teste"""
+        self.temp_dir = tempfile.mkdtemp()
+        registry.configure_shared_cache(ssd_folder=self.temp_dir, adaptive_ram=False, warm_start=False)
+
+    def tearDown(self):
+        """Limpeza apos cada teste"""
+        registry.close_shared_cache()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_same_instance_for_all_components(self):
+        """Testar que todos os componentes recebem a mesma instância"""
+        first = registry.get_shared_cache()
+        second = registry.get_shared_cache()
+
+        self.assertIs(first, second)
+        self.assertEqual(first.ssd_folder, self.temp_dir)
+
+    def test_configure_after_creation_fails(self):
+        """Testar que a configuracao nao pode mudar depois de criado o cache"""
+        registry.get_shared_cache()
+
+        with self.assertRaises(RuntimeError):
+            registry.configure_shared_cache(ram_limit_ratio=0.5)
+
+    def test_close_persists_and_resets(self):
+        """Testar que fechar o cache persiste os dados e permite recria-lo"""
+        cache = registry.get_shared_cache()
+        cache.add('compartilhada', b'dados')
+
+        registry.close_shared_cache()
+
+        self.assertEqual(cache.get_from_ssd('compartilhada'), b'dados')
+        self.assertIsNot(registry.get_shared_cache(), cache)
+
+
+class TestMemoryGovernor(unittest.TestCase):
+    """Testes para o calculo de limite do governador de memoria"""
+
+    def setUp(self):
+        """Configuracao inicial para cada teste"""
+        self.governor = MemoryGovernor(cache=None, min_limit=100, max_limit=1000)
+
+    def test_shrinks_under_low_available_memory(self):
+        """Testar reducao quando a memoria disponivel esta baixa"""
+        target, under_pressure = self.governor.compute_target(800, 800, total=10000, available=500)
+
+        self.assertTrue(under_pressure)
+        self.assertEqual(target, 600)
+
+    def test_shrinks_under_psi_pressure(self):
+        """Testar reducao quando o PSI indica pressao"""
+        target, under_pressure = self.governor.compute_target(800, 800, total=10000, available=5000, pressure=50.0)
+
+        self.assertTrue(under_pressure)
+        self.assertLess(target, 800)
+
+    def test_never_below_floor(self):
+        """Testar que o limite nunca fica abaixo do piso"""
+        target, _ = self.governor.compute_target(110, 110, total=10000, available=100)
+
+        self.assertEqual(target, 100)
+
+    def test_grows_only_when_full_and_idle(self):
+        """Testar crescimento apenas com cache cheio e memoria ociosa"""
+        grown, _ = self.governor.compute_target(500, 500, total=10000, available=8000)
+        unchanged, _ = self.governor.compute_target(500, 10, total=10000, available=8000)
+
+        self.assertEqual(grown, 1000)
+        self.assertEqual(unchanged, 500)
+
+if __name__ == '__main__':
+    unittest.main()
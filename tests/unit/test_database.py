@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes unitarios para as conexoes e a thread escritora do MetadataDB
+"""
+
+import unittest
+from unittest import mock
+import tempfile
+import shutil
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+import sys
+
+# Adicionar o diretorio raiz ao path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from core.database import MetadataDB
+
+class TestMetadataDBConcurrency(unittest.TestCase):
+    """Testes para leituras por thread e escritas em lote"""
+
+    def setUp(self):
+        """Configuracao inicial para cada teste"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = MetadataDB(os.path.join(self.temp_dir, 'metadata.db'))
+
+    def tearDown(self):
+        """Limpeza apos cada teste"""
+        self.db.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_concurrent_writers_and_readers(self):
+        """Testar escritas e leituras de varias threads ao mesmo tempo"""
+        self.db.add_blob('a' * 64, 'a.zst', 10, 5)
+        errors = []
+
+        def worker():
+            try:
+                for _ in range(50):
+                    self.assertTrue(self.db.increment_blob_ref('a' * 64))
+                    self.assertIsNotNone(self.db.get_blob('a' * 64))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(self.db.get_blob('a' * 64)[4], 1 + 8 * 50)
+
+    def test_reads_use_one_connection_per_thread(self):
+        """Testar que cada thread le pela propria conexao"""
+        self.db.get_total_blobs()
+        thread = threading.Thread(target=self.db.get_total_blobs)
+        thread.start()
+        thread.join()
+        self.assertEqual(len(self.db._readers), 2)
+
+    def test_failed_write_does_not_undo_batch(self):
+        """Testar que uma escrita com erro so desfaz a si mesma e o Future entrega o erro"""
+        def failing(cur):
+            cur.execute("INSERT INTO scrub_state (key, value) VALUES ('parcial', '1')")
+            raise ValueError('falha')
+
+        ok = self.db.submit(lambda cur: cur.execute(
+            "INSERT INTO scrub_state (key, value) VALUES ('ok', '1')"))
+        bad = self.db.submit(failing)
+
+        self.assertIsNone(ok.exception())
+        self.assertIsInstance(bad.exception(), ValueError)
+        self.assertEqual(self.db.get_scrub_state('ok'), '1')
+        self.assertIsNone(self.db.get_scrub_state('parcial'))
+
+    def test_recount_blob_refs(self):
+        """Testar que a recontagem usa so as referencias gravadas (inodes, files e bases de delta)"""
+        for h in 'abcd':
+            self.db.add_blob(h * 64, f'{h}.zst', 10, 5)
+        self.db.increment_blob_ref('a' * 64)  # referencia sem dono (queda antes do manifesto)
+        ino = self.db.add_inode(None, 'x', 0o100644, 0)
+        self.db.update_inode(ino, 20, ['a' * 64, None, 'b' * 64], 0)
+        self.db.add_file('/y', 'b' * 64, 10)
+        self.db.add_blob('e' * 64, 'e.zst', 10, 5, base_hash='c' * 64, delta_depth=1)
+
+        self.assertEqual(self.db.recount_blob_refs(), 4)
+        self.assertEqual([self.db.get_blob(h * 64)[4] for h in 'abcde'], [1, 2, 1, 0, 0])
+        self.assertIn('d' * 64, self.db.get_unreferenced_blobs(cutoff=time.time() + 1))
+
+    def test_close_commits_pending_writes(self):
+        """Testar que close espera as escritas enfileiradas"""
+        futures = [self.db.submit(lambda cur, i=i: cur.execute(
+            'INSERT INTO scrub_state (key, value) VALUES (?, ?)', (f'k{i}', i))) for i in range(100)]
+        self.db.close()
+        self.assertTrue(all(f.done() for f in futures))
+
+        conn = sqlite3.connect(self.db.db_path)
+        self.assertEqual(conn.execute('SELECT COUNT(*) FROM scrub_state').fetchone()[0], 100)
+        conn.close()
+
+class TestMetadataRowCache(unittest.TestCase):
+    """Testes para o LRU de linhas de blobs e arquivos"""
+
+    def setUp(self):
+        """Configuracao inicial para cada teste"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = MetadataDB(os.path.join(self.temp_dir, 'metadata.db'), row_cache_size=2)
+
+    def tearDown(self):
+        """Limpeza apos cada teste"""
+        self.db.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_repeated_lookups_skip_sqlite(self):
+        """Testar que a segunda consulta e servida pelo cache"""
+        self.db.add_blob('a' * 64, 'a.zst', 10, 5)
+        self.db.add_file('/x', 'a' * 64, 10)
+        first_blob, first_file = self.db.get_blob('a' * 64), self.db.get_file_by_path('/x')
+
+        with mock.patch.object(self.db, '_read', side_effect=AssertionError):
+            self.assertEqual(self.db.get_blob('a' * 64), first_blob)
+            self.assertEqual(self.db.get_file_by_path('/x'), first_file)
+
+        stats = self.db.get_cache_stats()
+        self.assertEqual(stats['blob_rows']['hits'], 1)
+        self.assertEqual(stats['file_rows']['hits'], 1)
+
+    def test_writes_invalidate_rows(self):
+        """Testar que escritas descartam as linhas em cache antes de retornar"""
+        self.db.add_blob('a' * 64, 'a.zst', 10, 5)
+        self.assertEqual(self.db.get_blob('a' * 64)[4], 1)
+        self.assertIsNone(self.db.get_file_by_path('/x'))
+
+        self.db.increment_blob_ref('a' * 64)
+        self.db.add_file('/x', 'a' * 64, 10)
+        self.assertEqual(self.db.get_blob('a' * 64)[4], 2)
+        self.assertIsNotNone(self.db.get_file_by_path('/x'))
+
+        self.db.remove_file('/x')
+        self.assertIsNone(self.db.get_file_by_path('/x'))
+        self.assertEqual(self.db.get_blob('a' * 64)[4], 1)
+
+        # submit pode mudar qualquer linha: esvazia os caches
+        self.db.submit(lambda cur: cur.execute('UPDATE blobs SET ref_count=7')).result()
+        self.assertEqual(self.db.get_blob('a' * 64)[4], 7)
+
+    def test_cache_is_bounded(self):
+        """Testar o limite de entradas do LRU"""
+        for i in range(5):
+            self.db.get_file_by_path(f'/f{i}')
+        self.assertEqual(self.db.get_cache_stats()['file_rows']['size'], 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -14,7 +14,7 @@ import sys
 # Adicionar o diretorio raiz ao path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from core.deduplication import calculate_file_hash, calculate_data_hash
+from core.deduplication import calculate_file_hash, calculate_data_hash, is_zero_block, ZERO_BLOCK_SIZE
 
 class TestDeduplication(unittest.TestCase):
     """Testes para funcionalidades de deduplicacao"""
@@ -133,5 +133,20 @@ class TestDeduplication(unittest.TestCase):
         # Limpar
         os.remove(different_file)
 
+    def test_zero_block_detection(self):
+        """Testar deteccao de blocos somente com zeros"""
+        self.assertTrue(is_zero_block(bytes(4096)))
+        self.assertTrue(is_zero_block(memoryview(bytearray(10))))
+        self.assertFalse(is_zero_block(bytes(4095) + b'\x01'))
+
+        # Fatias de um buffer maior e blocos acima de ZERO_BLOCK_SIZE
+        buffer = bytearray(ZERO_BLOCK_SIZE * 3)
+        buffer[ZERO_BLOCK_SIZE * 2 + 7] = 1
+        view = memoryview(buffer)
+        self.assertTrue(is_zero_block(view[:ZERO_BLOCK_SIZE]))
+        self.assertTrue(is_zero_block(view[:ZERO_BLOCK_SIZE * 2]))
+        self.assertFalse(is_zero_block(view[ZERO_BLOCK_SIZE:]))
+        self.assertTrue(is_zero_block(b''))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes unitarios para a compressao por similaridade (deltas)
+"""
+
+import unittest
+import tempfile
+import shutil
+import hashlib
+import random
+import os
+from pathlib import Path
+import sys
+
+# Adicionar o diretorio raiz ao path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from core.database import MetadataDB
+from core.blob_store import BlobStore
+from core.delta import DeltaStore, BASE_HASH_COLUMN, DELTA_DEPTH_COLUMN
+from core.similarity import compute_sketch
+from core.scrub import Scrubber
+
+def _revision(data, seed):
+    """Versao levemente alterada de data (insercao e troca de um trecho)"""
+    rng = random.Random(seed)
+    cut = rng.randrange(len(data) // 2)
+    return data[:cut] + rng.randbytes(64) + data[cut + 32:]
+
+class TestSimilarity(unittest.TestCase):
+    """Testes para os sketches MinHash"""
+
+    def test_near_duplicates_share_features(self):
+        """Testar que versões parecidas compartilham super-features e dados distintos nao"""
+        data = random.Random(1).randbytes(200 * 1024)
+        self.assertTrue(set(compute_sketch(data)) & set(compute_sketch(_revision(data, 2))))
+        other = random.Random(3).randbytes(200 * 1024)
+        self.assertFalse(set(compute_sketch(data)) & set(compute_sketch(other)))
+
+    def test_rotated_log_shares_features(self):
+        """Testar que um log rotacionado (inicio cortado, linhas novas no fim) e reconhecido"""
+        log = b''.join(b'2026-10-%02d INFO request %d served in %d ms\n' % (i % 28, i, i * 7 % 300)
+                       for i in range(20000))
+        rotated = log[len(log) // 10:] + b''.join(b'2026-11-01 INFO request %d\n' % i for i in range(2000))
+        self.assertTrue(set(compute_sketch(log)) & set(compute_sketch(rotated)))
+
+class TestDeltaStore(unittest.TestCase):
+    """Testes para gravacao e leitura de deltas"""
+
+    def setUp(self):
+        """Configuracao inicial para cada teste"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = MetadataDB(os.path.join(self.temp_dir, 'metadata.db'))
+        self.store = BlobStore(self.temp_dir, self.db)
+        self.delta = DeltaStore(self.db, self.store, max_depth=2)
+        self.base = random.Random(0).randbytes(256 * 1024)
+
+    def tearDown(self):
+        """Limpeza apos cada teste"""
+        self.store.close()
+        self.db.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _store(self, data):
+        h = hashlib.sha256(data).hexdigest()
+        self.delta.store(h, data)
+        return h
+
+    def test_near_duplicate_is_stored_as_delta(self):
+        """Testar que uma revisao vira delta pequeno e fixa a base"""
+        base_hash = self._store(self.base)
+        revision = _revision(self.base, 1)
+        h = self._store(revision)
+
+        blob = self.db.get_blob(h)
+        self.assertEqual(blob[BASE_HASH_COLUMN], base_hash)
+        self.assertLess(blob[3], 4096)
+        self.assertEqual(self.db.get_blob(base_hash)[4], 2)
+        self.assertEqual(self.delta.get(h), revision)
+
+    def test_chain_depth_is_limited(self):
+        """Testar que a cadeia de deltas respeita max_depth"""
+        data = self.base
+        hashes = [self._store(data)]
+        for seed in range(1, 5):
+            data = _revision(data, seed)
+            hashes.append(self._store(data))
+
+        depths = [self.db.get_blob(h)[DELTA_DEPTH_COLUMN] for h in hashes]
+        self.assertLessEqual(max(depths), 2)
+        self.assertEqual(self.delta.get(hashes[-1]), data)
+
+    def test_deleting_delta_releases_base(self):
+        """Testar que coletar o delta libera a fixacao da base"""
+        base_hash = self._store(self.base)
+        h = self._store(_revision(self.base, 1))
+        self.db.decrement_blob_ref(h)
+
+        self.store.delete_unreferenced(h)
+        self.assertEqual(self.db.get_blob(base_hash)[4], 1)
+
+    def test_scrub_verifies_deltas(self):
+        """Testar que o scrub reconstroi e valida blobs delta"""
+        self._store(self.base)
+        self._store(_revision(self.base, 1))
+
+        summary = Scrubber(self.db, self.store, rate_limit_mb=None, delta=self.delta).run()
+        self.assertEqual(summary['ok'], 2)
+
+if __name__ == '__main__':
+    unittest.main()
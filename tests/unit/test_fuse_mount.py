@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes unitarios para as opcoes de montagem do FUSE
+"""
+
+import unittest
+from pathlib import Path
+import sys
+
+# Adicionar o diretorio raiz ao path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+try:
+    from fs.fuse_mount import fuse_options, use_direct_io
+except (ImportError, OSError) as e:  # fusepy exige a libfuse instalada
+    raise unittest.SkipTest(f"FUSE indisponivel: {e}")
+
+class TestMountOptions(unittest.TestCase):
+    """Testes para a conversao das opcoes em argumentos -o"""
+
+    def test_defaults_enable_kernel_caching(self):
+        """Testar que o padrao liga cache de atributos, auto_cache e escritas grandes"""
+        kwargs = fuse_options()
+        self.assertEqual(kwargs['attr_timeout'], 1.0)
+        self.assertTrue(kwargs['auto_cache'])
+        self.assertTrue(kwargs['big_writes'])
+        self.assertNotIn('kernel_cache', kwargs)
+
+    def test_overrides(self):
+        """Testar modos de cache e limites configurados"""
+        kwargs = fuse_options({'cache': 'kernel', 'attr_timeout': 30, 'max_write': 131072})
+        self.assertTrue(kwargs['kernel_cache'])
+        self.assertNotIn('auto_cache', kwargs)
+        self.assertEqual(kwargs['attr_timeout'], 30)
+        self.assertEqual(kwargs['max_write'], 131072)
+
+        kwargs = fuse_options({'cache': 'none'})
+        self.assertNotIn('auto_cache', kwargs)
+        self.assertNotIn('kernel_cache', kwargs)
+        with self.assertRaises(ValueError):
+            fuse_options({'cache': 'sempre'})
+
+    def test_direct_io_by_file_class(self):
+        """Testar a selecao de direct_io pelo nome do arquivo"""
+        patterns = ['*.db', '*.log']
+        self.assertTrue(use_direct_io('/dados/app.db', patterns))
+        self.assertTrue(use_direct_io('/var.log', patterns))
+        self.assertFalse(use_direct_io('/db/foto.jpg', patterns))
+
+if __name__ == '__main__':
+    unittest.main()
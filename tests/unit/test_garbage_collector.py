@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes unitarios para a coleta de lixo de blobs
+"""
+
+import unittest
+from unittest import mock
+import tempfile
+import shutil
+import time
+import os
+from pathlib import Path
+import sys
+
+# Adicionar o diretorio raiz ao path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from core.database import MetadataDB
+from core.blob_store import BlobStore
+from core.garbage_collector import GarbageCollector
+
+class TestGarbageCollector(unittest.TestCase):
+    """Testes para contadores de referencia, varredura e compactacao"""
+
+    def setUp(self):
+        """Configuracao inicial para cada teste"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = MetadataDB(os.path.join(self.temp_dir, 'metadata.db'))
+        self.store = BlobStore(self.temp_dir, self.db, small_blob_limit=100, segment_size=1000,
+                               inline_limit=0)
+        self.roots = []
+        self.gc = GarbageCollector(self.db, self.store, roots=lambda: self.roots,
+                                   grace_period=10.0, io_budget=None)
+
+    def tearDown(self):
+        """Limpeza apos cada teste"""
+        self.store.close()
+        self.db.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_overwrite_releases_old_blob(self):
+        """Testar que sobrescrever um arquivo libera a referencia ao blob antigo"""
+        self.store.put('a' * 64, b'v1', 2)
+        self.db.add_file('arquivo', 'a' * 64, 2)
+        self.store.put('b' * 64, b'v2', 2)
+        self.db.add_file('arquivo', 'b' * 64, 2)
+
+        self.assertEqual(self.db.get_blob('a' * 64)[4], 0)
+        self.assertEqual(self.db.get_blob('b' * 64)[4], 1)
+
+        self.db.remove_file('arquivo')
+        self.assertEqual(self.db.get_blob('b' * 64)[4], 0)
+
+    def test_sweep_respects_grace_period(self):
+        """Testar que blobs sem referencia so sao apagados apos a carencia"""
+        data = os.urandom(500)
+        path = self.store.put('c' * 64, data, 500)
+        self.db.decrement_blob_ref('c' * 64)
+
+        self.gc.run_once()
+        self.assertTrue(os.path.exists(path))
+
+        self.gc.run_once(now=time.time() + 60)
+        self.assertFalse(os.path.exists(path))
+        self.assertIsNone(self.db.get_blob('c' * 64))
+        self.assertEqual(self.gc.get_stats()['blobs_deleted'], 1)
+
+    def test_rereferenced_blob_survives(self):
+        """Testar que um blob referenciado de novo durante a carencia nao e apagado"""
+        self.store.put('d' * 64, b'dados', 5)
+        self.db.decrement_blob_ref('d' * 64)
+        self.assertTrue(self.db.increment_blob_ref('d' * 64))
+
+        self.gc.run_once(now=time.time() + 60)
+        self.assertEqual(self.store.get('d' * 64), b'dados')
+
+    def test_reachable_blob_is_repaired(self):
+        """Testar que um blob ainda alcancavel pelas raizes tem o contador corrigido"""
+        self.store.put('e' * 64, b'dados', 5)
+        self.db.decrement_blob_ref('e' * 64)
+        self.roots = ['e' * 64, 'e' * 64]
+
+        self.gc.run_once(now=time.time() + 60)
+        self.assertEqual(self.db.get_blob('e' * 64)[4], 2)
+        self.assertEqual(self.gc.get_stats()['refs_repaired'], 1)
+
+    def test_compaction_rewrites_sparse_pack(self):
+        """Testar que um pack selado com pouco conteudo vivo e reescrito"""
+        blobs = {f'{i:064d}': os.urandom(90) for i in range(12)}
+        for hash_value, data in blobs.items():
+            self.store.put(hash_value, data, 90)
+        first_pack = self.db.get_blob(f'{0:064d}')[1]
+
+        # Liberar quase todos os blobs do primeiro pack
+        survivor = f'{0:064d}'
+        for hash_value in list(blobs)[1:11]:
+            self.db.decrement_blob_ref(hash_value)
+            del blobs[hash_value]
+
+        self.gc.run_once(now=time.time() + 60)
+
+        self.assertFalse(os.path.exists(first_pack))
+        self.assertGreaterEqual(self.gc.get_stats()['packs_compacted'], 1)
+        self.assertNotEqual(self.db.get_blob(survivor)[1], first_pack)
+        for hash_value, data in blobs.items():
+            self.assertEqual(self.store.get(hash_value), data)
+
+    def test_locked_pack_is_removed_after_fd_release(self):
+        """Testar que um pack que o SO nao deixa apagar (fd aberto no Windows) e apagado depois"""
+        blobs = {f'{i:064d}': os.urandom(90) for i in range(12)}
+        for hash_value, data in blobs.items():
+            self.store.put(hash_value, data, 90)
+        first_pack = self.db.get_blob(f'{0:064d}')[1]
+        self.store.get(f'{0:064d}')  # abre o fd de leitura do pack
+        for hash_value in list(blobs)[1:11]:
+            self.db.decrement_blob_ref(hash_value)
+
+        real_remove = os.remove
+        def remove(path):
+            if path == first_pack and self.store._retired_fds:
+                raise PermissionError(13, 'arquivo em uso', path)
+            real_remove(path)
+
+        with mock.patch('core.blob_store.os.remove', side_effect=remove):
+            self.gc.run_once(now=time.time() + 60)
+            self.assertTrue(os.path.exists(first_pack))
+
+            self.store.release_retired_fds()
+        self.assertFalse(os.path.exists(first_pack))
+        self.assertEqual(self.store._pending_removals, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes unitarios para o gerenciador de armazenamento
+"""
+
+import unittest
+from unittest import mock
+import tempfile
+import threading
+import shutil
+import os
+from pathlib import Path
+import sys
+
+# Adicionar o diretorio raiz ao path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from cache.cache import HybridCache
+from core.manager import StorageManager
+from core.deduplication import ZERO_BLOCK_SIZE
+
+class TestStorageManager(unittest.TestCase):
+    """Testes para ingestao e restauracao de arquivos"""
+
+    def setUp(self):
+        """Configuracao inicial para cada teste"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = HybridCache(ssd_folder=os.path.join(self.temp_dir, 'ssd'),
+                                 adaptive_ram=False, warm_start=False)
+        self.manager = StorageManager(os.path.join(self.temp_dir, 'blobs'),
+                                      os.path.join(self.temp_dir, 'metadata.db'), cache=self.cache)
+
+    def tearDown(self):
+        """Limpeza apos cada teste"""
+        self.manager.close()
+        self.cache.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_stats_monitor_repeats_until_stopped(self):
+        """Testar que o monitor de estatisticas repete a atualizacao e encerra quando sinalizado"""
+        calls = []
+        twice = threading.Event()
+
+        def update():
+            calls.append(1)
+            if len(calls) >= 2:
+                twice.set()
+
+        with mock.patch.object(self.manager, 'update_statistics', side_effect=update):
+            thread = self.manager.start_stats_monitoring(interval=0.01)
+            self.assertTrue(twice.wait(5))
+            self.manager._stats_stop.set()
+            thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+    def _write(self, name, data):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_store_and_retrieve(self):
+        """Testar ida e volta de um arquivo comum"""
+        data = os.urandom(10000)
+        path = self._write('comum.bin', data)
+        self.manager.store_file(path, use_fast_hash=False)
+
+        output = os.path.join(self.temp_dir, 'saida.bin')
+        self.manager.retrieve_file(path, output)
+        with open(output, 'rb') as f:
+            self.assertEqual(f.read(), data)
+
+    def test_zero_regions_become_holes(self):
+        """Testar que blocos zerados nao sao armazenados e voltam como zeros"""
+        payload = os.urandom(1000)
+        data = payload + bytes(ZERO_BLOCK_SIZE * 3) + payload
+        path = self._write('disco.img', data)
+        self.manager.store_file(path, use_fast_hash=False)
+
+        chunks = self.manager.db.get_file_chunks(path)
+        self.assertEqual(chunks[1:3], [None, None])
+        self.assertEqual(len([h for h in chunks if h]), 2)
+
+        output = os.path.join(self.temp_dir, 'restaurado.img')
+        self.manager.retrieve_file(path, output)
+        with open(output, 'rb') as f:
+            self.assertEqual(f.read(), data)
+
+    def test_sparse_file_refs_released_on_delete(self):
+        """Testar que remover um arquivo esparso libera os blocos"""
+        data = os.urandom(ZERO_BLOCK_SIZE) + bytes(ZERO_BLOCK_SIZE)
+        path = self._write('esparso.bin', data)
+        self.manager.store_file(path, use_fast_hash=False)
+        first = self.manager.db.get_file_chunks(path)[0]
+
+        self.manager.delete_file(path)
+        self.assertEqual(self.manager.db.get_blob(first)[4], 0)
+
+    def test_clone_shares_blob(self):
+        """Testar que clonar so copia metadados e soma uma referencia"""
+        data = os.urandom(10000)
+        path = self._write('original.bin', data)
+        self.manager.store_file(path, use_fast_hash=False)
+        hash_value = self.manager.db.get_file_by_path(path)[2]
+
+        copy = os.path.join(self.temp_dir, 'copia.bin')
+        self.manager.clone(path, copy)
+        self.assertEqual(self.manager.db.get_blob(hash_value)[4], 2)
+
+        output = os.path.join(self.temp_dir, 'saida.bin')
+        self.manager.retrieve_file(copy, output)
+        with open(output, 'rb') as f:
+            self.assertEqual(f.read(), data)
+
+        self.manager.delete_file(path)
+        self.assertEqual(self.manager.db.get_blob(hash_value)[4], 1)
+        with self.assertRaises(FileNotFoundError):
+            self.manager.clone(path, copy)
+
+    def test_snapshot_copies_tree(self):
+        """Testar que o snapshot copia todos os arquivos sob o diretorio, inclusive esparsos"""
+        os.makedirs(os.path.join(self.temp_dir, 'dados'))
+        os.makedirs(os.path.join(self.temp_dir, 'dados2'))
+        plain = self._write(os.path.join('dados', 'a.bin'), os.urandom(5000))
+        sparse = self._write(os.path.join('dados', 'b.img'), os.urandom(100) + bytes(ZERO_BLOCK_SIZE * 2))
+        other = self._write(os.path.join('dados2', 'c.bin'), os.urandom(5000))
+        for path in (plain, sparse, other):
+            self.manager.store_file(path, use_fast_hash=False)
+
+        src = os.path.join(self.temp_dir, 'dados')
+        dst = os.path.join(self.temp_dir, 'snap')
+        self.assertEqual(self.manager.snapshot(src, dst), 2)
+
+        chunk = self.manager.db.get_file_chunks(sparse)[0]
+        self.assertEqual(self.manager.db.get_blob(chunk)[4], 2)
+        self.assertEqual(self.manager.db.get_file_chunks(os.path.join(dst, 'b.img')),
+                         self.manager.db.get_file_chunks(sparse))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes unitarios para o read-ahead sequencial do VFS
+"""
+
+import unittest
+import threading
+from pathlib import Path
+import sys
+
+# Adicionar o diretorio raiz ao path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from fs.manifest import CHUNK_SIZE
+from fs.readahead import ReadAheadEngine
+
+class TestReadAheadEngine(unittest.TestCase):
+    """Testes para a deteccao de padrao e a janela de prefetch"""
+
+    def setUp(self):
+        """Configuracao inicial para cada teste"""
+        self.fetched = []
+        self.lock = threading.Lock()
+        self.engine = ReadAheadEngine(self._fetch, max_workers=1, min_window=2, max_window=8)
+        self.chunks = [f'h{i}' for i in range(64)]
+
+    def tearDown(self):
+        """Limpeza apos cada teste"""
+        self.engine._executor.shutdown(wait=True)
+
+    def _fetch(self, h):
+        with self.lock:
+            self.fetched.append(h)
+
+    def _wait(self):
+        self.engine._executor.submit(lambda: None).result(timeout=5)
+
+    def test_sequential_reads_trigger_prefetch(self):
+        """Testar que leituras sequenciais agendam os proximos chunks"""
+        for i in range(3):
+            self.engine.on_read('stream', self.chunks, i * CHUNK_SIZE, CHUNK_SIZE)
+        self._wait()
+
+        self.assertIn('h3', self.fetched)
+        self.assertNotIn('h0', self.fetched)
+
+    def test_random_reads_do_not_prefetch(self):
+        """Testar que leituras aleatorias nao disparam prefetch"""
+        for index in (10, 2, 40, 7):
+            self.engine.on_read('stream', self.chunks, index * CHUNK_SIZE, 4096)
+        self._wait()
+
+        self.assertEqual(self.fetched, [])
+
+    def test_chunks_are_not_fetched_twice(self):
+        """Testar que um chunk ja agendado nao e buscado de novo"""
+        for i in range(20):
+            self.engine.on_read('stream', self.chunks, i * CHUNK_SIZE, CHUNK_SIZE)
+        self._wait()
+
+        self.assertEqual(len(self.fetched), len(set(self.fetched)))
+
+    def test_window_never_exceeds_maximum(self):
+        """Testar que a janela respeita o limite maximo"""
+        for i in range(30):
+            self.engine.on_read('stream', self.chunks, i * CHUNK_SIZE, CHUNK_SIZE)
+            state = self.engine._streams['stream']
+            self.assertLessEqual(state.window, 8)
+            self.assertLessEqual(state.prefetched_upto, i + 8)
+
+    def test_prefetch_stops_at_end_of_file(self):
+        """Testar que nao ha prefetch alem do ultimo chunk"""
+        chunks = self.chunks[:4]
+        for i in range(4):
+            self.engine.on_read('stream', chunks, i * CHUNK_SIZE, CHUNK_SIZE)
+        self._wait()
+
+        self.assertTrue(set(self.fetched) <= set(chunks))
+
+    def test_shutdown_waits_for_running_prefetch(self):
+        """Testar que shutdown so retorna depois do prefetch em andamento e descarta os da fila"""
+        started = threading.Event()
+        release = threading.Event()
+        done = []
+
+        def slow_fetch(h):
+            started.set()
+            release.wait(5)
+            done.append(h)
+
+        engine = ReadAheadEngine(slow_fetch, max_workers=1, min_window=4, max_window=4)
+        for i in range(3):
+            engine.on_read('stream', self.chunks, i * CHUNK_SIZE, CHUNK_SIZE)
+        self.assertTrue(started.wait(5))
+
+        threading.Timer(0.1, release.set).start()
+        engine.shutdown()
+
+        self.assertEqual(done, ['h3'])
+
+if __name__ == '__main__':
+    unittest.main()
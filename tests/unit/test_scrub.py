@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes unitarios para a verificacao de integridade dos blobs
+"""
+
+import unittest
+import tempfile
+import shutil
+import hashlib
+import os
+from pathlib import Path
+import sys
+
+import zstandard as zstd
+
+# Adicionar o diretorio raiz ao path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from core.database import MetadataDB
+from core.blob_store import BlobStore
+from core.scrub import Scrubber
+
+class TestScrubber(unittest.TestCase):
+    """Testes para deteccao de blobs corrompidos/ausentes e retomada"""
+
+    def setUp(self):
+        """Configuracao inicial para cada teste"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = MetadataDB(os.path.join(self.temp_dir, 'metadata.db'))
+        self.store = BlobStore(self.temp_dir, self.db, small_blob_limit=100, inline_limit=0)
+        self.scrubber = Scrubber(self.db, self.store, workers=2, rate_limit_mb=None, batch_size=3)
+
+    def tearDown(self):
+        """Limpeza apos cada teste"""
+        self.store.close()
+        self.db.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _put(self, data, path=None):
+        h = hashlib.sha256(data).hexdigest()
+        self.store.put(h, zstd.ZstdCompressor().compress(data), len(data))
+        if path:
+            self.db.add_file(path, h, len(data))
+        return h
+
+    def test_healthy_store(self):
+        """Testar que blobs integros sao marcados como ok"""
+        hashes = [self._put(os.urandom(50)) for _ in range(5)]
+
+        summary = self.scrubber.run()
+        self.assertEqual(summary['ok'], 5)
+        self.assertTrue(summary['completed_pass'])
+        self.assertIsNotNone(self.db.get_blob(hashes[0])[8])
+        self.assertEqual(self.scrubber.report(), [])
+
+    def test_detects_corrupt_and_missing(self):
+        """Testar deteccao de bit rot e de arquivo ausente, com os caminhos afetados"""
+        corrupt = self._put(os.urandom(4000), path='/dados/a.bin')
+        missing = self._put(os.urandom(4000), path='/dados/b.bin')
+        small = self._put(b'pequeno' * 5, path='/dados/c.txt')
+
+        blob_path = self.db.get_blob(corrupt)[1]
+        with open(blob_path, 'r+b') as f:
+            f.seek(20)
+            f.write(b'\xff' * 8)
+        os.remove(self.db.get_blob(missing)[1])
+
+        summary = self.scrubber.run()
+        self.assertEqual((summary['corrupt'], summary['missing'], summary['ok']), (1, 1, 1))
+
+        report = {entry['hash']: entry for entry in self.scrubber.report()}
+        self.assertEqual(report[corrupt]['status'], 'corrupt')
+        self.assertEqual(report[corrupt]['paths'], ['/dados/a.bin'])
+        self.assertEqual(report[missing]['status'], 'missing')
+        self.assertNotIn(small, report)
+
+    def test_resumes_from_cursor(self):
+        """Testar que uma rodada interrompida continua de onde parou"""
+        for _ in range(7):
+            self._put(os.urandom(30))
+
+        first = self.scrubber.run(max_blobs=4)
+        self.assertEqual(first['verified'], 4)
+        self.assertFalse(first['completed_pass'])
+
+        resumed = Scrubber(self.db, self.store, rate_limit_mb=None)
+        second = resumed.run()
+        self.assertEqual(second['verified'], 3)
+        self.assertTrue(second['completed_pass'])
+        self.assertEqual(resumed.get_stats()['cursor'], '')
+
+if __name__ == '__main__':
+    unittest.main()
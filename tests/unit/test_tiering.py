@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes unitarios para a recompressao de blobs frios
+"""
+
+import unittest
+import tempfile
+import shutil
+import hashlib
+import time
+import random
+import os
+from pathlib import Path
+import sys
+
+import zstandard as zstd
+
+# Adicionar o diretorio raiz ao path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from core.database import MetadataDB
+from core.blob_store import BlobStore
+from core.tiering import Recompressor
+
+def _log(size, seed=0):
+    """Linhas de log: nivel alto comprime bem melhor que o nivel da ingestao"""
+    rng = random.Random(seed)
+    actions = [b'login', b'logout', b'read', b'write', b'delete']
+    lines = (b'%d INFO user=%d action=%s latency=%dms\n' % (1700000000 + i * rng.randint(1, 9),
+             rng.randint(1, 500), rng.choice(actions), rng.randint(1, 999)) for i in range(size // 30))
+    return b''.join(lines)[:size]
+
+class TestRecompressor(unittest.TestCase):
+    """Testes para o job de recompressao em segundo plano"""
+
+    def setUp(self):
+        """Configuracao inicial para cada teste"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = MetadataDB(os.path.join(self.temp_dir, 'metadata.db'))
+        self.store = BlobStore(self.temp_dir, self.db, small_blob_limit=16 * 1024, inline_limit=2048)
+        self.tiering = Recompressor(self.db, self.store, cold_after=60, cpu_budget=None)
+
+    def tearDown(self):
+        """Limpeza apos cada teste"""
+        self.tiering.stop()
+        self.store.close()
+        self.db.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _put(self, data):
+        h = hashlib.sha256(data).hexdigest()
+        self.store.put(h, zstd.ZstdCompressor(level=1).compress(data), len(data))
+        return h
+
+    def test_cold_blobs_shrink_and_stay_readable(self):
+        """Testar que blobs frios (arquivo proprio, pack e inline) sao recomprimidos"""
+        samples = [_log(size) for size in (400 * 1024, 12 * 1024, 6000)]
+        hashes = [self._put(data) for data in samples]
+        before = [self.db.get_blob(h)[3] for h in hashes]
+        self.assertIsNotNone(self.db.get_blob(hashes[2])[10])
+
+        self.assertEqual(self.tiering.run_once(now=time.time() + 3600), 3)
+        for h, data, size in zip(hashes, samples, before):
+            blob = self.db.get_blob(h)
+            self.assertLess(blob[3], size)
+            self.assertEqual(zstd.ZstdDecompressor().decompress(self.store.read_blob(blob)), data)
+        self.assertGreater(self.tiering.get_stats()['bytes_saved'], 0)
+
+        # Ja no nivel alvo: nada a fazer no proximo ciclo
+        self.assertEqual(self.tiering.run_once(now=time.time() + 3600), 0)
+
+    def test_recent_access_keeps_blob_hot(self):
+        """Testar que blobs lidos recentemente nao sao recomprimidos"""
+        hot = self._put(_log(100 * 1024, 1))
+        cold = self._put(_log(90 * 1024, 2))
+        later = time.time() + 3600
+
+        self.tiering.record_access(hot)
+        self.assertEqual(self.tiering.get_stats()['pending_accesses'], 1)
+        self.db.touch_blobs({hot: later})
+        self.assertEqual(self.tiering.run_once(now=later + 30), 1)
+        self.assertIsNone(self.db.get_blob(hot)[14])
+        self.assertEqual(self.db.get_blob(cold)[14], 19)
+
+    def test_moved_blob_is_not_replaced(self):
+        """Testar que a troca e abortada se o blob mudou desde a leitura"""
+        h = self._put(_log(100 * 1024, 1))
+        stale = self.db.get_blob(h)
+        self.db.update_blob_path(h, stale[1] + '.movido')
+        self.assertFalse(self.store.replace(stale, b'x', 19))
+
+if __name__ == '__main__':
+    unittest.main()
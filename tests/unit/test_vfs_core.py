@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Testes unitarios para o sistema de arquivos virtual
+"""
+
+import unittest
+from unittest import mock
+import tempfile
+import shutil
+import threading
+import time
+import os
+from pathlib import Path
+import sys
+
+# Adicionar o diretorio raiz ao path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from cache.cache import HybridCache
+from fs.manifest import CHUNK_SIZE
+
+try:
+    from fs.vfs_core import DedupCompressFS
+except (ImportError, OSError) as e:  # fusepy exige a libfuse instalada
+    raise unittest.SkipTest(f"FUSE indisponivel: {e}")
+
+class TestDedupCompressFS(unittest.TestCase):
+    """Testes para leitura e escrita em chunks no VFS"""
+
+    def setUp(self):
+        """Configuracao inicial para cada teste"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = HybridCache(ssd_folder=os.path.join(self.temp_dir, 'ssd'),
+                                 adaptive_ram=False, warm_start=False)
+        self.fs = DedupCompressFS(os.path.join(self.temp_dir, 'backend'), cache=self.cache)
+        self._create('/arquivo', 0o644)
+
+    def _create(self, path, mode=0o644):
+        """Criar um arquivo e fechar o handle devolvido pelo create"""
+        self.fs.release(path, self.fs.create(path, mode))
+
+    def tearDown(self):
+        """Limpeza apos cada teste"""
+        self.fs.destroy('/')
+        self.cache.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_write_and_read_across_chunks(self):
+        """Testar escrita e leitura que atravessam fronteiras de chunk"""
+        data = os.urandom(CHUNK_SIZE * 2 + 100)
+        self.fs.write('/arquivo', data, 0, None)
+
+        self.assertEqual(self.fs.getattr('/arquivo')['st_size'], len(data))
+        self.assertEqual(self.fs.read('/arquivo', 200, CHUNK_SIZE - 100, None),
+                         data[CHUNK_SIZE - 100:CHUNK_SIZE + 100])
+
+    def test_parallel_writes_to_distinct_files(self):
+        """Testar escritas em arquivos distintos em threads paralelas (compressor por thread)"""
+        payloads = {f'/p{i}': os.urandom(CHUNK_SIZE * 2) for i in range(8)}
+        handles = {path: self.fs.create(path, 0o644) for path in payloads}
+        errors = []
+
+        def writer(path):
+            try:
+                self.fs.write(path, payloads[path], 0, handles[path])
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=writer, args=(path,)) for path in payloads]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        for path, data in payloads.items():
+            self.fs.release(path, handles[path])
+            self.assertEqual(self.fs.read(path, len(data), 0, None), data)
+
+    def test_write_past_end_fills_with_zeros(self):
+        """Testar que escrever alem do fim preenche a lacuna com zeros"""
+        self.fs.write('/arquivo', b'abc', 0, None)
+        self.fs.write('/arquivo', b'xyz', CHUNK_SIZE + 10, None)
+
+        data = self.fs.read('/arquivo', CHUNK_SIZE + 13, 0, None)
+        self.assertEqual(data, b'abc' + bytes(CHUNK_SIZE + 7) + b'xyz')
+
+    def test_seek_past_eof_creates_holes(self):
+        """Testar que a regiao pulada vira buraco, lido como zeros sem blob"""
+        self.fs.write('/arquivo', b'fim', CHUNK_SIZE * 3, None)
+        manifest = self.fs._get_manifest('/arquivo')
+
+        self.assertEqual(manifest.chunks[:3], [None, None, None])
+        self.assertEqual(self.fs.read('/arquivo', 10, CHUNK_SIZE, None), bytes(10))
+        self.assertEqual(self.fs.read('/arquivo', 3, CHUNK_SIZE * 3, None), b'fim')
+
+        # Escrever dentro de um buraco materializa apenas aquele chunk
+        self.fs.write('/arquivo', b'meio', CHUNK_SIZE + 7, None)
+        self.assertEqual(manifest.chunks[0], None)
+        self.assertIsNotNone(manifest.chunks[1])
+        self.assertEqual(self.fs.read('/arquivo', 6, CHUNK_SIZE + 6, None), b'\x00meio\x00')
+
+    def test_zero_writes_are_not_stored(self):
+        """Testar que gravar um chunk inteiro de zeros nao cria blob"""
+        self.fs.write('/arquivo', bytes(CHUNK_SIZE * 2), 0, None)
+        self.assertEqual(self.fs._get_manifest('/arquivo').chunks, [None, None])
+        self.assertEqual(self.fs.getattr('/arquivo')['st_size'], CHUNK_SIZE * 2)
+
+    def test_delta_encoding_off_the_write_path_by_default(self):
+        """Testar que a escrita so tenta delta com delta_writes=True"""
+        with mock.patch('core.delta.compute_sketch', side_effect=AssertionError):
+            self.fs.write('/arquivo', os.urandom(CHUNK_SIZE), 0, None)
+        self.assertEqual(self.fs.delta.get_stats()['deltas_stored'], 0)
+
+        self.fs.delta_writes = True
+        base = os.urandom(CHUNK_SIZE)
+        similar = base[:-10] + b'0123456789'
+        self.fs.write('/arquivo', base, CHUNK_SIZE, None)
+        self.fs.write('/arquivo', similar, CHUNK_SIZE * 2, None)
+        self.assertEqual(self.fs.delta.get_stats()['deltas_stored'], 1)
+        self.assertEqual(self.fs.read('/arquivo', CHUNK_SIZE, CHUNK_SIZE * 2, None), similar)
+
+    def test_partial_overwrite_changes_only_touched_chunk(self):
+        """Testar que sobrescrever um trecho recodifica apenas o chunk afetado"""
+        self.fs.write('/arquivo', os.urandom(CHUNK_SIZE * 3), 0, None)
+        before = list(self.fs._get_manifest('/arquivo').chunks)
+
+        self.fs.write('/arquivo', b'novo', CHUNK_SIZE + 5, None)
+        after = self.fs._get_manifest('/arquivo').chunks
+
+        self.assertEqual(before[0], after[0])
+        self.assertNotEqual(before[1], after[1])
+        self.assertEqual(before[2], after[2])
+
+    def test_full_chunk_overwrite_skips_old_chunk(self):
+        """Testar que sobrescrever um chunk inteiro nao le o conteudo anterior"""
+        data = os.urandom(CHUNK_SIZE * 2)
+        self.fs.write('/arquivo', data, 0, None)
+        new = os.urandom(CHUNK_SIZE)
+        with mock.patch.object(self.fs, '_read_chunk', side_effect=AssertionError):
+            self.fs.write('/arquivo', new, CHUNK_SIZE, None)
+
+        self.assertEqual(self.fs.read('/arquivo', CHUNK_SIZE * 2, 0, None), data[:CHUNK_SIZE] + new)
+        # Leitura de um chunk inteiro devolve o objeto em cache, sem copia
+        whole = self.fs.read('/arquivo', CHUNK_SIZE, CHUNK_SIZE, None)
+        self.assertIs(whole, self.fs.read('/arquivo', CHUNK_SIZE, CHUNK_SIZE, None))
+
+    def test_statfs_and_xattrs(self):
+        """Testar statfs do backend e xattrs de economia servidos pelos metadados"""
+        data = os.urandom(CHUNK_SIZE) + bytes(CHUNK_SIZE)
+        self.fs.write('/arquivo', data, 0, None)
+        self.fs.flush('/arquivo', None)
+        self._create('/copia', 0o644)
+        self.fs.write('/copia', data, 0, None)
+        self.fs.flush('/copia', None)
+
+        st = self.fs.statfs('/')
+        self.assertGreater(st['f_blocks'], 0)
+        self.assertLessEqual(st['f_bavail'], st['f_blocks'])
+        self.assertLessEqual(st['f_ffree'], st['f_files'])
+        if hasattr(os, 'statvfs'):
+            # Outros processos podem criar arquivos no mesmo volume entre as chamadas
+            self.assertAlmostEqual(st['f_ffree'], os.statvfs(self.fs.backend_folder).f_ffree, delta=1000)
+
+        self.assertEqual(self.fs.listxattr('/arquivo'),
+                         ['user.quarkdrive.hash', 'user.quarkdrive.compressed_size',
+                          'user.quarkdrive.codec', 'user.quarkdrive.refcount'])
+        with mock.patch.object(self.fs, '_read_chunk', side_effect=AssertionError):
+            self.assertEqual(self.fs.getxattr('/arquivo', 'user.quarkdrive.hash'),
+                             self.fs.getxattr('/copia', 'user.quarkdrive.hash'))
+            self.assertEqual(self.fs.getxattr('/arquivo', 'user.quarkdrive.codec'), b'hole,zstd')
+            self.assertEqual(self.fs.getxattr('/arquivo', 'user.quarkdrive.refcount'), b'2')
+            compressed = int(self.fs.getxattr('/arquivo', 'user.quarkdrive.compressed_size'))
+            self.assertGreater(compressed, 0)
+
+            self.assertEqual(int(self.fs.getxattr('/', 'user.quarkdrive.logical_size')), len(data) * 2)
+            self.assertEqual(int(self.fs.getxattr('/', 'user.quarkdrive.physical_size')), compressed)
+
+        with self.assertRaises(OSError):
+            self.fs.getxattr('/arquivo', 'user.outro')
+        with self.assertRaises(OSError):
+            self.fs.setxattr('/arquivo', 'user.quarkdrive.hash', b'x', 0)
+
+    def test_truncate_shrinks_and_extends(self):
+        """Testar truncate para um tamanho menor e depois maior"""
+        data = os.urandom(CHUNK_SIZE + 50)
+        self.fs.write('/arquivo', data, 0, None)
+
+        self.fs.truncate('/arquivo', 10)
+        self.assertEqual(self.fs.read('/arquivo', 100, 0, None), data[:10])
+
+        self.fs.truncate('/arquivo', 20)
+        self.assertEqual(self.fs.read('/arquivo', 100, 0, None), data[:10] + bytes(10))
+
+    def test_fallocate_extends_and_punches_holes(self):
+        """Testar reserva com buracos e PUNCH_HOLE recodificando so as fronteiras"""
+        data = os.urandom(CHUNK_SIZE * 3)
+        self.fs.write('/arquivo', data, 0, None)
+        manifest = self.fs._get_manifest('/arquivo')
+        old = list(manifest.chunks)
+
+        # KEEP_SIZE | PUNCH_HOLE do meio do chunk 0 ao meio do chunk 2
+        self.fs.fallocate('/arquivo', 0x03, 100, CHUNK_SIZE * 2, None)
+        self.assertIsNone(manifest.chunks[1])
+        self.assertNotIn(manifest.chunks[0], (None, old[0]))
+        self.fs.flush('/arquivo', None)
+        self.assertEqual(self.fs.db.get_blob(old[1])[4], 0)
+        self.assertEqual(self.fs.read('/arquivo', len(data), 0, None),
+                         data[:100] + bytes(CHUNK_SIZE * 2) + data[CHUNK_SIZE * 2 + 100:])
+
+        # Reserva alem do fim: so tamanho e buracos, sem blobs novos
+        with mock.patch.object(self.fs, '_store_chunk', side_effect=AssertionError):
+            self.fs.fallocate('/arquivo', 0, 0, CHUNK_SIZE * 5, None)
+        self.assertEqual(self.fs.getattr('/arquivo')['st_size'], CHUNK_SIZE * 5)
+        self.assertEqual(manifest.chunks[3:], [None, None])
+
+        with self.assertRaises(OSError):
+            self.fs.fallocate('/arquivo', 0x02, 0, 10, None)
+
+    def test_sequential_read_prefetches_next_chunks(self):
+        """Testar que leitura sequencial agenda o read-ahead"""
+        data = os.urandom(CHUNK_SIZE * 8)
+        self.fs.write('/arquivo', data, 0, None)
+
+        for offset in range(0, CHUNK_SIZE * 3, 128 * 1024):
+            self.fs.read('/arquivo', 128 * 1024, offset, 1)
+
+        self.assertGreater(self.fs.readahead.get_stats()['prefetch_submitted'], 0)
+
+    def test_overwrite_and_unlink_release_chunks(self):
+        """Testar que chunks substituidos ou removidos perdem a referencia (a substituicao so ao gravar o manifesto)"""
+        self.fs.write('/arquivo', os.urandom(CHUNK_SIZE * 2), 0, None)
+        self.fs.flush('/arquivo', None)
+        old = list(self.fs._get_manifest('/arquivo').chunks)
+
+        self.fs.write('/arquivo', b'novo', 0, None)
+        # O manifesto gravado ainda aponta para old[0]
+        self.assertEqual(self.fs.db.get_blob(old[0])[4], 1)
+        self.fs.flush('/arquivo', None)
+        self.assertEqual(self.fs.db.get_blob(old[0])[4], 0)
+        self.assertEqual(self.fs.db.get_blob(old[1])[4], 1)
+
+        new = self.fs._get_manifest('/arquivo').chunks[0]
+        self.fs.unlink('/arquivo')
+        self.assertEqual(self.fs.db.get_blob(old[1])[4], 0)
+        self.assertEqual(self.fs.db.get_blob(new)[4], 0)
+
+    def test_refs_survive_crash_before_manifest_sync(self):
+        """Testar que uma queda antes de gravar o manifesto nao libera chunks que ele ainda usa"""
+        backend = os.path.join(self.temp_dir, 'queda')
+        crashed = DedupCompressFS(backend, cache=self.cache, sync_interval=None)
+        crashed.release('/a', crashed.create('/a', 0o644))
+        crashed.write('/a', os.urandom(CHUNK_SIZE), 0, None)
+        crashed.flush('/a', None)
+        old = crashed._get_manifest('/a').chunks[0]
+        crashed.write('/a', os.urandom(CHUNK_SIZE), 0, None)
+        new = crashed._get_manifest('/a').chunks[0]
+
+        # Reabrir sem destroy: o manifesto gravado ainda aponta para old
+        reopened = DedupCompressFS(backend, cache=self.cache, sync_interval=None)
+        try:
+            self.assertEqual(reopened._get_manifest('/a').chunks, [old])
+            self.assertEqual(reopened.db.get_blob(old)[4], 1)
+            # A referencia somada pela escrita perdida foi recontada
+            self.assertEqual(reopened.db.get_blob(new)[4], 0)
+        finally:
+            reopened.destroy('/')
+            crashed.destroy('/')
+
+    def test_dirty_manifests_are_synced_periodically(self):
+        """Testar que manifestos sujos sao gravados sem flush nem release"""
+        backend = os.path.join(self.temp_dir, 'periodico')
+        fs = DedupCompressFS(backend, cache=self.cache, sync_interval=0.05)
+        try:
+            fs.write('/b', b'dados', 0, None)
+            deadline = time.time() + 5
+            while time.time() < deadline:
+                rows = {row[2]: row for row in fs.db.get_inodes()}
+                if rows.get('b') and rows['b'][5] == 5:
+                    break
+                time.sleep(0.02)
+            self.assertEqual(rows['b'][5], 5)
+        finally:
+            fs.destroy('/')
+
+    def test_copy_file_range_shares_aligned_chunks(self):
+        """Testar no nucleo (sem FUSE) que a copia alinhada compartilha os chunks e a desalinhada copia os dados"""
+        data = os.urandom(CHUNK_SIZE * 2 + 100)
+        self.fs.write('/arquivo', data, 0, None)
+        chunks = list(self.fs._get_manifest('/arquivo').chunks)
+
+        self._create('/copia', 0o644)
+        self.assertEqual(self.fs.copy_file_range('/arquivo', None, 0, '/copia', None, 0, len(data), 0),
+                         len(data))
+        self.assertEqual(self.fs._get_manifest('/copia').chunks, chunks)
+        self.assertEqual(self.fs.db.get_blob(chunks[0])[4], 2)
+        self.assertEqual(self.fs.read('/copia', len(data), 0, None), data)
+
+        self._create('/parcial', 0o644)
+        self.fs.copy_file_range('/arquivo', None, 10, '/parcial', None, 0, 1000, 0)
+        self.assertEqual(self.fs.read('/parcial', 2000, 0, None), data[10:1010])
+
+        self.fs.unlink('/arquivo')
+        self.assertEqual(self.fs.db.get_blob(chunks[0])[4], 1)
+
+    def test_directories_and_rename(self):
+        """Testar mkdir, readdir por diretorio, rename de diretorio e rmdir"""
+        self.fs.mkdir('/dados', 0o755)
+        self.fs.mkdir('/dados/sub', 0o755)
+        self._create('/dados/sub/a.txt', 0o644)
+        self.fs.write('/dados/sub/a.txt', b'conteudo', 0, None)
+
+        self.assertEqual(sorted(self.fs.readdir('/', None)), ['.', '..', 'arquivo', 'dados'])
+        self.assertEqual(self.fs.readdir('/dados', None), ['.', '..', 'sub'])
+        self.assertTrue(self.fs.getattr('/dados')['st_mode'] & 0o040000)
+
+        self.fs.rename('/dados', '/movido')
+        self.assertEqual(self.fs.read('/movido/sub/a.txt', 100, 0, None), b'conteudo')
+        with self.assertRaises(FileNotFoundError):
+            self.fs.getattr('/dados/sub/a.txt')
+        with self.assertRaises(OSError):
+            self.fs.rename('/movido', '/movido/sub/dentro')
+        with self.assertRaises(OSError):
+            self.fs.rmdir('/movido/sub')
+
+        self.fs.unlink('/movido/sub/a.txt')
+        self.fs.rmdir('/movido/sub')
+        self.assertEqual(self.fs.readdir('/movido', None), ['.', '..'])
+
+    def test_rename_over_file_releases_chunks(self):
+        """Testar que rename sobre um arquivo existente libera os chunks dele"""
+        self.fs.write('/arquivo', os.urandom(1000), 0, None)
+        old = self.fs._get_manifest('/arquivo').chunks[0]
+        self._create('/outro', 0o644)
+        self.fs.write('/outro', b'novo', 0, None)
+
+        self.fs.rename('/outro', '/arquivo')
+        self.assertEqual(self.fs.read('/arquivo', 10, 0, None), b'novo')
+        self.assertEqual(self.fs.db.get_blob(old)[4], 0)
+
+    def test_tree_persists_across_remount(self):
+        """Testar que diretorios e conteudo sobrevivem a desmontagem"""
+        data = os.urandom(CHUNK_SIZE + 10)
+        self.fs.mkdir('/docs', 0o755)
+        self._create('/docs/a.bin', 0o600)
+        self.fs.write('/docs/a.bin', data, 0, None)
+        self.fs.truncate('/arquivo', CHUNK_SIZE * 3)
+        self.fs.destroy('/')
+
+        self.fs = DedupCompressFS(os.path.join(self.temp_dir, 'backend'), cache=self.cache)
+        self.assertEqual(self.fs.read('/docs/a.bin', len(data), 0, None), data)
+        self.assertEqual(self.fs.getattr('/docs/a.bin')['st_mode'] & 0o777, 0o600)
+        self.assertEqual(self.fs.getattr('/arquivo')['st_size'], CHUNK_SIZE * 3)
+
+    def test_handles_pin_inode_and_last_chunk(self):
+        """Testar leitura pelo handle sem resolver o caminho e reaproveitando o chunk decodificado"""
+        data = os.urandom(CHUNK_SIZE + 500)
+        self.fs.write('/arquivo', data, 0, None)
+        fh = self.fs.open('/arquivo', os.O_RDONLY)
+        self.assertGreater(fh, 0)
+
+        self.assertEqual(self.fs.read('/arquivo', 100, 10, fh), data[10:110])
+        # Mesmo chunk: vem do handle, sem consultar o cache
+        hits = self.cache.get_cache_stats()['cache_hits']
+        self.assertEqual(self.fs.read('/arquivo', 100, 5000, fh), data[5000:5100])
+        self.assertEqual(self.cache.get_cache_stats()['cache_hits'], hits)
+
+        # O handle segue o arquivo renomeado
+        self.fs.rename('/arquivo', '/novo')
+        self.assertEqual(self.fs.read('/caminho/antigo', 10, CHUNK_SIZE, fh), data[CHUNK_SIZE:CHUNK_SIZE + 10])
+        self.assertEqual(self.fs.getattr(None, fh)['st_size'], len(data))
+        self.fs.release('/novo', fh)
+
+    def test_unlinked_file_readable_until_release(self):
+        """Testar que um arquivo removido com handle aberto so libera os chunks no release"""
+        self.fs.write('/arquivo', os.urandom(1000), 0, None)
+        h = self.fs._get_manifest('/arquivo').chunks[0]
+        fh = self.fs.open('/arquivo', os.O_RDONLY)
+
+        self.fs.unlink('/arquivo')
+        self.assertEqual(self.fs.db.get_blob(h)[4], 1)
+        self.assertEqual(len(self.fs.read('/arquivo', 2000, 0, fh)), 1000)
+        self.assertIn(h, list(self.fs._live_chunks()))
+
+        self.fs.release('/arquivo', fh)
+        self.assertEqual(self.fs.db.get_blob(h)[4], 0)
+
+if __name__ == '__main__':
+    unittest.main()